@@ -0,0 +1,86 @@
+"""
+Compressed raw csv archive
+
+Raw csv copies are stored zstd-compressed as raw/csv/<name>.csv.zst, using
+the codec bundled with pyarrow, and decompressed on the fly when read back,
+so readers take a compressed path wherever they took a plain one.
+"""
+
+import logging
+import shutil
+from pathlib import Path
+
+import fsspec
+import pyarrow as pa
+
+from blockcache import is_remote, open_cached
+
+logger = logging.getLogger(__name__)
+
+RAW_CODEC = "zstd"
+# file suffix of each codec pyarrow can stream
+CODEC_SUFFIXES = {".zst": "zstd", ".gz": "gzip", ".bz2": "bz2", ".lz4": "lz4"}
+RAW_SUFFIX = ".csv.zst"
+
+
+def raw_csv_name(csv_name: str) -> str:
+    """Name of the compressed archive of csv_name"""
+    return csv_name.removesuffix(".csv") + RAW_SUFFIX
+
+
+def codec_of(path) -> str | None:
+    """Codec a path is compressed with, going by its suffix; None if plain"""
+    if hasattr(path, "read"):
+        return None
+    return CODEC_SUFFIXES.get(Path(str(path)).suffix.lower())
+
+
+def open_raw(path, mode: str = "rb"):
+    """
+    Opens a raw csv for binary reading or writing, (de)compressing if needed
+
+    Parameters
+    ----------
+    path: str | Path
+        local path or fsspec URI; compression is taken from the suffix.
+        Remote URIs are read through the block cache
+    mode: str
+        "rb" or "wb"
+
+    Returns
+    -------
+    file object
+        closing it closes the underlying file as well
+    """
+    codec = codec_of(path)
+    if mode == "rb" and is_remote(path):
+        raw = open_cached(str(path))
+    else:
+        raw = fsspec.open(str(path), mode).open()
+    if mode == "wb":
+        return compress_stream(raw, codec)
+    return raw if codec is None else pa.CompressedInputStream(raw, codec)
+
+
+def compress_stream(sink, codec: str | None):
+    """Wraps a writable file object so what is written to it is compressed"""
+    return sink if codec is None else pa.CompressedOutputStream(sink, codec)
+
+
+def compress_file(src: Path, dst: Path, chunk_size: int = 1 << 20) -> Path:
+    """Compresses src into dst, with the codec of dst's suffix"""
+    with open(src, "rb") as plain, open_raw(dst, "wb") as compressed:
+        shutil.copyfileobj(plain, compressed, chunk_size)
+    src_size, dst_size = Path(src).stat().st_size, Path(dst).stat().st_size
+    logger.info(
+        f"Compressed {src} to {dst}: {src_size} -> {dst_size} bytes "
+        f"({src_size / max(dst_size, 1):.1f}x)"
+    )
+    return Path(dst)
+
+
+def decompress_file(src, dst: Path, chunk_size: int = 1 << 20) -> Path:
+    """Decompresses src, a path or URI, into the local file dst"""
+    with open_raw(src, "rb") as compressed, open(dst, "wb") as plain:
+        shutil.copyfileobj(compressed, plain, chunk_size)
+    return Path(dst)
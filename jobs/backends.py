@@ -0,0 +1,396 @@
+"""
+Storage backends of the pipeline's bucket
+
+The raw csv archive, the parquet lake and the manifest live in a GCS bucket
+in production. The pipeline reaches the bucket only through a Store, so the
+same code paths can run, and be benchmarked, against a local directory or
+a local GCS emulator. The store is picked by the scheme of the location
+given for the bucket:
+
+    gs://<bucket>, or a bare <bucket>       GCS
+    file:///<directory>, or /<directory>    local directory
+    emulator://<bucket>                     GCS emulator at STORAGE_EMULATOR_HOST
+
+STORAGE_BACKEND ("gcs", "local" or "emulator") picks the backend of bare
+bucket names; local buckets are then directories under LOCAL_STORAGE_ROOT.
+
+Every backend signals a missing object with NotFound, and a failed
+conditional write with PreconditionFailed, as GCS does.
+"""
+
+import abc
+import fcntl
+import io
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+import fsspec
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from google.cloud import storage
+
+from clients import get_storage_client
+from upload import CHUNK_SIZE, WORKERS, upload_file
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.getenv("STORAGE_BACKEND", "gcs")
+LOCAL_ROOT = os.getenv("LOCAL_STORAGE_ROOT", "data/buckets")
+EMULATOR_HOST = os.getenv("STORAGE_EMULATOR_HOST", "http://localhost:9023")
+
+
+class Store(abc.ABC):
+    """
+    Objects of one bucket, addressed by their path in it
+
+    Object descriptions are dicts of path, size, crc32c and generation; the
+    generation changes on every write of the object.
+
+    Attributes
+    ----------
+    fs: fsspec.AbstractFileSystem
+        filesystem for readers and writers that take one, with fs_path()
+    """
+
+    fs = None
+
+    @abc.abstractmethod
+    def uri(self, path: str = "") -> str:
+        """fsspec URI of the object, or prefix, at path"""
+
+    @abc.abstractmethod
+    def fs_path(self, path: str = "") -> str:
+        """Path of the object at path within fs"""
+
+    @abc.abstractmethod
+    def exists(self, path: str) -> bool:
+        """Is there an object at path?"""
+
+    @abc.abstractmethod
+    def stat(self, path: str) -> dict:
+        """Describes the object at path; raises NotFound if there is none"""
+
+    @abc.abstractmethod
+    def list(self, prefix: str) -> list:
+        """Describes every object whose path starts with prefix, by path"""
+
+    @abc.abstractmethod
+    def upload(self, src_file: Path, path: str, workers: int = WORKERS) -> dict:
+        """Copies the local file src_file to path, returning its description"""
+
+    @abc.abstractmethod
+    def open_write(self, path: str):
+        """
+        Context manager opening the object at path for binary writing
+
+        The object only appears at path once the block exits without an
+        error; a failed write leaves whatever was at path untouched, even if
+        the file was closed within the block.
+        """
+
+    @abc.abstractmethod
+    def read_bytes(self, path: str) -> tuple[bytes, int]:
+        """Contents and generation of the object at path"""
+
+    @abc.abstractmethod
+    def write_bytes(
+        self,
+        path: str,
+        data: bytes,
+        if_generation_match: int | None = None,
+        content_type: str | None = None,
+    ) -> int:
+        """
+        Writes data to path, returning the new generation
+
+        If if_generation_match is given, the write only goes ahead if the
+        object is still at that generation (0: if there is no object), and
+        raises PreconditionFailed otherwise.
+        """
+
+    @abc.abstractmethod
+    def delete(self, paths: list, missing_ok: bool = False) -> None:
+        """
+        Deletes the objects at paths; raises NotFound for a missing one,
+        unless missing_ok
+        """
+
+
+class _PendingUpload(io.RawIOBase):
+    """
+    Writes through to a BlobWriter, whose upload open_write then commits or
+    cancels; closing it, as streams wrapping it do, only ends the writes
+    """
+
+    def __init__(self, writer):
+        self._writer = writer
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._checkClosed()
+        return self._writer.write(data)
+
+    def tell(self) -> int:
+        return self._writer.tell()
+
+
+def _abort_upload(writer) -> None:
+    """
+    Cancels the upload of a BlobWriter, without committing what it was sent
+
+    close() would commit it, and so would the writer's finalizer; both
+    upload nothing once the writer's buffer is closed.
+    """
+    upload_and_transport = writer._upload_and_transport
+    writer._buffer.close()
+    if upload_and_transport:
+        upload, transport = upload_and_transport
+        # a DELETE of a resumable session's URI cancels it
+        try:
+            transport.delete(upload.resumable_url, timeout=60)
+        except Exception as e:
+            # an abandoned session expires unused after a week anyway
+            logger.warning(f"Could not cancel upload to {writer._blob.name}: {e}")
+
+
+def _describe_blob(blob: storage.Blob) -> dict:
+    return {
+        "path": blob.name,
+        "size": blob.size,
+        "crc32c": blob.crc32c,
+        "generation": blob.generation,
+    }
+
+
+class GCSStore(Store):
+    """A GCS bucket"""
+
+    def __init__(self, bucket_name: str, project: str | None = None):
+        self.bucket = get_storage_client(project=project).bucket(bucket_name)
+        self.fs = fsspec.filesystem("gs")
+
+    def uri(self, path: str = "") -> str:
+        return f"gs://{self.fs_path(path)}"
+
+    def fs_path(self, path: str = "") -> str:
+        return f"{self.bucket.name}/{path}"
+
+    def exists(self, path: str) -> bool:
+        return self.bucket.blob(path).exists()
+
+    def stat(self, path: str) -> dict:
+        blob = self.bucket.get_blob(path)
+        if blob is None:
+            raise NotFound(f"No such object: {self.uri(path)}")
+        return _describe_blob(blob)
+
+    def list(self, prefix: str) -> list:
+        return [_describe_blob(blob) for blob in self.bucket.list_blobs(prefix=prefix)]
+
+    def upload(self, src_file: Path, path: str, workers: int = WORKERS) -> dict:
+        # large files go up in parallel parts composed server-side
+        blob = upload_file(
+            self.bucket, src_file=src_file, dst_name=path, workers=workers
+        )
+        if blob.size is None:
+            blob.reload()
+        return _describe_blob(blob)
+
+    @contextmanager
+    def open_write(self, path: str):
+        # the object only exists once the resumable upload is finalized, by
+        # close(); a failed write cancels the upload instead
+        writer = self.bucket.blob(path).open("wb", chunk_size=CHUNK_SIZE)
+        try:
+            yield _PendingUpload(writer)
+        except BaseException:
+            _abort_upload(writer)
+            raise
+        writer.close()
+
+    def read_bytes(self, path: str) -> tuple[bytes, int]:
+        blob = self.bucket.blob(path)
+        data = blob.download_as_bytes()
+        if blob.generation is None:
+            # some emulators leave the generation header off downloads
+            blob.reload()
+        return data, blob.generation
+
+    def write_bytes(
+        self,
+        path: str,
+        data: bytes,
+        if_generation_match: int | None = None,
+        content_type: str | None = None,
+    ) -> int:
+        blob = self.bucket.blob(path)
+        blob.upload_from_string(
+            data, content_type=content_type, if_generation_match=if_generation_match
+        )
+        return blob.generation
+
+    def delete(self, paths: list, missing_ok: bool = False) -> None:
+        self.bucket.delete_blobs(
+            [self.bucket.blob(path) for path in paths],
+            on_error=(lambda _: None) if missing_ok else None,
+        )
+
+
+class EmulatorStore(GCSStore):
+    """
+    A bucket of a local GCS emulator, e.g. fake-gcs-server
+
+    The emulator is set for the whole process, for the storage client and
+    for gcsfs alike, and the bucket is created if the emulator has none.
+    """
+
+    def __init__(self, bucket_name: str, host: str = EMULATOR_HOST):
+        os.environ["STORAGE_EMULATOR_HOST"] = host
+        fsspec.config.conf.setdefault("gs", {})["token"] = "anon"
+        super().__init__(bucket_name, project="emulator")
+        if not self.bucket.exists():
+            logger.info(f"Creating bucket {bucket_name} in the emulator at {host}")
+            self.bucket.create()
+
+
+class LocalStore(Store):
+    """
+    A local directory standing in for a bucket
+
+    Generations are modification times in nanoseconds; conditional writes
+    hold an exclusive lock on the directory while they compare and replace.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.fs = fsspec.filesystem("file")
+
+    def uri(self, path: str = "") -> str:
+        return f"file://{self.fs_path(path)}"
+
+    def fs_path(self, path: str = "") -> str:
+        return f"{self.root}/{path}"
+
+    def _path(self, path: str) -> Path:
+        return self.root / path
+
+    def exists(self, path: str) -> bool:
+        return self._path(path).is_file()
+
+    def stat(self, path: str) -> dict:
+        try:
+            stat = self._path(path).stat()
+        except FileNotFoundError:
+            raise NotFound(f"No such object: {self.uri(path)}") from None
+        return {
+            "path": path,
+            "size": stat.st_size,
+            "crc32c": None,
+            "generation": stat.st_mtime_ns,
+        }
+
+    def list(self, prefix: str) -> list:
+        # walk from the deepest directory the prefix names
+        base = self._path(prefix) if prefix.endswith("/") else self._path(prefix).parent
+        if not base.is_dir():
+            return []
+        paths = (
+            path.relative_to(self.root).as_posix()
+            for path in base.rglob("*")
+            # dotfiles are locks and writes in progress
+            if path.is_file() and not path.name.startswith(".")
+        )
+        return [self.stat(path) for path in sorted(paths) if path.startswith(prefix)]
+
+    def upload(self, src_file: Path, path: str, workers: int = WORKERS) -> dict:
+        dst = self._path(path)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+        shutil.copyfile(src_file, tmp_path)
+        tmp_path.replace(dst)
+        return self.stat(path)
+
+    @contextmanager
+    def open_write(self, path: str):
+        dst = self._path(path)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as file:
+                yield file
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        tmp_path.replace(dst)
+
+    def read_bytes(self, path: str) -> tuple[bytes, int]:
+        try:
+            data = self._path(path).read_bytes()
+        except FileNotFoundError:
+            raise NotFound(f"No such object: {self.uri(path)}") from None
+        return data, self.stat(path)["generation"]
+
+    def write_bytes(
+        self,
+        path: str,
+        data: bytes,
+        if_generation_match: int | None = None,
+        content_type: str | None = None,
+    ) -> int:
+        dst = self._path(path)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if if_generation_match is not None:
+                generation = self.stat(path)["generation"] if dst.exists() else 0
+                if generation != if_generation_match:
+                    raise PreconditionFailed(
+                        f"{self.uri(path)} is at generation {generation}, "
+                        f"not {if_generation_match}"
+                    )
+            tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(dst)
+            return self.stat(path)["generation"]
+
+    def delete(self, paths: list, missing_ok: bool = False) -> None:
+        for path in paths:
+            try:
+                self._path(path).unlink()
+            except FileNotFoundError:
+                if not missing_ok:
+                    raise NotFound(f"No such object: {self.uri(path)}") from None
+
+
+def open_store(location: str, project: str | None = None) -> Store:
+    """
+    Store of a bucket location; see the module docstring for the schemes
+
+    Parameters
+    ----------
+    location: str
+        bucket name, or URI of the bucket or directory
+    project: str | None
+        GCP project of GCS buckets
+    """
+    if "://" in location:
+        scheme, name = location.split("://", 1)
+    elif location.startswith("/"):
+        scheme, name = "file", location
+    else:
+        scheme, name = BACKEND, location
+    name = name.rstrip("/")
+    if scheme in ("gs", "gcs"):
+        return GCSStore(name, project=project)
+    if scheme == "file":
+        return LocalStore(name)
+    if scheme == "local":
+        return LocalStore(Path(LOCAL_ROOT) / name)
+    if scheme == "emulator":
+        return EmulatorStore(name)
+    raise ValueError(f"Invalid storage backend: {scheme}")
@@ -0,0 +1,168 @@
+"""
+Read-ahead, block-cached reader for remote files
+
+Remote inputs such as gs:// objects are read in fixed-size blocks by range
+request. Upcoming blocks are fetched in parallel while the current one is
+consumed, so a sequential read is bound by bandwidth rather than by request
+latency. Blocks can also be kept in a local cache directory, keyed by the
+object's generation, that later runs on the same worker read instead of the
+network.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import fsspec
+
+from retry import record
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = int(os.getenv("READ_BLOCK_SIZE", 8 << 20))
+# blocks fetched ahead of the one being read
+PREFETCH = int(os.getenv("READ_PREFETCH", 4))
+# unset to disable the persistent cache
+CACHE_DIR = os.getenv("BLOCK_CACHE_DIR")
+CACHE_MAX_BYTES = int(os.getenv("BLOCK_CACHE_MAX_BYTES", 4 << 30))
+
+
+def is_remote(path) -> bool:
+    """Is path a URI of a non-local filesystem, e.g. gs://?"""
+    if hasattr(path, "read"):
+        return False
+    path = str(path)
+    return "://" in path and not path.startswith("file://")
+
+
+def prune_cache(cache_dir: Path, max_bytes: int = CACHE_MAX_BYTES) -> None:
+    """Removes the least recently used blocks until the cache fits max_bytes"""
+    blocks = [(p.stat(), p) for p in Path(cache_dir).glob("*/*") if p.is_file()]
+    total = sum(stat.st_size for stat, _ in blocks)
+    for stat, path in sorted(blocks, key=lambda block: block[0].st_mtime):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= stat.st_size
+
+
+class BlockCachedFile(io.RawIOBase):
+    """
+    Seekable, read-only file over a remote object, read in prefetched blocks
+
+    Parameters
+    ----------
+    uri: str
+        fsspec URI of the object
+    block_size: int
+        bytes per range request and per cached block
+    prefetch: int
+        blocks fetched ahead of the read position, concurrently
+    cache_dir: str | Path | None
+        directory of the persistent block cache; no cache if None
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        block_size: int = BLOCK_SIZE,
+        prefetch: int = PREFETCH,
+        cache_dir: str | Path | None = CACHE_DIR,
+    ):
+        self.uri = uri
+        self.block_size = block_size
+        self.prefetch = prefetch
+        self._fs, self._path = fsspec.core.url_to_fs(uri)
+        info = self._fs.info(self._path)
+        self.size = info["size"]
+        self._nblocks = -(-self.size // block_size)
+        self._cache = None
+        if cache_dir:
+            # a new generation of the object never hits blocks of the old one
+            version = next(
+                (info[key] for key in ("generation", "etag", "mtime") if info.get(key)),
+                "",
+            )
+            key = hashlib.sha256(f"{uri}:{version}:{block_size}".encode()).hexdigest()
+            self._cache = Path(cache_dir) / key
+            self._cache.mkdir(parents=True, exist_ok=True)
+            prune_cache(cache_dir)
+        self._executor = ThreadPoolExecutor(max_workers=max(prefetch, 1))
+        self._blocks = {}
+        self._pos = 0
+        self._started = time.perf_counter()
+        self._fetched = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        if self._pos >= self.size:
+            return 0
+        idx, offset = divmod(self._pos, self.block_size)
+        data = self._block(idx)
+        size = min(len(buffer), len(data) - offset)
+        buffer[:size] = data[offset : offset + size]
+        self._pos += size
+        return size
+
+    def _block(self, idx: int) -> bytes:
+        for ahead in range(idx, min(idx + 1 + self.prefetch, self._nblocks)):
+            if ahead not in self._blocks:
+                self._blocks[ahead] = self._executor.submit(self._fetch, ahead)
+        # blocks behind the reader are not read again by sequential readers
+        for behind in [i for i in self._blocks if i < idx]:
+            self._blocks.pop(behind).cancel()
+        return self._blocks[idx].result()
+
+    def _fetch(self, idx: int) -> bytes:
+        cached = self._cache / f"{idx:06d}" if self._cache else None
+        if cached is not None and cached.exists():
+            os.utime(cached)
+            record("blockcache.hits")
+            return cached.read_bytes()
+        start = idx * self.block_size
+        end = min(start + self.block_size, self.size)
+        data = self._fs.cat_file(self._path, start=start, end=end)
+        record("blockcache.misses")
+        self._fetched += len(data)
+        if cached is not None:
+            # write then rename, so concurrent readers never see a partial block
+            tmp_path = cached.with_suffix(f".{os.getpid()}.{idx}.tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(cached)
+        return data
+
+    def close(self) -> None:
+        if not self.closed:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            elapsed = time.perf_counter() - self._started
+            logger.info(
+                f"Read {self.uri}: {self._fetched} bytes fetched in {elapsed:.1f}s "
+                f"({self._fetched / max(elapsed, 1e-6) / (1 << 20):.1f} MiB/s)"
+            )
+        super().close()
+
+
+def open_cached(uri: str, **kwargs) -> io.BufferedReader:
+    """Opens uri for buffered reading through a BlockCachedFile"""
+    raw = BlockCachedFile(uri, **kwargs)
+    return io.BufferedReader(raw, buffer_size=min(raw.block_size, 1 << 20))
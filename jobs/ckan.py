@@ -0,0 +1,120 @@
+"""
+Client for the Toronto Open Data CKAN API
+
+Package metadata is fetched over a shared, connection-pooled session and
+cached on disk per package, so resolving the resource URL of every year
+costs a single request.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from retry import CKAN_POLICY, RequestPolicy, call_with_retries
+
+# Toronto Open Data is stored in a CKAN instance. It's APIs are documented here:
+# https://docs.ckan.org/en/latest/api/
+
+# To hit our API, you'll be making requests to:
+BASE_URL = "https://ckan0.cf.opendata.inter.prod-toronto.ca/api/3/action/"
+
+# Datasets are called "packages". Each package can contain many "resources"
+# To retrieve the metadata for this package and its resources, use the package name in this page's URL:
+
+# example of link to download:
+# https://ckan0.cf.opendata.inter.prod-toronto.ca/dataset/7e876c24-177c-4605-9cef-e50dd74c617f/resource/98b63ba7-24ba-41da-a788-1c28d21a39d1/download/bikeshare-ridership-2017.zip
+# {BASE_CKAN_URL}/dataset/<package_id>/resource/<resource_id>/download/<file_name.type>
+
+PACKAGE_ID = "311-service-requests-customer-initiated"
+CACHE_DIR = Path(
+    os.getenv("CKAN_CACHE_DIR", Path(tempfile.gettempdir()) / "ckan-cache")
+)
+# seconds before cached package metadata is fetched again
+CACHE_TTL = float(os.getenv("CKAN_CACHE_TTL", 3600))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+
+logger = logging.getLogger(__name__)
+
+_session = None
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide session, creating it on first use"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def get_package_metadata(
+    action: str = "package_show",
+    resource_id: str = PACKAGE_ID,
+    ttl: float = CACHE_TTL,
+    cache_dir: Path = CACHE_DIR,
+    policy: RequestPolicy = CKAN_POLICY,
+) -> dict:
+    """
+    See CKAN API endpoints for different action params
+
+    Successful responses are cached in cache_dir for ttl seconds; set ttl
+    to 0 to always fetch. Requests are retried, and hedged, per policy.
+    """
+    cache_path = Path(cache_dir) / f"{resource_id}.{action}.json"
+    if ttl > 0 and cache_path.exists():
+        age = time.time() - cache_path.stat().st_mtime
+        if age < ttl:
+            logger.debug(f"Using {cache_path}, {age:.0f}s old")
+            return json.loads(cache_path.read_text())
+
+    params = {"id": resource_id}
+
+    def fetch(timeout: float) -> dict:
+        response = get_session().get(BASE_URL + action, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    package = call_with_retries(fetch, policy=policy, name="ckan")
+    if ttl > 0 and package.get("success"):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename, so concurrent readers never see a partial file
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(package))
+        tmp_path.replace(cache_path)
+    return package
+
+
+def resolve_zip_uris(resource_id: str = PACKAGE_ID) -> dict:
+    """
+    Maps every year in the package to the URL of its resource
+
+    Returns
+    -------
+    urls: dict
+        year as str to resource URL; the first resource naming a year wins
+    """
+    resources = get_package_metadata(resource_id=resource_id)["result"]["resources"]
+    urls = {}
+    for resource in resources:
+        for year in re.findall(r"(?<!\d)(\d{4})(?!\d)", resource["name"]):
+            urls.setdefault(year, resource["url"])
+    return urls
+
+
+def get_zip_uri(year: str = "2020") -> str:
+    """Retrieve URL of 311 service call data given the year"""
+    try:
+        url = resolve_zip_uris()[str(year)]
+    except KeyError:
+        raise ValueError(f"No 311 resource found for {year}") from None
+    logger.info(f"Retrieving from {url}")
+    return url
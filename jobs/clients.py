@@ -0,0 +1,107 @@
+"""
+Process-wide GCS and BigQuery clients
+
+Building a client repeats credential discovery and opens a fresh connection
+pool, so clients are created once per project (and location, for BigQuery)
+and shared by every caller in the process, including thread-pool workers.
+Each client is handed an authorized session whose connection pool is sized
+by GCP_HTTP_POOL_SIZE, so that concurrent uploads and loads are not
+throttled to the default ten connections.
+"""
+
+import logging
+import os
+import threading
+
+import google.auth
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import bigquery, storage
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("GCP_HTTP_POOL_SIZE", 32))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _pooled_session(credentials, pool_size: int) -> AuthorizedSession:
+    """Session authorized by credentials, keeping pool_size connections open"""
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get_client(key: tuple, build):
+    # keyed by pid too, so a forked worker never reuses its parent's sockets
+    key = (os.getpid(), *key)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                logger.debug(f"Creating client for {key[1:]}")
+                client = _clients[key] = build()
+    return client
+
+
+def get_storage_client(
+    project: str | None = None, pool_size: int = POOL_SIZE
+) -> storage.Client:
+    """
+    Returns the shared storage client of project
+
+    Parameters
+    ----------
+    project: str | None
+        GCP project; inferred from the environment if None
+    pool_size: int
+        connections kept open to GCS; only applied when the client is created
+    """
+
+    def build() -> storage.Client:
+        if os.getenv("STORAGE_EMULATOR_HOST"):
+            # as storage.Client does itself, emulators take no credentials
+            credentials = AnonymousCredentials()
+        else:
+            credentials, _ = google.auth.default(scopes=storage.Client.SCOPE)
+        return storage.Client(
+            project=project,
+            credentials=credentials,
+            _http=_pooled_session(credentials, pool_size),
+        )
+
+    return _get_client(("storage", project), build)
+
+
+def get_bigquery_client(
+    project: str | None = None, location: str | None = None, pool_size: int = POOL_SIZE
+) -> bigquery.Client:
+    """
+    Returns the shared BigQuery client of project and location
+
+    Parameters
+    ----------
+    project: str | None
+        GCP project; inferred from the environment if None
+    location: str | None
+        default location of jobs and datasets
+    pool_size: int
+        connections kept open to BigQuery; only applied when the client is
+        created
+    """
+
+    def build() -> bigquery.Client:
+        credentials, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+        return bigquery.Client(
+            project=project,
+            location=location,
+            credentials=credentials,
+            _http=_pooled_session(credentials, pool_size),
+        )
+
+    return _get_client(("bigquery", project, location), build)
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""
+Compaction of the Hive-style parquet lake under raw/pq/
+
+Compaction merges the small files of each partition into files of about
+TARGET_FILE_SIZE, sorted by creation_datetime. The pipeline writes one file
+per partition, so a month layout only fragments when other writers add
+files to it, e.g. backfills. The per-ward layout is fragmented from the
+start: a month of 311 requests is split into a file per ward, each far
+below the target. With across_wards, the ward partitions of each month are
+merged into files of the month partition, sorted by ward_id and then by
+creation_datetime, which keeps each ward's rows together unless the write
+profile sorts them otherwise. Every file has the ward_id column, so loads
+and lake.read_facts read the merged files as they did the ward partitions.
+
+New files are written next to the old ones under fresh names, and the swap
+is committed by the conditional manifest write; only then are the old
+files deleted. If anything fails before the commit, the new files are
+removed and the partition is left as it was.
+
+The swap is atomic for readers that take the year's files from the
+manifest, as extract_load_service_calls does for partitioned years.
+Readers that list the year instead, e.g. a load of the wildcard
+raw/pq/year=YYYY/*, see both the old and the new files between the
+manifest commit and the deletion of the old files, and would load their
+rows twice; do not run such loads alongside a compaction.
+"""
+
+import argparse
+import logging
+import math
+import os
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from backends import Store, open_store
+from lake import PQ_ROOT, year_prefix
+from manifest import Manifest
+from profiles import DEFAULT_PROFILE, PROFILES, write_table
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CLOUD_PROJECT = os.getenv("TF_VAR_project_id")
+BUCKET = os.getenv("TF_VAR_gcs_bucket")
+TARGET_FILE_SIZE = int(os.getenv("COMPACT_TARGET_FILE_SIZE", 128 << 20))
+# files under this fraction of the target are merged
+SMALL_FILE_FRACTION = 0.75
+WORKERS = int(os.getenv("COMPACT_WORKERS", 4))
+
+
+def list_partitions(
+    store: Store,
+    year: str | None = None,
+    root: str = PQ_ROOT,
+    across_wards: bool = False,
+) -> dict:
+    """
+    Parquet files of each partition directory of the lake
+
+    Parameters
+    ----------
+    store: Store
+        bucket holding the lake
+    year: str | None
+        year to list; every year if None
+    across_wards: bool
+        if true, the files of ward_id= partitions are listed under the month
+        partition above them
+
+    Returns
+    -------
+    partitions: dict
+        partition directory to a list of (path, size), by path
+    """
+    prefix = year_prefix(year, root) if year is not None else root
+    partitions = defaultdict(list)
+    for obj in store.list(prefix + "/"):
+        directory, name = obj["path"].rsplit("/", 1)
+        if across_wards and directory.rsplit("/", 1)[-1].startswith("ward_id="):
+            directory = directory.rsplit("/", 1)[0]
+        # only Hive partitions; single-file years and hidden files are left be
+        if "=" in directory and name.endswith(".parquet") and name[0] not in "._":
+            partitions[directory].append((obj["path"], obj["size"]))
+    return {directory: sorted(files) for directory, files in partitions.items()}
+
+
+def plan_partition(
+    directory: str, files: list, target_size: int = TARGET_FILE_SIZE
+) -> dict:
+    """
+    What compacting one partition would do
+
+    Returns
+    -------
+    plan: dict
+        partition, the small files to merge, and the file counts and bytes
+        before and (estimated) after
+    """
+    small = [
+        (path, size) for path, size in files if size < SMALL_FILE_FRACTION * target_size
+    ]
+    small_bytes = sum(size for _, size in small)
+    num_merged = math.ceil(small_bytes / target_size) if small else 0
+    if len(small) < 2 or num_merged >= len(small):
+        # nothing to gain
+        small, num_merged = [], 0
+    total_bytes = sum(size for _, size in files)
+    return {
+        "partition": directory,
+        "merge": [path for path, _ in small],
+        "files_before": len(files),
+        "files_after": len(files) - len(small) + num_merged,
+        "bytes_before": total_bytes,
+        "bytes_after": total_bytes,
+        "num_merged": num_merged,
+    }
+
+
+def compact_partition(
+    store: Store,
+    plan: dict,
+    profile: str = DEFAULT_PROFILE,
+    across_wards: bool = False,
+) -> list:
+    """
+    Writes the merged files of a planned partition, sorted by creation_datetime,
+    or by ward_id first if across_wards
+
+    The files merged are left in place; see compact_year. Each file is written
+    with the write profile, which may sort its rows further.
+
+    Returns
+    -------
+    paths: list
+        object names of the files written
+    """
+    keys = ["ward_id", "creation_datetime"] if across_wards else ["creation_datetime"]
+    table = pa.concat_tables(
+        pq.read_table(store.fs_path(path), filesystem=store.fs)
+        for path in plan["merge"]
+    ).sort_by([(key, "ascending") for key in keys])
+    rows_per_file = math.ceil(table.num_rows / plan["num_merged"])
+    # unique per run, so a crashed run's leftovers never collide with these
+    token = uuid.uuid4().hex[:8]
+    paths = []
+    try:
+        for i, offset in enumerate(range(0, table.num_rows, rows_per_file)):
+            path = f"{plan['partition']}/part-{token}-{i:03d}.parquet"
+            paths.append(path)
+            write_table(
+                table.slice(offset, rows_per_file),
+                store.fs_path(path),
+                profile=profile,
+                filesystem=store.fs,
+            )
+    except BaseException:
+        store.delete(paths, missing_ok=True)
+        raise
+    logger.info(
+        f"{plan['partition']}: {len(plan['merge'])} files merged into {len(paths)}"
+    )
+    return paths
+
+
+def _artifact_kind(manifest: Manifest, year: str, prefix: str) -> str | None:
+    """Kind of the manifest artifact listing the files under prefix"""
+    artifacts = manifest.years.get(str(year), {}).get("artifacts", {})
+    # the ward layout replaces the month layout's files, so prefer it
+    for kind in ("pq_hive_ward", "pq_hive"):
+        if artifacts.get(kind, {}).get("path") == prefix:
+            return kind
+    return None
+
+
+def compact_year(
+    bucket_name: str,
+    year: str,
+    target_size: int = TARGET_FILE_SIZE,
+    dry_run: bool = False,
+    workers: int = WORKERS,
+    profile: str = DEFAULT_PROFILE,
+    across_wards: bool = False,
+) -> list:
+    """
+    Compacts every partition of a year of the lake
+
+    Parameters
+    ----------
+    bucket_name: str
+        name of bucket in GCS, or a location taken by backends.open_store
+    year: str
+        year to compact
+    target_size: int
+        size in bytes the merged files aim for
+    dry_run: bool
+        if true, only report what would be done
+    workers: int
+        partitions compacted concurrently
+    profile: str
+        name of the parquet write profile of the merged files
+    across_wards: bool
+        if true, merge the ward partitions of each month into the month
+        partition
+
+    Returns
+    -------
+    plans: list
+        one plan per partition, see plan_partition; after a real run, the
+        bytes_after of each compacted partition are the actual sizes
+    """
+    store = open_store(bucket_name, project=GOOGLE_CLOUD_PROJECT)
+    partitions = list_partitions(store, year, across_wards=across_wards)
+    plans = [
+        plan_partition(directory, files, target_size)
+        for directory, files in sorted(partitions.items())
+    ]
+    todo = [plan for plan in plans if plan["merge"]]
+    if dry_run or not todo:
+        report(plans, year)
+        return plans
+
+    manifest = Manifest.load(store)
+    written = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(compact_partition, store, plan, profile, across_wards)
+                for plan in todo
+            ]
+        # every partition is done by now, so all that was written is known
+        for plan, future in zip(todo, futures):
+            if future.exception() is None:
+                plan["written"] = future.result()
+                written += plan["written"]
+        for future in futures:
+            future.result()
+        merged = [path for plan in todo for path in plan["merge"]]
+        kind = _artifact_kind(manifest, year, year_prefix(year))
+        if kind is None:
+            logger.warning(f"No manifest artifact lists {year_prefix(year)}")
+        else:
+            manifest.replace_files(year, kind, removed=merged, added=written)
+            # the commit point: until this succeeds the old files are the truth
+            manifest.save()
+    except BaseException:
+        logger.error(f"Compaction of {year} failed; removing {len(written)} new files")
+        store.delete(written, missing_ok=True)
+        raise
+    store.delete(merged)
+
+    sizes = {
+        path: size
+        for files in list_partitions(store, year, across_wards=across_wards).values()
+        for path, size in files
+    }
+    for plan in todo:
+        kept = set(plan["written"])
+        kept.update(path for path, _ in partitions[plan["partition"]])
+        kept.difference_update(plan["merge"])
+        plan["bytes_after"] = sum(sizes.get(path, 0) for path in kept)
+    report(plans, year)
+    return plans
+
+
+def report(plans: list, year: str) -> None:
+    """Logs file counts and sizes before and after compaction of a year"""
+    for plan in plans:
+        if plan["merge"]:
+            logger.info(
+                f"{plan['partition']}: {plan['files_before']} -> "
+                f"{plan['files_after']} files, {plan['bytes_before']} -> "
+                f"{plan['bytes_after']} bytes"
+            )
+    totals = {
+        key: sum(plan[key] for plan in plans)
+        for key in ("files_before", "files_after", "bytes_before", "bytes_after")
+    }
+    logger.info(
+        f"{year}: {sum(bool(plan['merge']) for plan in plans)} of {len(plans)} "
+        f"partitions to compact; {totals['files_before']} -> "
+        f"{totals['files_after']} files, {totals['bytes_before']} -> "
+        f"{totals['bytes_after']} bytes"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="toronto-311-compact",
+        description="Merges small files of the partitioned parquet lake",
+    )
+    opt = parser.add_argument
+    opt(
+        "-b",
+        "--bucket_name",
+        type=str,
+        default=BUCKET,
+        help="GCS bucket holding the parquet lake, or file:///<dir> or "
+        "emulator://<bucket>",
+    )
+    opt("-y", "--year", nargs="+", default=["2020"], type=str)
+    opt(
+        "--target_size_mb",
+        default=TARGET_FILE_SIZE >> 20,
+        type=int,
+        help="Size in MiB the merged files aim for",
+    )
+    opt(
+        "-n",
+        "--dry_run",
+        action="store_true",
+        default=False,
+        help="If specified, only reports what would be compacted",
+    )
+    opt("-w", "--workers", default=WORKERS, type=int)
+    opt(
+        "--across_wards",
+        action="store_true",
+        default=False,
+        help="If specified, merges the ward partitions of each month into one",
+    )
+    opt(
+        "--profile",
+        default=DEFAULT_PROFILE,
+        choices=list(PROFILES),
+        help="Parquet write profile of the merged files",
+    )
+    opt(
+        "--loglevel",
+        default="INFO",
+        type=str.upper,
+        help="Log level, from DEBUG to CRITICAL",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=args.loglevel)
+    for year in args.year:
+        compact_year(
+            bucket_name=args.bucket_name,
+            year=year,
+            target_size=args.target_size_mb << 20,
+            dry_run=args.dry_run,
+            workers=args.workers,
+            profile=args.profile,
+            across_wards=args.across_wards,
+        )
@@ -0,0 +1,312 @@
+"""
+Parallel, resumable HTTP downloads
+
+Files are fetched with HTTP Range requests over several connections when the
+server advertises byte ranges and a length; otherwise over a single stream.
+Progress is recorded in a sidecar next to the destination, so a download
+interrupted by a dropped connection, or by the whole process, resumes from
+the bytes already written instead of starting over, as long as the sidecar
+shows they came from the same version of the file.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from retry import DOWNLOAD_POLICY, RequestPolicy, call_with_retries
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_SUFFIX = ".progress.json"
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed or fails verification"""
+
+
+class IncompleteDownload(DownloadError):
+    """Raised when a response ends before all requested bytes arrived"""
+
+
+def probe(url: str, session: requests.Session, timeout: float = 10) -> dict:
+    """
+    Asks the server for the size and range support of url
+
+    Returns
+    -------
+    info: dict
+        size (None if unknown), ranges (bool), etag and md5 (None if absent)
+    """
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    if response.status_code == 405:
+        # HEAD not allowed; a one-byte range reveals the same headers
+        response = session.get(
+            url, headers={"Range": "bytes=0-0"}, stream=True, timeout=timeout
+        )
+        response.close()
+    response.raise_for_status()
+    headers = response.headers
+    size = headers.get("Content-Length")
+    if response.status_code == 206:
+        size = headers.get("Content-Range", "").rpartition("/")[2]
+        size = None if size in ("", "*") else size
+        headers = {**headers, "Accept-Ranges": "bytes"}
+    # a compressed transfer length says nothing about the file's size
+    if headers.get("Content-Encoding", "identity") != "identity":
+        size = None
+    md5 = None
+    if "Content-MD5" in headers:
+        md5 = base64.b64decode(headers["Content-MD5"]).hex()
+    return {
+        "url": response.url,
+        "size": int(size) if size is not None else None,
+        "ranges": headers.get("Accept-Ranges", "").lower() == "bytes",
+        "etag": headers.get("ETag"),
+        "md5": md5,
+    }
+
+
+def _same_source(path: Path, source: dict) -> bool:
+    """
+    Was the sidecar at path written for source? Only a source with an ETag
+    or a size can be told apart from a newer version of the file.
+    """
+    if not path.exists() or (source["etag"] is None and source["size"] is None):
+        return False
+    state = json.loads(path.read_text())
+    return all(state.get(key) == source[key] for key in source)
+
+
+class _Progress:
+    """Bytes written per part, persisted to a sidecar file"""
+
+    def __init__(self, path: Path, source: dict, parts: list):
+        self.path = path
+        self.source = source
+        self.parts = parts
+        self.done = [0] * len(parts)
+        self._lock = threading.Lock()
+        if _same_source(path, source):
+            state = json.loads(path.read_text())
+            if state.get("parts") == [list(p) for p in parts]:
+                self.done = state["done"]
+                logger.info(f"Resuming download with {sum(self.done)} bytes done")
+
+    def reset(self) -> None:
+        """Forgets every byte done, e.g. when the file they went to is gone"""
+        with self._lock:
+            self.done = [0] * len(self.parts)
+
+    def update(self, idx: int, nbytes: int) -> None:
+        with self._lock:
+            self.done[idx] += nbytes
+            state = {**self.source, "parts": self.parts, "done": self.done}
+            self.path.write_text(json.dumps(state))
+
+
+def _fetch_part(
+    session: requests.Session,
+    url: str,
+    dst: Path,
+    progress: _Progress,
+    idx: int,
+    chunk_size: int,
+    policy: RequestPolicy,
+) -> None:
+    start, end = progress.parts[idx]
+
+    def attempt(timeout: float) -> None:
+        # each attempt resumes from the bytes already written
+        offset = start + progress.done[idx]
+        if offset > end:
+            return
+        with session.get(
+            url,
+            headers={"Range": f"bytes={offset}-{end}"},
+            stream=True,
+            timeout=timeout,
+        ) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise DownloadError(f"Range request ignored for part {idx}")
+            with open(dst, "r+b") as part_file:
+                part_file.seek(offset)
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    part_file.write(chunk)
+                    progress.update(idx, len(chunk))
+        if start + progress.done[idx] <= end:
+            raise IncompleteDownload(f"Part {idx} ended early")
+
+    call_with_retries(
+        attempt, policy=policy, name="download", retry_on=(IncompleteDownload,)
+    )
+
+
+def _fetch_stream(
+    session: requests.Session,
+    url: str,
+    dst: Path,
+    chunk_size: int,
+    policy: RequestPolicy,
+    resumable: bool,
+    resume: bool = False,
+) -> None:
+    # resume a failed attempt, or with resume a file left by an earlier run,
+    # if the server takes ranges; else restart
+    started = [resume]
+
+    def attempt(timeout: float) -> None:
+        offset = (
+            dst.stat().st_size if resumable and any(started) and dst.exists() else 0
+        )
+        started.append(True)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with session.get(
+            url, headers=headers, stream=True, timeout=timeout
+        ) as response:
+            if response.status_code == 416:
+                # nothing left to fetch
+                return
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                offset = 0
+            with open(dst, "r+b" if offset else "wb") as out:
+                out.seek(offset)
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    out.write(chunk)
+
+    call_with_retries(attempt, policy=policy, name="download")
+
+
+def verify(dst: Path, size: int | None = None, md5: str | None = None) -> None:
+    """Checks the downloaded file against the expected size and MD5"""
+    actual_size = dst.stat().st_size
+    if size is not None and actual_size != size:
+        raise DownloadError(f"{dst} is {actual_size} bytes, expected {size}")
+    if md5 is not None:
+        digest = hashlib.md5()
+        with open(dst, "rb") as downloaded:
+            while chunk := downloaded.read(1 << 20):
+                digest.update(chunk)
+        if digest.hexdigest() != md5.lower():
+            raise DownloadError(f"{dst} MD5 {digest.hexdigest()} != {md5}")
+    logger.info(f"Verified {dst}: {actual_size} bytes")
+
+
+def download(
+    url: str,
+    dst: Path,
+    connections: int = 4,
+    part_size: int = 16 << 20,
+    chunk_size: int = 1 << 20,
+    policy: RequestPolicy = DOWNLOAD_POLICY,
+    md5: str | None = None,
+    session: requests.Session | None = None,
+) -> Path:
+    """
+    Downloads url to dst, over several ranged connections where possible
+
+    Parameters
+    ----------
+    url: str
+        file to download
+    dst: Path
+        local destination; a partial file left by an earlier attempt is
+        resumed if its progress sidecar matches the source
+    connections: int
+        number of concurrent range requests
+    part_size: int
+        bytes per range request
+    chunk_size: int
+        bytes read from the socket at a time
+    policy: RequestPolicy
+        retries, backoff and per-request timeout; each retry of a part
+        resumes where the last attempt stopped
+    md5: str | None
+        expected hex MD5; taken from Content-MD5 or a plain MD5 ETag if not
+        given
+    session: requests.Session | None
+        session to issue requests from
+
+    Returns
+    -------
+    dst: Path
+        the verified download
+    """
+    session = session or requests.Session()
+    dst = Path(dst)
+    info = call_with_retries(
+        lambda timeout: probe(url, session=session, timeout=timeout),
+        policy=policy,
+        name="download",
+    )
+    etag = (info["etag"] or "").strip('"')
+    if md5 is None:
+        md5 = info["md5"]
+    if md5 is None and len(etag) == 32 and all(c in "0123456789abcdef" for c in etag):
+        md5 = etag
+    progress_path = dst.with_name(dst.name + PROGRESS_SUFFIX)
+
+    if info["ranges"] and info["size"] and connections > 1:
+        size = info["size"]
+        parts = [
+            (start, min(start + part_size, size) - 1)
+            for start in range(0, size, part_size)
+        ]
+        source = {"url": info["url"], "size": size, "etag": info["etag"]}
+        progress = _Progress(progress_path, source=source, parts=parts)
+        if not dst.exists() or dst.stat().st_size != size:
+            # the bytes the sidecar counts are not in dst
+            progress.reset()
+        if sum(progress.done) == 0:
+            with open(dst, "wb") as out:
+                out.truncate(size)
+        logger.info(
+            f"Downloading {size} bytes from {url} in {len(parts)} parts "
+            f"over {connections} connections"
+        )
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = [
+                executor.submit(
+                    _fetch_part,
+                    session,
+                    info["url"],
+                    dst,
+                    progress,
+                    idx,
+                    chunk_size,
+                    policy,
+                )
+                for idx in range(len(parts))
+            ]
+            for future in futures:
+                future.result()
+    else:
+        source = {"url": info["url"], "size": info["size"], "etag": info["etag"]}
+        resume = dst.exists() and _same_source(progress_path, source)
+        progress_path.write_text(json.dumps(source))
+        logger.info(
+            f"Downloading {url} over a single stream"
+            + (f", from byte {dst.stat().st_size}" if resume else "")
+        )
+        _fetch_stream(
+            session,
+            info["url"],
+            dst,
+            chunk_size=chunk_size,
+            policy=policy,
+            resumable=info["ranges"],
+            resume=resume,
+        )
+
+    verify(dst, size=info["size"], md5=md5)
+    if progress_path.exists():
+        os.remove(progress_path)
+    return dst
@@ -2,65 +2,154 @@
 # coding: utf-8
 
 from pathlib import Path
-from google.cloud import storage, bigquery
-import requests
 from shutil import unpack_archive
+import numpy as np
 import pandas as pd
-from tempfile import TemporaryDirectory
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import fsspec
+from tempfile import TemporaryDirectory, gettempdir
 import argparse
+import io
 import logging
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Iterable, Iterator
 
 import os
 
+from google.api_core.exceptions import NotFound
+
+from archive import (
+    codec_of,
+    compress_file,
+    compress_stream,
+    decompress_file,
+    open_raw,
+    raw_csv_name,
+)
+from backends import Store, open_store
+from blockcache import is_remote
+from ckan import get_session, get_zip_uri
+from clients import get_bigquery_client
+from download import download
+from lake import (
+    LAYOUTS,
+    PQ_ROOT,
+    artifact_kind,
+    delta_path,
+    is_delta,
+    list_matches,
+    load_uris,
+    remove_stale_partitions,
+    resolve_uris,
+    stats_path,
+    write_partitioned,
+    year_of,
+    year_prefix,
+)
+from loads import MAX_SOURCE_URIS, LoadScheduler, facts_job_config, job_stats
+from manifest import Manifest, describe_source
+from partitions import DayFingerprints, replace_partitions
+from profiles import DEFAULT_PROFILE, PROFILES, get_profile
+from retry import DOWNLOAD_POLICY, METRICS, call_with_retries
+from schema import (
+    DERIVED_COLUMNS,
+    FACTS_DTYPES,
+    FACTS_PANDAS_SCHEMA,
+    FACTS_SCHEMA,
+    PARTITION_FIELD,
+    RAW_ARROW_TYPES,
+    RAW_DTYPES,
+    RENAMED_COLUMNS,
+)
+from staging import (
+    INTERMEDIATES,
+    IPC_SUFFIX,
+    is_ipc,
+    iter_staged,
+    read_staged,
+    spool_tables,
+    write_ipc_tables,
+)
+from stats import ColumnStats, check, with_stats, write_sidecar
+from upload import WORKERS as UPLOAD_WORKERS
+from zipstream import ChunkReader, iter_zip_csv, tee_chunks
+
 
 GOOGLE_CLOUD_PROJECT = os.getenv("TF_VAR_project_id")
 os.environ["GOOGLE_CLOUD_PROJECT"] = GOOGLE_CLOUD_PROJECT
 LOCATION = os.getenv("TF_VAR_region")
 BUCKET = os.getenv("TF_VAR_gcs_bucket")
 DATASET = os.getenv("TF_VAR_bq_dataset")
-
-# Toronto Open Data is stored in a CKAN instance. It's APIs are documented here:
-# https://docs.ckan.org/en/latest/api/
-
-# To hit our API, you'll be making requests to:
-BASE_URL = "https://ckan0.cf.opendata.inter.prod-toronto.ca/api/3/action/"
-
-# Datasets are called "packages". Each package can contain many "resources"
-# To retrieve the metadata for this package and its resources, use the package name in this page's URL:
-
-# example of link to download:
-# https://ckan0.cf.opendata.inter.prod-toronto.ca/dataset/7e876c24-177c-4605-9cef-e50dd74c617f/resource/98b63ba7-24ba-41da-a788-1c28d21a39d1/download/bikeshare-ridership-2017.zip
-# {BASE_CKAN_URL}/dataset/<package_id>/resource/<resource_id>/download/<file_name.type>
+# dbt seed used to validate ward names parsed from the raw records
+WARD_LOOKUP_PATH = Path(
+    os.getenv(
+        "WARD_LOOKUP_PATH",
+        Path(__file__).parents[1] / "dbt-core-service/seeds/ward_id_lookup.csv",
+    )
+)
+# formats seen in the "Creation Date" field across the yearly extracts
+DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %H:%M",
+]
+# pd.read_csv's default null markers, so both engines agree on missing values
+CSV_NULL_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "n/a",
+    "nan",
+    "null",
+]
+# zips are downloaded here, and kept until extracted, so that a download cut
+# short, even by the end of the process, is resumed by the next run
+DOWNLOAD_DIR = Path(
+    os.getenv("DOWNLOAD_DIR", Path(gettempdir()) / "service_calls_downloads")
+)
+# bytes of csv parsed per batch by the arrow engine
+ARROW_BLOCK_SIZE = 16 << 20
+# days before the watermark an incremental extraction goes back, for late edits
+LOOKBACK_DAYS = float(os.getenv("INCREMENTAL_LOOKBACK_DAYS", 7))
+# manifest artifact kind of the delta of an incremental extraction
+DELTA_KIND = "pq_delta"
+# what a load does with data its column statistics show problems in
+SEVERITIES = ("warn", "error")
 
 logger = logging.getLogger(__name__)
 
 
-def get_package_metadata(
-    action: str = "package_show",
-    resource_id: str = "311-service-requests-customer-initiated",
-) -> dict:
-    """See CKAN API endpoints for different action params"""
-    params = {"id": resource_id}
-    package = requests.get(BASE_URL + action, params=params, timeout=5).json()
-    return package
-
-
-def get_zip_uri(year: str = "2020") -> str:
-    """Retrieve URL of 311 service call data given the year"""
-
-    resource_metadata = get_package_metadata()["result"]["resources"]
-    url = [
-        resource["url"] for resource in resource_metadata if year in resource["name"]
-    ][0]
-    logger.info(f"Retrieving from {url}")
-    return url
-
-
-def extract(zip_uri: str, tmp_dir: Path, chunk_size=10000) -> Path | None:
+def extract(
+    zip_uri: str, tmp_dir: Path, chunk_size=1 << 20, connections: int = 4
+) -> Path | None:
     """
-    Downloads zip from source to temporary dir, extracts and unzip the csv
+    Downloads zip from source to DOWNLOAD_DIR, extracts and unzip the csv
     to tmp_dir
 
+    The zip is only removed once extracted; a partial download left by an
+    earlier run is resumed, see download.download.
+
     Parameters:
     -------------
     zip_uri: str
@@ -72,6 +161,9 @@ def extract(zip_uri: str, tmp_dir: Path, chunk_size=10000) -> Path | None:
     chunk_size: int
         chunk size in bytes used to stream the download
 
+    connections: int
+        number of concurrent range requests, if the server supports them
+
     Returns:
     --------
     tmpcsv_path: Path | None
@@ -79,16 +171,16 @@ def extract(zip_uri: str, tmp_dir: Path, chunk_size=10000) -> Path | None:
     """
 
     zipname = zip_uri.split("/")[-1]
-    with requests.get(zip_uri, stream=True, timeout=4) as tmpzip:
-        tmpzip.raise_for_status()
-        # context mgr automatically removes .zip after extract
-        with TemporaryDirectory() as tmpzip_dir:
-            tmpzip_path = Path(tmpzip_dir) / zipname
-            with open(tmpzip_path, "wb") as zipfile:
-                for chunk in tmpzip.iter_content(chunk_size=chunk_size):
-                    zipfile.write(chunk)
-
-            unpack_archive(filename=tmpzip_path, extract_dir=tmp_dir)
+    DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    tmpzip_path = download(
+        zip_uri,
+        DOWNLOAD_DIR / zipname,
+        connections=connections,
+        chunk_size=chunk_size,
+        session=get_session(),
+    )
+    unpack_archive(filename=tmpzip_path, extract_dir=tmp_dir)
+    tmpzip_path.unlink()
 
     if len(tmp_glob := list(tmp_dir.glob("*.csv"))) == 1:
         tmpcsv_path = tmp_glob[0]
@@ -98,71 +190,972 @@ def extract(zip_uri: str, tmp_dir: Path, chunk_size=10000) -> Path | None:
     return tmpcsv_path
 
 
-def convert_to_parquet(csv_path: Path, pq_path: Path, test: bool = False) -> None:
+def load_ward_lookup(lookup_path: Path = WARD_LOOKUP_PATH) -> dict | None:
+    """
+    Reads the dbt seed mapping ward ID to ward name
+
+    Returns
+    -------
+    lookup: dict | None
+        ward ID to ward name; None if the seed is not available
+    """
+    try:
+        lookup = pd.read_csv(lookup_path)
+    except FileNotFoundError:
+        logger.warning(f"{lookup_path} not found; skipping ward name check")
+        return None
+    return dict(zip(lookup["Ward_Number"], lookup["Ward_Name"]))
+
+
+def parse_ward(ward: str) -> tuple[str | None, int | None]:
+    """Splits '<ward name> (<ward id>)' into its name and ID"""
+    idx = ward.find("(")
+    if idx == -1:
+        return None, None
+    try:
+        return ward[: idx - 1], int(ward[idx + 1 : idx + 3])
+    except ValueError:
+        return None, None
+
+
+def parse_distinct_wards(
+    uniques: Iterable[str],
+    codes: np.ndarray,
+    lookup: dict | None = None,
+    unexpected: Counter | None = None,
+) -> tuple[list, list]:
+    """
+    Parses each distinct ward string, counting the rows of those unexpected
+
+    Parameters
+    ----------
+    uniques: Iterable[str]
+        distinct raw ward strings
+    codes: np.ndarray
+        index into uniques for every row, negative for missing; used to
+        report how many rows are affected
+    lookup: dict | None
+        ward ID to ward name, used to flag unexpected names
+    unexpected: Counter | None
+        rows of each unexpected ward string are added to this count, to be
+        logged once by the caller; logged here if not given
+
+    Returns
+    -------
+    names, ids: tuple[list, list]
+        ward name and ward ID for each of the uniques
+    """
+    uniques = list(uniques)
+    parsed = [parse_ward(value) for value in uniques]
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    found = Counter() if unexpected is None else unexpected
+    for value, (ward_name, ward_id), count in zip(uniques, parsed, counts):
+        if ward_name is None or (
+            lookup is not None and lookup.get(ward_id) != ward_name
+        ):
+            found[value] += int(count)
+    if unexpected is None:
+        log_unexpected_wards(found)
+    return [name for name, _ in parsed], [ward_id for _, ward_id in parsed]
+
+
+def log_unexpected_wards(unexpected: Counter) -> None:
+    """Logs each ward string counted by parse_distinct_wards"""
+    for value, count in unexpected.items():
+        ward_name, ward_id = parse_ward(value)
+        if ward_name is None:
+            logger.warning(f"Ward field {value!r} has no ID; {count} rows set to null")
+        else:
+            logger.warning(
+                f"Ward {ward_id} {ward_name!r} not in ward lookup; {count} rows"
+            )
+
+
+def split_ward(
+    ward: pd.Series, lookup: dict | None = None, unexpected: Counter | None = None
+) -> pd.DataFrame:
+    """
+    Extracts ward name and ward ID from the raw ward field
+
+    Only the distinct ward strings are parsed; the results are mapped back
+    onto every row by their factorized codes.
+
+    Parameters
+    ----------
+    ward: pd.Series
+        raw ward field, e.g. "Etobicoke North (01)"
+    lookup: dict | None
+        ward ID to ward name, used to flag unexpected names
+    unexpected: Counter | None
+        count of unexpected ward strings, see parse_distinct_wards
+
+    Returns
+    -------
+    ward_ids: pd.DataFrame
+        ward_name and ward_id columns, aligned with the input index
+    """
+    codes, uniques = pd.factorize(ward)
+    names, ids = parse_distinct_wards(
+        uniques, codes, lookup=lookup, unexpected=unexpected
+    )
+
+    # missing wards are coded -1, which take() resolves to the trailing null
+    names = pd.array(names + [None], dtype="string")
+    ids = pd.array(ids + [None], dtype="Int8")
+    return pd.DataFrame(
+        {"ward_name": names.take(codes), "ward_id": ids.take(codes)},
+        index=ward.index,
+    )
+
+
+# datetime format detected for each year, so each source file is sniffed once
+_datetime_formats: dict[str, str | None] = {}
+
+
+def detect_datetime_format(
+    values: pd.Series, year: str | None = None, sample_size: int = 1000
+) -> str | None:
+    """
+    Finds the first of DATETIME_FORMATS that parses every sampled value
+
+    Parameters
+    ----------
+    values: pd.Series
+        raw datetime strings
+    year: str | None
+        year of the source file; detected formats are cached per year
+    sample_size: int
+        number of non-null values to test each format against
+
+    Returns
+    -------
+    datetime_format: str | None
+        strftime format, or None if no known format matched
+    """
+    if year in _datetime_formats:
+        return _datetime_formats[year]
+    sample = values.dropna().head(sample_size)
+    if sample.empty:
+        return None
+    datetime_format = None
+    for candidate in DATETIME_FORMATS:
+        if pd.to_datetime(sample, format=candidate, errors="coerce").notna().all():
+            datetime_format = candidate
+            break
+    if datetime_format is None:
+        logger.warning("No known datetime format matched; inferring per value")
+    else:
+        logger.info(f"Parsing datetimes as {datetime_format!r}")
+    if year is not None:
+        _datetime_formats[year] = datetime_format
+    return datetime_format
+
+
+def parse_datetime(values: pd.Series, datetime_format: str | None = None) -> pd.Series:
+    """
+    Parses datetime strings with a fixed format
+
+    Values that do not match the format fall back to pandas' format
+    inference, and are counted in the logs.
+    """
+    if datetime_format is None:
+        return pd.to_datetime(values)
+    parsed = pd.to_datetime(values, format=datetime_format, errors="coerce")
+    mismatched = parsed.isna() & values.notna()
+    if num_mismatched := mismatched.sum():
+        logger.warning(
+            f"{num_mismatched} values did not match {datetime_format!r}; "
+            "parsing them individually"
+        )
+        parsed[mismatched] = pd.to_datetime(values[mismatched])
+    return parsed
+
+
+def transform_records(
+    df: pd.DataFrame,
+    lookup: dict | None = None,
+    datetime_format: str | None = None,
+    unexpected: Counter | None = None,
+) -> pd.DataFrame:
+    """
+    Casts and renames the raw 311 records into the facts table layout
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        raw records as read from the source csv
+    lookup: dict | None
+        ward ID to ward name, used to flag unexpected ward names
+    datetime_format: str | None
+        format of the creation date; inferred per value if not given
+    unexpected: Counter | None
+        count of unexpected ward strings, see parse_distinct_wards
+
+    Returns
+    -------
+    df_union: pd.DataFrame
+        records with ward split, datetime cast, and snake_case columns,
+        typed as FACTS_DTYPES
+    """
+    # cast datetime
+    creation_datetime = parse_datetime(df["Creation Date"], datetime_format)
+
+    # extract ward name and ward ID
+    ward_ids = split_ward(df["Ward"], lookup=lookup, unexpected=unexpected)
+
+    df_drop = df.drop(columns=DERIVED_COLUMNS)
+    # add ward_id and ward_name
+    df_union = pd.concat([df_drop, ward_ids], axis=1)
+    # add datetime casted field
+    df_union["creation_datetime"] = creation_datetime
+    # rename to remove capitals and spaces
+    df_union = df_union.rename(columns=RENAMED_COLUMNS)
+    df_union = df_union.rename(mapper=str.lower, axis="columns")
+    df_union.columns = df_union.columns.str.replace(" ", "_")
+    # enforce the declared facts schema; no-op for columns already read as such
+    return df_union[FACTS_SCHEMA.names].astype(FACTS_DTYPES)
+
+
+def convert_to_parquet(
+    csv_path: Path,
+    pq_path: Path,
+    test: bool = False,
+    batch_size: int | None = None,
+    year: str | None = None,
+    engine: str = "pandas",
+    workers: int = 1,
+    profile: str = DEFAULT_PROFILE,
+) -> tuple[dict, dict]:
     """Converts csv to parquet format for compression
 
     Parameters:
     -----------
     csv_path: Path
-        path to csv
+        path to csv, or a readable binary file object; paths ending in a
+        compression suffix such as .zst are decompressed as they are read,
+        and remote URIs are read in prefetched, cached blocks
     pq_path: Path
         path to converted parquet
+    batch_size: int | None
+        if given, stream the csv in batches of this many rows, writing each
+        as a row group so memory is bounded by the batch, not the file
+    year: str | None
+        year of the records; the detected datetime format is cached per year
+    engine: str
+        "pandas", or "arrow" to read, transform and write with arrow alone;
+        the arrow engine always streams
+    workers: int
+        if more than one, split the csv into row-aligned byte ranges and
+        convert them in this many processes
+    profile: str
+        name of the parquet write profile, see profiles.PROFILES
 
     Returns
     --------
-    None
+    stats, days: tuple[dict, dict]
+        column statistics of the converted records, see stats.py, and their
+        partitions.day_fingerprints
     """
 
     if test:
         nrows = 100
     else:
         nrows = None
-    df = pd.read_csv(
-        csv_path,
+    if engine not in ("pandas", "arrow"):
+        raise ValueError(f"Invalid conversion engine: {engine}")
+    if codec_of(csv_path) is not None or is_remote(csv_path):
+        # compressed csv cannot be split by byte range, and remote csv is read
+        # fastest through the block cache; parallel workers get a local plain
+        # copy, a serial conversion reads (and decompresses) inline
+        if workers > 1 and not test:
+            with TemporaryDirectory() as tmp_dir:
+                plain_path = decompress_file(csv_path, Path(tmp_dir) / "raw.csv")
+                return convert_to_parquet(
+                    plain_path,
+                    pq_path,
+                    test,
+                    batch_size,
+                    year,
+                    engine,
+                    workers,
+                    profile,
+                )
+        with open_raw(csv_path) as csv_file:
+            return convert_to_parquet(
+                csv_file, pq_path, test, batch_size, year, engine, profile=profile
+            )
+    lookup = load_ward_lookup()
+    if workers > 1:
+        if test or hasattr(csv_path, "read"):
+            logger.warning("Parallel conversion needs a csv path; converting serially")
+        else:
+            return convert_to_parquet_parallel(
+                csv_path=csv_path,
+                pq_path=pq_path,
+                workers=workers,
+                year=year,
+                engine=engine,
+                lookup=lookup,
+                profile=profile,
+            )
+    if engine == "arrow":
+        return write_parquet_tables(
+            transform_arrow_batches(
+                read_csv_arrow(csv_path, nrows=nrows), lookup=lookup, year=year
+            ),
+            pq_path=pq_path,
+            profile=profile,
+        )
+
+    read_kwargs = dict(
         nrows=nrows,
+        dtype=RAW_DTYPES,
         # can sub in a callable to process bad lines
         # see https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.read_csv.html
         on_bad_lines="skip",
     )
+    if batch_size:
+        return write_parquet_tables(
+            transform_batches(
+                pd.read_csv(csv_path, chunksize=batch_size, **read_kwargs),
+                lookup=lookup,
+                year=year,
+            ),
+            pq_path=pq_path,
+            profile=profile,
+        )
+
+    df = pd.read_csv(csv_path, **read_kwargs)
     logger.info(f"{len(df)} rows read\ncd ..dtypes: \n{df.dtypes}")
-    # cast datetime
-    creation_datetime = pd.to_datetime(df["Creation Date"])
+    datetime_format = detect_datetime_format(df["Creation Date"], year=year)
+    df_union = transform_records(df, lookup=lookup, datetime_format=datetime_format)
+    logger.info(f"union cols:\n{df_union.columns}\n dtypes:\n{df_union.dtypes}")
+    # the table DataFrame.to_parquet would write, with the profile's options
+    return write_parquet_tables(
+        [pa.Table.from_pandas(df_union, schema=FACTS_SCHEMA, preserve_index=False)],
+        pq_path=pq_path,
+        profile=profile,
+    )
+
+
+def transform_batches(
+    batches: Iterable[pd.DataFrame],
+    lookup: dict | None = None,
+    year: str | None = None,
+    unexpected: Counter | None = None,
+) -> Iterator[pa.Table]:
+    """
+    Transforms raw record batches into arrow tables of FACTS_SCHEMA
+
+    Parameters
+    ----------
+    batches: Iterable[pd.DataFrame]
+        raw records, e.g. from pd.read_csv(..., chunksize=n)
+    lookup: dict | None
+        ward ID to ward name, used to flag unexpected ward names
+    year: str | None
+        year of the records; the datetime format is detected from the first
+        batch and cached per year
+    unexpected: Counter | None
+        count of unexpected ward strings, see parse_distinct_wards; if not
+        given, they are logged once all batches are transformed
+    """
+    datetime_format = None
+    found = Counter() if unexpected is None else unexpected
+    try:
+        for idx, batch in enumerate(batches):
+            if idx == 0:
+                datetime_format = detect_datetime_format(
+                    batch["Creation Date"], year=year
+                )
+            df_union = transform_records(
+                batch, lookup=lookup, datetime_format=datetime_format, unexpected=found
+            )
+            yield pa.Table.from_pandas(
+                df_union, schema=FACTS_SCHEMA, preserve_index=False
+            )
+    finally:
+        if unexpected is None:
+            log_unexpected_wards(found)
+
+
+def read_csv_arrow(
+    csv_path: Path, nrows: int | None = None, block_size: int = ARROW_BLOCK_SIZE
+) -> Iterator[pa.RecordBatch]:
+    """
+    Streams the raw csv as arrow record batches
+
+    Parsing mirrors convert_to_parquet's pd.read_csv call: the same null
+    markers, RAW_DTYPES as arrow types, rows with too many fields skipped,
+    and rows with too few kept, padded with nulls. Arrow only reports short
+    rows, without their row number, so the csv is parsed in row-aligned
+    blocks: a block with short rows is parsed again with them padded, which
+    keeps every row in its place, as in the pandas engine.
+
+    Parameters
+    ----------
+    csv_path: Path
+        path or fsspec URI of the csv, or a readable binary file object
+    nrows: int | None
+        if given, stop after this many rows
+    block_size: int
+        bytes parsed per batch
+    """
+    if hasattr(csv_path, "read"):
+        csv_file = nullcontext(csv_path)
+    else:
+        csv_file = fsspec.open(str(csv_path), "rb")
+    convert_options = pa_csv.ConvertOptions(
+        column_types=RAW_ARROW_TYPES,
+        null_values=CSV_NULL_VALUES,
+        strings_can_be_null=True,
+    )
+    read_options = pa_csv.ReadOptions()
+    with csv_file as csv_input:
+        for block in _csv_blocks(csv_input, block_size):
+            # may be called from arrow's reader threads
+            short_rows = set()
+
+            def handle_invalid(row) -> str:
+                if row.actual_columns < row.expected_columns:
+                    short_rows.add(
+                        (row.text, row.expected_columns - row.actual_columns)
+                    )
+                return "skip"
+
+            parse_options = pa_csv.ParseOptions(
+                newlines_in_values=True, invalid_row_handler=handle_invalid
+            )
+            table = pa_csv.read_csv(
+                io.BytesIO(block),
+                read_options=read_options,
+                parse_options=parse_options,
+                convert_options=convert_options,
+            )
+            if short_rows:
+                table = pa_csv.read_csv(
+                    io.BytesIO(_pad_rows(block, short_rows)),
+                    read_options=read_options,
+                    parse_options=parse_options,
+                    convert_options=convert_options,
+                )
+            # the header is only in the first block
+            read_options = pa_csv.ReadOptions(column_names=table.schema.names)
+            batch = table.unify_dictionaries().combine_chunks().to_batches()
+            if not batch:
+                continue
+            batch = batch[0]
+            if nrows is not None:
+                batch = batch.slice(0, nrows)
+                nrows -= batch.num_rows
+            yield batch
+            if nrows == 0:
+                break
+
+
+def _csv_blocks(csv_input, block_size: int) -> Iterator[bytes]:
+    """
+    Blocks of about block_size bytes of csv_input that end on a row
+
+    A line break ends a row when the count of quote characters before it,
+    from the start of the block, is even.
+    """
+    rest = b""
+    while True:
+        # a row longer than block_size takes more than one read
+        chunks = [rest]
+        size = len(rest)
+        while size < len(rest) + block_size:
+            chunk = csv_input.read(len(rest) + block_size - size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        block = b"".join(chunks)
+        if size == len(rest):
+            break
+        end = len(block)
+        quoted = block.count(b'"') % 2 == 1
+        while True:
+            newline = block.rfind(b"\n", 0, end)
+            if newline == -1:
+                break
+            quoted ^= block.count(b'"', newline, end) % 2 == 1
+            end = newline
+            if not quoted:
+                break
+        if newline == -1:
+            # no row ends in the block yet
+            rest = block
+            continue
+        rest = block[newline + 1 :]
+        yield block[: newline + 1]
+    if rest:
+        yield rest
+
+
+def _pad_rows(block: bytes, short_rows: set) -> bytes:
+    """
+    Appends empty fields to the rows of block with the given text
+
+    pandas fills the missing fields of a short row with NaN, as it does
+    empty fields. short_rows holds (text, missing fields) pairs, and only
+    whole lines of the block are matched.
+    """
+    for text, missing in short_rows:
+        row = text.encode()
+        padded = row + b"," * missing
+        start = 0
+        while (start := block.find(row, start)) != -1:
+            end = start + len(row)
+            if (start == 0 or block[start - 1 : start] == b"\n") and block[
+                end : end + 1
+            ] in (b"", b"\n", b"\r"):
+                block = block[:start] + padded + block[end:]
+                end = start + len(padded)
+            start = end
+    return block
 
-    # extract ward name and ward ID
-    col_name = "ward_name"
-    col_id = "ward_id"
 
-    def extract_name_id(ward: str) -> pd.Series:
-        # "(" will not always be found. need to be more robust...
+def split_ward_arrow(
+    ward: pa.DictionaryArray,
+    lookup: dict | None = None,
+    unexpected: Counter | None = None,
+) -> tuple[pa.Array, pa.Array]:
+    """Arrow counterpart of split_ward, parsing each dictionary value once"""
+    codes = pc.fill_null(ward.indices, -1).to_numpy(zero_copy_only=False)
+    names, ids = parse_distinct_wards(
+        ward.dictionary.to_pylist(), codes, lookup=lookup, unexpected=unexpected
+    )
+    ward_name = pa.array(names, pa.string()).take(ward.indices)
+    ward_id = pa.array(ids, pa.int8()).take(ward.indices)
+    return ward_name.dictionary_encode(), ward_id
+
+
+def parse_datetime_arrow(
+    values: pa.Array, datetime_format: str | None = None
+) -> pa.Array:
+    """
+    Arrow counterpart of parse_datetime
+
+    Batches with values that arrow cannot parse with the format are handed
+    to parse_datetime, which falls back to pandas' inference.
+    """
+    try:
+        if datetime_format is None:
+            raise pa.ArrowInvalid("No datetime format to parse with")
+        if datetime_format.startswith("%Y-%m-%d"):
+            # arrow's ISO 8601 parser also takes 7-digit fractional seconds
+            return pc.cast(values, pa.timestamp("ns"))
+        return pc.strptime(values, format=datetime_format, unit="ns")
+    except pa.ArrowInvalid:
+        parsed = parse_datetime(values.to_pandas(), datetime_format)
+        return pa.array(parsed, type=pa.timestamp("ns"))
+
+
+def transform_arrow_batches(
+    batches: Iterable[pa.RecordBatch],
+    lookup: dict | None = None,
+    year: str | None = None,
+    unexpected: Counter | None = None,
+) -> Iterator[pa.Table]:
+    """
+    Applies transform_records' steps with arrow compute, without pandas
+
+    Parameters
+    ----------
+    batches: Iterable[pa.RecordBatch]
+        raw records, e.g. from read_csv_arrow
+    lookup: dict | None
+        ward ID to ward name, used to flag unexpected ward names
+    year: str | None
+        year of the records; the datetime format is detected from the first
+        batch and cached per year
+    unexpected: Counter | None
+        count of unexpected ward strings, see parse_distinct_wards; if not
+        given, they are logged once all batches are transformed
+    """
+    datetime_format = None
+    found = Counter() if unexpected is None else unexpected
+    try:
+        for idx, batch in enumerate(batches):
+            if idx == 0:
+                sample = batch.column("Creation Date").slice(0, 1000).to_pandas()
+                datetime_format = detect_datetime_format(sample, year=year)
+            columns = {
+                RENAMED_COLUMNS.get(name, name).lower().replace(" ", "_"): column
+                for name, column in zip(batch.schema.names, batch.columns)
+                if name not in DERIVED_COLUMNS
+            }
+            columns["ward_name"], columns["ward_id"] = split_ward_arrow(
+                batch.column("Ward"), lookup=lookup, unexpected=found
+            )
+            columns["creation_datetime"] = parse_datetime_arrow(
+                batch.column("Creation Date"), datetime_format
+            )
+            yield pa.Table.from_arrays(
+                [columns[name] for name in FACTS_SCHEMA.names],
+                schema=FACTS_PANDAS_SCHEMA,
+            )
+    finally:
+        if unexpected is None:
+            log_unexpected_wards(found)
+
+
+def write_parquet_tables(
+    tables: Iterable[pa.Table], pq_path: Path, profile: str = DEFAULT_PROFILE
+) -> tuple[dict, dict]:
+    """
+    Appends each table as row groups of a single parquet file
+
+    The file schema, including its pandas metadata, is taken from the first
+    table, so the file matches what a single DataFrame.to_parquet call would
+    have written. Profiles that sort rows sort each table, so a file written
+    from one table is sorted throughout.
+
+    Parameters
+    ----------
+    tables: Iterable[pa.Table]
+        transformed records, all of FACTS_SCHEMA
+    pq_path: Path
+        local path or fsspec URI (e.g. gs://) of the parquet to write; a
+        local path with an Arrow IPC suffix (.arrows) is written as an IPC
+        intermediate instead, see staging.py
+    profile: str
+        name of the parquet write profile, see profiles.PROFILES; not
+        applied to IPC intermediates
+
+    Returns
+    -------
+    stats, days: tuple[dict, dict]
+        column statistics of the rows written, see stats.py, and their
+        partitions.day_fingerprints, both gathered as the rows are written.
+        The statistics are also written into the parquet's key-value
+        metadata
+    """
+    stats = ColumnStats()
+    days = DayFingerprints()
+    if is_ipc(pq_path):
+        write_ipc_tables(days.collect(stats.collect(tables)), pq_path)
+        return stats.to_dict(), days.to_dict()
+    with TemporaryDirectory() as spool_dir:
+        if isinstance(tables, list):
+            for table in tables:
+                days.update(stats.update(table))
+        else:
+            # pyarrow 10's ParquetWriter takes the key-value metadata when it
+            # is opened, before the statistics of a stream are complete; the
+            # stream is spooled to a memory-mapped file in the meantime
+            tables = spool_tables(days.collect(stats.collect(tables)), spool_dir)
+        metadata = stats.to_dict()
+        tables = [with_stats(table, metadata) for table in tables]
+        size, seconds = _write_parquet(tables, pq_path, profile)
+    logger.info(
+        f"{stats.rows} rows streamed to {pq_path}: {size} bytes with the "
+        f"{profile!r} profile in {seconds:.1f}s"
+    )
+    return stats.to_dict(), days.to_dict()
+
+
+def _write_parquet(tables: list, pq_path: Path, profile: str) -> tuple[int, float]:
+    """Writes tables as row groups of pq_path; returns its size and the time taken"""
+    options = get_profile(profile)
+    nrows = 0
+    writer = None
+    started = time.perf_counter()
+    with fsspec.open(str(pq_path), "wb") as pq_file:
         try:
-            idx = ward.index("(")
-            ward_name = ward[: idx - 1]
-            ward_id = int(ward[idx + 1 : idx + 3])
-
-        except ValueError as e:
-            if "substring not found" in repr(e):
-                logger.warning("Ward field did not have '(' to search for ID")
-                #  set to null
-                ward_name = None
-                ward_id = None
+            for table in tables:
+                if writer is None:
+                    logger.info(f"streaming to {pq_path}")
+                    writer = pq.ParquetWriter(
+                        pq_file, table.schema, **options.writer_options()
+                    )
+                writer.write_table(
+                    options.prepare(table), row_group_size=options.row_group_size
+                )
+                nrows += table.num_rows
+                logger.debug(f"{nrows} rows written")
         finally:
-            return pd.Series([ward_name, ward_id], [col_name, col_id])
+            if writer is not None:
+                writer.close()
+        size = pq_file.tell()
+    return size, time.perf_counter() - started
 
-    ward_ids = (
-        df["Ward"].apply(extract_name_id).astype({col_name: "string", col_id: "Int8"})
-    )
 
-    df_drop = df.drop(columns=["Creation Date", "Ward"]).astype("string")
-    # add ward_id and ward_name
-    df_union = pd.concat([df_drop, ward_ids], axis=1)
-    # add datetime casted field
-    df_union["creation_datetime"] = creation_datetime
-    # rename to remove capitals and spaces
-    df_union = df_union.rename(columns={"First 3 Chars of Postal Code": "fsa_code"})
-    df_union = df_union.rename(mapper=str.lower, axis="columns")
-    df_union.columns = df_union.columns.str.replace(" ", "_")
-    logger.info(f"union cols:\n{df_union.columns}\n dtypes:\n{df_union.dtypes}")
-    df_union.to_parquet(pq_path, index=False)
+def split_csv_ranges(
+    csv_path: Path, num_ranges: int, chunk_size: int = 16 << 20
+) -> tuple[bytes, list]:
+    """
+    Splits a csv into roughly equal byte ranges that start on a new row
+
+    Values may span lines within quotes, so ranges are not cut at a line
+    break while the count of quote characters from the start of the file is
+    odd. Escaped quotes ("") leave the count even. The whole file is read
+    once to keep the count.
+
+    Parameters
+    ----------
+    csv_path: Path
+        path or fsspec URI of the csv
+    num_ranges: int
+        number of ranges to aim for; fewer are returned for small files
+    chunk_size: int
+        bytes read at a time while counting quotes
+
+    Returns
+    -------
+    header, ranges: tuple[bytes, list]
+        the header line, and (start, end) byte offsets of each range
+    """
+    fs, path = fsspec.core.url_to_fs(str(csv_path))
+    size = fs.size(path)
+    targets = deque(size * idx // num_ranges for idx in range(1, num_ranges))
+    with fs.open(path, "rb") as csv_file:
+        header = csv_file.readline()
+        bounds = [len(header)]
+        offset = len(header)
+        quoted = False
+        while targets:
+            chunk = csv_file.read(chunk_size)
+            if not chunk:
+                break
+            # quotes before pos are counted into quoted
+            pos = 0
+            while targets:
+                newline = chunk.find(b"\n", max(targets[0] - offset, pos))
+                if newline == -1:
+                    break
+                quoted ^= chunk.count(b'"', pos, newline) % 2 == 1
+                pos = newline + 1
+                if not quoted:
+                    bounds.append(offset + pos)
+                    while targets and targets[0] < bounds[-1]:
+                        targets.popleft()
+            quoted ^= chunk.count(b'"', pos) % 2 == 1
+            offset += len(chunk)
+    bounds.append(size)
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    return header, ranges
+
+
+def convert_csv_range(
+    csv_path: Path,
+    start: int,
+    end: int,
+    header: bytes,
+    lookup: dict | None = None,
+    year: str | None = None,
+    datetime_format: str | None = None,
+    engine: str = "pandas",
+) -> tuple[pa.Table, Counter]:
+    """
+    Converts one byte range of the csv; run in worker processes
+
+    Parameters
+    ----------
+    csv_path: Path
+        path or fsspec URI of the csv
+    start, end: int
+        byte offsets of the range, as returned by split_csv_ranges
+    header: bytes
+        header line of the csv, prepended to the range
+    lookup: dict | None
+        ward ID to ward name, used to flag unexpected ward names
+    year: str | None
+        year of the records
+    datetime_format: str | None
+        format detected by the parent, seeded into this process' cache
+    engine: str
+        conversion engine, "pandas" or "arrow"
+
+    Returns
+    -------
+    table, unexpected: tuple[pa.Table, Counter]
+        transformed records of FACTS_SCHEMA, and the rows of each
+        unexpected ward string, for the parent to log once for the file
+    """
+    if year is not None:
+        _datetime_formats[year] = datetime_format
+    with fsspec.open(str(csv_path), "rb") as csv_file:
+        csv_file.seek(start)
+        csv_range = io.BytesIO(header + csv_file.read(end - start))
+    unexpected = Counter()
+    if engine == "arrow":
+        tables = transform_arrow_batches(
+            read_csv_arrow(csv_range), lookup=lookup, year=year, unexpected=unexpected
+        )
+    else:
+        df = pd.read_csv(csv_range, dtype=RAW_DTYPES, on_bad_lines="skip")
+        tables = transform_batches(
+            [df], lookup=lookup, year=year, unexpected=unexpected
+        )
+    return pa.concat_tables(tables), unexpected
+
+
+def convert_to_parquet_parallel(
+    csv_path: Path,
+    pq_path: Path,
+    workers: int,
+    year: str | None = None,
+    engine: str = "pandas",
+    lookup: dict | None = None,
+    ranges_per_worker: int = 4,
+    profile: str = DEFAULT_PROFILE,
+) -> tuple[dict, dict]:
+    """
+    Converts row-aligned byte ranges of the csv in a process pool
+
+    Each range becomes a row group of a single parquet file, written in
+    range order, so the rows match the serial conversion.
+
+    Parameters
+    ----------
+    csv_path: Path
+        path or fsspec URI of the csv
+    pq_path: Path
+        local path or fsspec URI of the parquet to write
+    workers: int
+        number of worker processes
+    year: str | None
+        year of the records, used to cache the detected datetime format
+    engine: str
+        conversion engine, "pandas" or "arrow"
+    lookup: dict | None
+        ward ID to ward name, used to flag unexpected ward names
+    ranges_per_worker: int
+        ranges per worker; more ranges balance load, fewer mean larger
+        row groups
+    profile: str
+        name of the parquet write profile; rows are sorted per range
+
+    Returns
+    -------
+    stats, days: tuple[dict, dict]
+        column statistics and day fingerprints of the converted records
+    """
+    header, ranges = split_csv_ranges(csv_path, workers * ranges_per_worker)
+    logger.info(f"Converting {len(ranges)} ranges of {csv_path} in {workers} workers")
+    sample = pd.read_csv(csv_path, nrows=1000, usecols=["Creation Date"])
+    datetime_format = detect_datetime_format(sample["Creation Date"], year=year)
+    unexpected = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        def result(future) -> pa.Table:
+            table, found = future.result()
+            unexpected.update(found)
+            return table
+
+        def results() -> Iterator[pa.Table]:
+            # at most two ranges per worker are pending, so converted ranges
+            # wait in the parent no longer than it takes to write them
+            pending = deque()
+            for start, end in ranges:
+                if len(pending) == 2 * workers:
+                    yield result(pending.popleft())
+                pending.append(
+                    executor.submit(
+                        convert_csv_range,
+                        csv_path,
+                        start,
+                        end,
+                        header,
+                        lookup=lookup,
+                        year=year,
+                        datetime_format=datetime_format,
+                        engine=engine,
+                    )
+                )
+            while pending:
+                yield result(pending.popleft())
+
+        written = write_parquet_tables(results(), pq_path=pq_path, profile=profile)
+    log_unexpected_wards(unexpected)
+    return written
+
+
+def extract_convert_stream(
+    zip_uri: str,
+    bucket_name: str,
+    csv_path: str,
+    pq_path: str,
+    test: bool = False,
+    batch_size: int | None = None,
+    year: str | None = None,
+    engine: str = "pandas",
+    chunk_size: int = 1 << 20,
+    profile: str = DEFAULT_PROFILE,
+) -> tuple[dict, dict]:
+    """
+    Converts the zipped csv to parquet as it downloads, without temp files
+
+    The decompressed csv is uploaded to GCS alongside the conversion, so the
+    raw copy is kept without landing on local disk. The archive is only
+    spilled to disk if its members cannot be read from the stream.
+
+    Parameters
+    ----------
+    zip_uri: str
+        URI for the zip file to download, from open data directory
+    bucket_name: str
+        name of bucket in GCS, or a location taken by backends.open_store
+    csv_path: str
+        blob name for the raw csv; compressed according to its suffix
+    pq_path: str
+        path or URI of the converted parquet
+    test: bool
+        if true, only convert a small subset
+    batch_size: int | None
+        if given, convert the csv in streamed batches of this many rows
+    year: str | None
+        year of the records, used to cache the detected datetime format
+    engine: str
+        conversion engine, "pandas" or "arrow"
+    chunk_size: int
+        chunk size in bytes used to stream the download
+    profile: str
+        name of the parquet write profile
+
+    Returns
+    -------
+    stats, days: tuple[dict, dict]
+        column statistics and day fingerprints of the converted records
+    """
+    store = open_store(bucket_name, project=GOOGLE_CLOUD_PROJECT)
+
+    def connect(timeout: float):
+        # only the connection is retried; a stream broken midway cannot resume
+        response = get_session().get(zip_uri, stream=True, timeout=timeout)
+        response.raise_for_status()
+        return response
+
+    with call_with_retries(connect, policy=DOWNLOAD_POLICY, name="stream") as tmpzip:
+        csv_chunks = iter_zip_csv(tmpzip.iter_content(chunk_size=chunk_size))
+        with store.open_write(csv_path) as raw_blob:
+            csv_blob = compress_stream(raw_blob, codec_of(csv_path))
+            reader = io.BufferedReader(
+                ChunkReader(tee_chunks(csv_chunks, csv_blob)), buffer_size=chunk_size
+            )
+            try:
+                stats, days = convert_to_parquet(
+                    csv_path=reader,
+                    pq_path=pq_path,
+                    test=test,
+                    batch_size=batch_size,
+                    year=year,
+                    engine=engine,
+                    profile=profile,
+                )
+                # drain rows the conversion did not need so the raw csv is complete
+                while reader.read(chunk_size):
+                    pass
+            finally:
+                # ends the compressed frame; the raw csv is only committed to
+                # csv_path once the block exits without an error, closed or
+                # not, so a failed conversion leaves none behind
+                csv_blob.close()
+    logger.info(f"{zip_uri} streamed to {csv_path} and {pq_path}")
+    return stats, days
 
 
 def blob_exists(blob_path: str, bucket_name: str) -> bool:
@@ -171,14 +1164,14 @@ def blob_exists(blob_path: str, bucket_name: str) -> bool:
     """
 
     logger.info(f"GCP project ID: {GOOGLE_CLOUD_PROJECT}")
-    gcs = storage.Client(project=GOOGLE_CLOUD_PROJECT)
-    bucket = gcs.bucket(bucket_name=bucket_name)
-    exists = storage.Blob(bucket=bucket, name=blob_path).exists(client=gcs)
+    exists = open_store(bucket_name, project=GOOGLE_CLOUD_PROJECT).exists(blob_path)
     logger.info(f"{blob_path} already exists: {exists}")
     return exists
 
 
-def upload_gcs(bucket_name: str, src_file: Path, dst_file: str):
+def upload_gcs(
+    bucket_name: str, src_file: Path, dst_file: str, workers: int = UPLOAD_WORKERS
+):
     """
     Upload the local parquet file to GCS
     Ref: https://cloud.google.com/storage/docs/uploading-objects#storage-upload-object-python
@@ -192,68 +1185,122 @@ def upload_gcs(bucket_name: str, src_file: Path, dst_file: str):
     especially relevant for docker images, if they have fine-grain
     controlled permissions
     not required if you're on a credentialled GCE
+
+    Files over UPLOAD_PARALLEL_THRESHOLD bytes are uploaded by `workers`
+    concurrent parts. bucket_name may also name a local directory or an
+    emulator bucket, see backends.open_store
+
+    Returns
+    -------
+    dict
+        path, size, crc32c and generation of the uploaded object
     """
 
     logger.info(f"{bucket_name}: storage bucket\n{dst_file}: destination file")
-    gcs_client = storage.Client()
-    bucket = gcs_client.bucket(bucket_name)
-    blob = bucket.blob(dst_file)
-
-    # set to zero to avoid overwrite
-    try:
-        blob.upload_from_filename(
-            src_file,
-            # if_generation_match=int(replace),
-            timeout=90,
-        )
-    except Exception as e:
-        logger.error(f"Error raised:\n{e}")
-    logger.info(f"{src_file} uploaded to {dst_file}")
+    store = open_store(bucket_name, project=GOOGLE_CLOUD_PROJECT)
+    # errors propagate
+    uploaded = store.upload(src_file, dst_file, workers=workers)
+    logger.info(f"{src_file} uploaded to {store.uri(dst_file)}")
+    return uploaded
 
 
-def load_bigquery(src_uris: str, dest_table: str, location: str = LOCATION):
+def load_bigquery(
+    src_uris: str | list | dict,
+    dest_table: str | None = None,
+    location: str = LOCATION,
+    scheduler: LoadScheduler | None = None,
+    days: dict | None = None,
+    loaded: dict | None = None,
+    partial: bool = False,
+    when_replaced: Callable | None = None,
+):
     """
     Loads file from URIs to bigquery table
     Parameters
     ----------
-    src_uris: str
+    src_uris: str | list | dict
         URIs of data files to be loaded; in format gs://<bucket_name>/<object_name_or_glob>.
-    dest_table: str
-        Table into which data is to be loaded
+        Hive partition directories, e.g. gs://<bucket_name>/raw/pq/year=2020,
+        load every file beneath them, and globs BigQuery does not take,
+        e.g. .../year=2020/month=*/*, are listed into files.
+        A dict of destination table to URIs loads each table in one job
+    dest_table: str | None
+        Table into which data is to be loaded; None if src_uris is a dict
+    scheduler: LoadScheduler | None
+        if given, the jobs are only submitted to it, and the caller waits on
+        the scheduler; otherwise this waits for the jobs to finish
+    days: dict | None
+        partitions.day_fingerprints of the data; if given, only the day
+        partitions of the table that changed are replaced
+    loaded: dict | None
+        day_fingerprints of what was last loaded into the table
+    partial: bool
+        if true, the data is a delta of some days only, appended by
+        replacing those days; the table's other days are kept
+    when_replaced: Callable | None
+        with days, called with the returned job once the partitions are
+        replaced, see partitions.replace_partitions
 
     Returns
     -------
-    LoadJob class object
+    LoadJob class object; None if days were given and none changed. A dict
+    of destination table to LoadJob if src_uris is a dict
     """
 
+    grouped = isinstance(src_uris, dict)
+    if grouped:
+        if dest_table is not None or days is not None:
+            raise ValueError("URIs grouped by table take no dest_table or days")
+        uris_by_table = src_uris
+    else:
+        uris_by_table = {
+            dest_table: [src_uris] if isinstance(src_uris, str) else src_uris
+        }
+    uris_by_table = {table: resolve_uris(uris) for table, uris in uris_by_table.items()}
+    for table, uris in uris_by_table.items():
+        if len(uris) > MAX_SOURCE_URIS:
+            raise ValueError(
+                f"{len(uris)} URIs for {table}, more than a load job takes; "
+                "give their directories or a wildcard instead"
+            )
     logger.info(f"GCP project ID: {GOOGLE_CLOUD_PROJECT}")
-    client = bigquery.Client(
-        location=location,
+    client = get_bigquery_client(
         project=GOOGLE_CLOUD_PROJECT,  # infer from env
-        # credentials=creds # not needed if instance is already credentialled
-    )
-    job_config = bigquery.LoadJobConfig(
-        source_format=bigquery.SourceFormat.PARQUET,
-        time_partitioning=bigquery.TimePartitioning(
-            type_=bigquery.TimePartitioningType.DAY, field="creation_datetime"
-        ),
-        clustering_fields=["service_request_type", "ward_id"],
-    )
-    load_job = client.load_table_from_uri(
-        src_uris,
-        dest_table,
-        job_config=job_config,
-        project=GOOGLE_CLOUD_PROJECT,
+        location=location,
+        # credentials not needed if instance is already credentialled
     )
-    logger.info(f"Job creation time: {load_job.created}")
-    load_job.add_done_callback(
-        lambda x: logger.info(
-            f"Job duration: {load_job.ended - load_job.started}\nState: {load_job.state}"
+    if days is not None:
+        return replace_partitions(
+            client,
+            uris_by_table[dest_table],
+            dest_table,
+            days=days,
+            loaded=loaded,
+            project=GOOGLE_CLOUD_PROJECT,
+            partial=partial,
+            scheduler=scheduler,
+            when_replaced=when_replaced,
         )
-    )
-    load_job.result(timeout=20.0)
-    logger.info(f"Load Job status: {load_job.state}")
-    return load_job
+    # one configuration for every job; the schema is read from the files
+    job_config = facts_job_config()
+    waits = scheduler is None
+    if waits:
+        scheduler = LoadScheduler()
+    load_jobs = {}
+    for table, uris in uris_by_table.items():
+        load_job = client.load_table_from_uri(
+            uris,
+            table,
+            job_config=job_config,
+            project=GOOGLE_CLOUD_PROJECT,
+        )
+        logger.info(f"Job creation time: {load_job.created}, {len(uris)} URIs")
+        load_jobs[table] = scheduler.add(load_job)
+    if waits:
+        scheduler.wait()
+        for load_job in load_jobs.values():
+            logger.info(f"Load Job status: {load_job.state}")
+    return load_jobs if grouped else load_jobs[dest_table]
 
 
 def extract_service_calls(
@@ -261,6 +1308,16 @@ def extract_service_calls(
     year: str = "2020",
     overwrite: bool = False,
     test: bool = False,
+    batch_size: int | None = None,
+    stream: bool = False,
+    engine: str = "pandas",
+    workers: int = 1,
+    layout: str = "file",
+    ward_partitions: bool = False,
+    profile: str = DEFAULT_PROFILE,
+    intermediate: str = "parquet",
+    incremental: bool = False,
+    lookback_days: float = LOOKBACK_DAYS,
 ):
     """
     Downloads the zipped csv from opendata API and stores as parquet in gcs
@@ -268,74 +1325,420 @@ def extract_service_calls(
     Parameters
     ----------
     bucket_name: str
-        name of bucket in GCS
+        name of bucket in GCS, or a location taken by backends.open_store,
+        e.g. file:///tmp/bucket or emulator://<bucket>
     year: str
         year for which to extract the service call request records
     overwrite: bool
-        if true, overwrite existing parquet/dataset
+        if true, rebuild the csv and parquet if the source archive has changed
+        since they were recorded in the manifest
     test: bool
         if true, load only a small subset onto bigquery
+    batch_size: int | None
+        if given, convert the csv in streamed batches of this many rows
+    stream: bool
+        if true, convert straight from the download stream without temp files
+    engine: str
+        conversion engine; "pandas", or "arrow" to bypass pandas entirely
+    workers: int
+        number of processes converting the csv; the streamed conversion is
+        always serial
+    layout: str
+        "file" for one parquet per year, or "hive" for year=YYYY/month=MM/
+        partitions under raw/pq/
+    ward_partitions: bool
+        if true, and the layout is "hive", partition each month by ward_id
+    profile: str
+        name of the parquet write profile, e.g. "fast-write" or
+        "small-and-prunable"
+    intermediate: str
+        "arrow" to convert the csv to a local Arrow IPC file that the parquet
+        writers memory-map; "parquet" converts straight to parquet
+    incremental: bool
+        if true, and a watermark of the year has been recorded by a load,
+        write only a delta of the rows created since; see extract_delta.
+        Without a watermark the whole year is extracted. Not taken with
+        stream or the hive layout
+    lookback_days: float
+        days before the watermark the delta goes back to, for late edits
 
     Returns
     -------
     gs_pq_path: str
-        GS URI of the uploaded parquet
+        GS URI of the uploaded parquet, or a wildcard over its partitions
     """
 
+    if layout not in LAYOUTS:
+        raise ValueError(f"Invalid layout: {layout}")
+    if intermediate not in INTERMEDIATES:
+        raise ValueError(f"Invalid intermediate: {intermediate}")
+    if incremental and (stream or layout != "file"):
+        # a delta is cut from a local conversion, as one file outside year=
+        raise ValueError(
+            "Incremental extraction takes neither stream nor the hive layout"
+        )
+    get_profile(profile)
+    store = open_store(bucket_name, project=GOOGLE_CLOUD_PROJECT)
     zip_uri = get_zip_uri(year)
     fname = zip_uri.split("/")[-1]
     # gsc paths
-    csv_path = f'raw/csv/{fname.replace("zip", "csv")}'
-    pq_path = f'raw/pq/{fname.replace("zip", "parquet")}'
-    gs_pq_path = f"gs://{bucket_name}/{pq_path}"
-    csv_exists = blob_exists(csv_path, bucket_name)
-    pq_exists = blob_exists(pq_path, bucket_name)
-    # save csv to temp dir for conversion to pq and upload
-    with TemporaryDirectory() as tmp_dir:
-        if not pq_exists or overwrite:
-            if not csv_exists or overwrite:
+    csv_path = f'raw/csv/{raw_csv_name(fname.replace("zip", "csv"))}'
+    pq_kind = artifact_kind(layout, ward_partitions)
+    if layout == "hive":
+        pq_path = year_prefix(year)
+        gs_pq_path = load_uris(store.uri(PQ_ROOT), year)[0]
+    else:
+        pq_path = f'{PQ_ROOT}/{fname.replace("zip", "parquet")}'
+        gs_pq_path = store.uri(pq_path)
+    manifest = Manifest.load(store)
+    if incremental:
+        watermark = manifest.watermark(year)
+        if watermark is not None:
+            return extract_delta(
+                store,
+                manifest,
+                year=year,
+                zip_uri=zip_uri,
+                watermark=watermark,
+                lookback_days=lookback_days,
+                test=test,
+                batch_size=batch_size,
+                engine=engine,
+                workers=workers,
+                profile=profile,
+                intermediate=intermediate,
+            )
+        logger.info(f"No watermark recorded for {year}; extracting all of it")
+    # the source is only fingerprinted, by a HEAD request, when it matters
+    source = describe_source(zip_uri) if overwrite or incremental else None
+    # only what the manifest recorded is known to be complete; objects it
+    # never recorded, e.g. left by a run that failed, are rebuilt
+    csv_exists = manifest.is_current(year, "csv", source)
+    pq_exists = manifest.is_current(year, pq_kind, source, test=test)
+    if pq_exists:
+        logger.warning(f"{pq_path} already exists")
+        return gs_pq_path
+    source = source or describe_source(zip_uri)
+    streamed = stream and not csv_exists
+    try:
+        with TemporaryDirectory() as tmp_dir:
+            # partitions are cut from a local file once the year is converted
+            if intermediate == "arrow":
+                out_path = Path(tmp_dir) / f"facts{IPC_SUFFIX}"
+                out_profile = profile
+            elif layout == "hive":
+                out_path = Path(tmp_dir) / "facts.parquet"
+                # only the partitions are written with the profile asked for
+                out_profile = "fast-write"
+            else:
+                out_path = gs_pq_path
+                out_profile = profile
+            if streamed:
+                logger.info(f"streaming from {zip_uri} to {csv_path} and {pq_path}")
+                stats, days = extract_convert_stream(
+                    zip_uri=zip_uri,
+                    bucket_name=bucket_name,
+                    csv_path=csv_path,
+                    pq_path=out_path,
+                    test=test,
+                    batch_size=batch_size,
+                    year=year,
+                    engine=engine,
+                    profile=out_profile,
+                )
+                manifest.record(year, "csv", csv_path, source)
+            # save csv to temp dir for conversion to pq and upload
+            elif not csv_exists:
                 logger.info(f"downloading from {zip_uri} and extracting to {tmp_dir}")
                 tmpcsv_path = extract(zip_uri=zip_uri, tmp_dir=Path(tmp_dir))
+                tmpraw_path = compress_file(
+                    tmpcsv_path, Path(tmp_dir) / csv_path.rsplit("/", 1)[-1]
+                )
                 logger.info(f"Uploading csv to {csv_path}")
                 upload_gcs(
-                    bucket_name=bucket_name, src_file=tmpcsv_path, dst_file=csv_path
+                    bucket_name=bucket_name, src_file=tmpraw_path, dst_file=csv_path
                 )
+                manifest.record(year, "csv", csv_path, source)
             else:
                 logger.warning(f"{csv_path} already exists")
-                tmpcsv_path = f"gs://{bucket_name}/{csv_path}"
+                # read back whatever was archived, compressed or not
+                archived_path = manifest.artifact(year, "csv")["path"]
+                tmpcsv_path = store.uri(archived_path)
                 logger.info(f"{tmpcsv_path} will be read instead")
 
-            logger.info(f"Converting to {pq_path}")
-            convert_to_parquet(csv_path=tmpcsv_path, pq_path=gs_pq_path, test=test)
-        else:
-            logger.warning(f"{pq_path} already exists")
+            if not streamed:
+                logger.info(f"Converting to {pq_path}")
+                stats, days = convert_to_parquet(
+                    csv_path=tmpcsv_path,
+                    pq_path=out_path,
+                    test=test,
+                    batch_size=batch_size,
+                    year=year,
+                    engine=engine,
+                    workers=workers,
+                    profile=out_profile,
+                )
+            # gathered by the conversion, as are the days, which let an
+            # overwrite reload only the days that changed
+            watermark = latest_creation(stats)
+            # flags what the dbt tests would
+            problems = check(stats, year=year)
+            for problem in problems:
+                logger.warning(f"{pq_path}: {problem}")
+            write_sidecar(store, stats_path(pq_path), stats, problems)
+            if layout == "hive":
+                written = write_partitioned(
+                    iter_staged(out_path),
+                    root_uri=store.uri(PQ_ROOT),
+                    year=year,
+                    by_ward=ward_partitions,
+                    profile=profile,
+                )
+                manifest.record_files(
+                    year,
+                    pq_kind,
+                    pq_path,
+                    source,
+                    test=test,
+                    paths=[uri.removeprefix(store.uri()) for uri in written],
+                    days=days,
+                    watermark=watermark,
+                    stats=stats,
+                    problems=problems,
+                )
+                # the commit point: loads take the year's files from the
+                # manifest, so the files replaced can go once it is saved
+                manifest.save()
+                remove_stale_partitions(store.uri(PQ_ROOT), year, keep=written)
+            else:
+                if intermediate == "arrow":
+                    write_parquet_tables(
+                        [read_staged(out_path)], pq_path=gs_pq_path, profile=profile
+                    )
+                manifest.record(
+                    year,
+                    "pq",
+                    pq_path,
+                    source,
+                    test=test,
+                    days=days,
+                    watermark=watermark,
+                    stats=stats,
+                    problems=problems,
+                )
+    finally:
+        # keep whatever was built, even if a later step failed
+        manifest.save()
     logger.info(f"Uploaded parquet to {gs_pq_path}")
     return gs_pq_path
 
 
-def load(src_uris: str, dataset_name: str, year: str):
+def latest_creation(stats: dict) -> str | None:
+    """
+    Latest creation_datetime of the rows stats were gathered from, as ISO
+    8601; None if there is none
+    """
+    return stats["columns"].get(PARTITION_FIELD, {}).get("max")
+
+
+def extract_delta(
+    store: Store,
+    manifest: Manifest,
+    year: str,
+    zip_uri: str,
+    watermark: str,
+    lookback_days: float = LOOKBACK_DAYS,
+    test: bool = False,
+    batch_size: int | None = None,
+    engine: str = "pandas",
+    workers: int = 1,
+    profile: str = DEFAULT_PROFILE,
+    intermediate: str = "parquet",
+) -> str:
+    """
+    Writes the rows of year created since the watermark as a delta parquet
+
+    The delta starts lookback_days before the watermark, so that records
+    edited after they were loaded are picked up again, and at midnight, so
+    that it holds whole days and can replace the partitions it shares with
+    the table. The zip is still downloaded and converted in full, but only
+    the delta is uploaded and loaded, and the raw csv is left to full
+    extractions to archive.
+
+    Parameters
+    ----------
+    store: Store
+        store of the bucket
+    manifest: Manifest
+        manifest of the bucket, which records the delta
+    watermark: str
+        latest creation_datetime loaded, as ISO 8601
+    lookback_days: float
+        days before the watermark the delta goes back to
+    other parameters:
+        as of extract_service_calls
+
+    Returns
+    -------
+    gs_pq_path: str
+        URI of the delta
+    """
+    since = (pd.Timestamp(watermark) - pd.Timedelta(days=lookback_days)).normalize()
+    pq_path = delta_path(year, f"{since:%Y%m%d}")
+    gs_pq_path = store.uri(pq_path)
+    source = describe_source(zip_uri)
+    previous = manifest.artifact(year, DELTA_KIND)
+    if (
+        previous is not None
+        and previous["path"] == pq_path
+        and manifest.is_current(year, DELTA_KIND, source, test=test)
+    ):
+        logger.warning(f"{pq_path} is up to date with {zip_uri}")
+        return gs_pq_path
+    try:
+        with TemporaryDirectory() as tmp_dir:
+            logger.info(f"downloading from {zip_uri} and extracting to {tmp_dir}")
+            tmpcsv_path = extract(zip_uri=zip_uri, tmp_dir=Path(tmp_dir))
+            staged_path = Path(tmp_dir) / (
+                f"facts{IPC_SUFFIX}" if intermediate == "arrow" else "facts.parquet"
+            )
+            year_stats, _ = convert_to_parquet(
+                csv_path=tmpcsv_path,
+                pq_path=staged_path,
+                test=test,
+                batch_size=batch_size,
+                year=year,
+                engine=engine,
+                workers=workers,
+                profile=profile,
+            )
+            facts = read_staged(staged_path)
+            created = facts[PARTITION_FIELD]
+            delta = facts.filter(
+                pc.greater_equal(
+                    created, pa.scalar(since.to_pydatetime(), created.type)
+                )
+            )
+            logger.info(
+                f"{delta.num_rows} of {facts.num_rows} rows of {year} created since "
+                f"{since:%Y-%m-%d}, {lookback_days} days before {watermark}"
+            )
+            stats, days = write_parquet_tables(
+                [delta], pq_path=gs_pq_path, profile=profile
+            )
+            problems = check(stats, year=year)
+            for problem in problems:
+                logger.warning(f"{pq_path}: {problem}")
+            write_sidecar(store, stats_path(pq_path), stats, problems)
+            manifest.record(
+                year,
+                DELTA_KIND,
+                pq_path,
+                source,
+                test=test,
+                days=days,
+                watermark=latest_creation(year_stats) or watermark,
+                stats=stats,
+                problems=problems,
+            )
+    finally:
+        manifest.save()
+    # a delta starting elsewhere was loaded already, or it would start here
+    if previous is not None and previous["path"] != pq_path:
+        store.delete([previous["path"]], missing_ok=True)
+    return gs_pq_path
+
+
+def facts_table(dataset_name: str, year: str) -> str:
+    """Table the facts of year are loaded into"""
+    return f"{dataset_name}.facts_{year}_partitioned"
+
+
+def table_rows(table: str, location: str = LOCATION) -> int | None:
+    """Rows in table, from its metadata; None if there is no such table"""
+    client = get_bigquery_client(project=GOOGLE_CLOUD_PROJECT, location=location)
+    try:
+        return client.get_table(table).num_rows
+    except NotFound:
+        return None
+
+
+def load(
+    src_uris: str | list,
+    dataset_name: str,
+    year: str | None = None,
+    scheduler: LoadScheduler | None = None,
+    days: dict | None = None,
+    loaded: dict | None = None,
+    partial: bool = False,
+    when_replaced: Callable | None = None,
+):
     """
     Loads parquets from GCS to bigquery
 
     Parameters
     ----------
-    src_uris: str
+    src_uris: str | list
         URIs of data files to be loaded; in format gs://<bucket_name>/<object_name_or_glob>.
     dataset: str
         Bigquery dataset into which data will be loaded. <project_id>.<dataset_id>
         project_id is optional, since it can be taken from environment context by
         bigquery's client library
-    year: str
-        year which the parquet file belongs to; used to construct table name
+    year: str | None
+        year which the parquet file belongs to; used to construct table name.
+        If None, the URIs are grouped by the year in their paths, e.g.
+        year=2020/ or SR2020.parquet, and each year's table loaded in one job.
+        Wildcards whose path names no year, e.g. gs://<bucket>/raw/pq/*, are
+        listed into files, leaving out deltas, which a load of the year
+        already covers
+    scheduler: LoadScheduler | None
+        if given, submit the job to it without waiting
+    days: dict | None
+        day fingerprints of the data; if given, replace only the partitions
+        that changed since the load whose fingerprints are loaded
+    loaded: dict | None
+        day fingerprints of the data last loaded
+    partial: bool
+        if true, the data is a delta of some days, and other days are kept
+    when_replaced: Callable | None
+        with days, called with the returned job once the days are replaced
 
     Returns
     -------
-    None
+    LoadJob | None
+        or a dict of table to LoadJob if year is None
     """
 
-    dest_table = f"{dataset_name}.facts_{year}_partitioned"
+    if year is None:
+        if days is not None:
+            raise ValueError("Only the load of one year takes days")
+        uris = []
+        for uri in resolve_uris([src_uris] if isinstance(src_uris, str) else src_uris):
+            if year_of(uri) is None and "*" in uri:
+                uris += [match for match in list_matches(uri) if not is_delta(match)]
+            else:
+                uris.append(uri)
+        uris_by_table = {}
+        for uri in resolve_uris(uris):
+            uri_year = year_of(uri)
+            if uri_year is None:
+                raise ValueError(f"No year in the path of {uri}")
+            uris_by_table.setdefault(facts_table(dataset_name, uri_year), []).append(
+                uri
+            )
+        logger.info(f"loading into {sorted(uris_by_table)}")
+        return load_bigquery(uris_by_table, scheduler=scheduler)
+    dest_table = facts_table(dataset_name, year)
     logger.info(f"loading from {src_uris} into {dest_table}")
-    load_job = load_bigquery(src_uris, dest_table)
+    load_job = load_bigquery(
+        src_uris,
+        dest_table,
+        scheduler=scheduler,
+        days=days,
+        loaded=loaded,
+        partial=partial,
+        when_replaced=when_replaced,
+    )
     return load_job
 
 
@@ -346,6 +1749,18 @@ def extract_load_service_calls(
     overwrite: bool = False,
     test: bool = False,
     loglevel: str = "INFO",
+    batch_size: int | None = None,
+    stream: bool = False,
+    engine: str = "pandas",
+    workers: int = 1,
+    layout: str = "file",
+    ward_partitions: bool = False,
+    profile: str = DEFAULT_PROFILE,
+    intermediate: str = "parquet",
+    scheduler: LoadScheduler | None = None,
+    incremental: bool = False,
+    lookback_days: float = LOOKBACK_DAYS,
+    severity: str = "warn",
 ):
     """
     Extracts CSV as parquets and loads into bigquery dataset
@@ -353,16 +1768,51 @@ def extract_load_service_calls(
     Parameters
     ----------
     bucket_name: str
-        name of bucket in GCS
+        name of bucket in GCS, or a location taken by backends.open_store;
+        BigQuery only loads from GCS, so elsewhere the load is skipped
     dataset_name: str
         name of dataset in bigquery
     year: str
         year for which to extract the service call request records
     overwrite: bool
-        if true, overwrite existing parquet/dataset
+        if true, rebuild the csv and parquet if the source archive has changed
+        since they were recorded in the manifest, and replace only the day
+        partitions of the table whose rows changed
     test: bool
         if true, load only a small subset onto bigquery
+    batch_size: int | None
+        if given, convert the csv in streamed batches of this many rows
+    stream: bool
+        if true, convert straight from the download stream without temp files
+    engine: str
+        conversion engine; "pandas", or "arrow" to bypass pandas entirely
+    workers: int
+        number of processes converting the csv
+    layout: str
+        "file" for one parquet per year, or "hive" for month partitions
+    ward_partitions: bool
+        if true, and the layout is "hive", partition each month by ward_id
+    profile: str
+        name of the parquet write profile; the size of the files and the
+        time taken to load them are logged
+    intermediate: str
+        "parquet", or "arrow" to stage the converted csv as Arrow IPC
+    scheduler: LoadScheduler | None
+        if given, the load job is submitted to it and not waited on
+    incremental: bool
+        if true, extract and append only the rows created since the
+        watermark recorded by the last load, less lookback_days
+    lookback_days: float
+        days before the watermark a delta goes back to, for late edits
+    severity: str
+        as of the dbt tests: "warn" loads data whose column statistics show
+        problems, logging them; "error" refuses to load it
 
+    Returns
+    -------
+    LoadJob | None
+        None if the load was skipped, e.g. because the file was the last
+        one loaded into the table
     """
     num_loglevel = getattr(logging, loglevel.upper(), None)
     if not isinstance(num_loglevel, int):
@@ -370,7 +1820,8 @@ def extract_load_service_calls(
     logger.setLevel(level=num_loglevel)
     logger.info(f"bucket: {bucket_name}\ndataset: {dataset_name}\nyear: {year}")
     # validate
-    for name in [bucket_name, dataset_name]:
+    # only the bucket itself of a location, e.g. emulator://<bucket>
+    for name in [bucket_name.rstrip("/").rsplit("/", 1)[-1], dataset_name]:
         try:
             if not all([name[0].isalnum(), name[-1].isalnum()]):
                 raise ValueError(f"Invalid bucket or dataset name: {name}")
@@ -378,13 +1829,143 @@ def extract_load_service_calls(
             print(e("Empty name for bucket or dataset"))
     if int(year) < 2015 or int(year) > 2023:
         raise ValueError(f"Invalid year: {year}")
+    if severity not in SEVERITIES:
+        raise ValueError(f"Invalid severity: {severity}")
     gs_pq_path = extract_service_calls(
         bucket_name=bucket_name,
         year=year,
         overwrite=overwrite,
         test=test,
+        batch_size=batch_size,
+        stream=stream,
+        engine=engine,
+        workers=workers,
+        layout=layout,
+        ward_partitions=ward_partitions,
+        profile=profile,
+        intermediate=intermediate,
+        incremental=incremental,
+        lookback_days=lookback_days,
     )
-    load_job = load(src_uris=gs_pq_path, dataset_name=dataset_name, year=year)
+    load_job = days = stats = None
+    src_uris = gs_pq_path
+    if gs_pq_path.startswith("gs://"):
+        store = open_store(bucket_name, project=GOOGLE_CLOUD_PROJECT)
+        manifest = Manifest.load(store)
+        table = facts_table(dataset_name, year)
+        delta = manifest.artifact(year, DELTA_KIND)
+        partial = delta is not None and store.uri(delta["path"]) == gs_pq_path
+        if partial:
+            artifact = delta
+        else:
+            artifact = manifest.artifact(year, artifact_kind(layout, ward_partitions))
+        artifact = artifact or {}
+        problems = artifact.get("problems") or []
+        if problems and severity == "error":
+            raise ValueError(f"Not loading {gs_pq_path}: {problems}")
+        for problem in problems:
+            logger.warning(f"Loading {gs_pq_path} with {problem}")
+        if overwrite or incremental:
+            days = artifact.get("days")
+        stats = artifact.get("stats")
+        if artifact.get("files"):
+            # the partitions the manifest lists rather than a wildcard, so a
+            # load never takes both the old and new files of a compaction
+            src_uris = [store.uri(file["path"]) for file in artifact["files"]]
+    if not gs_pq_path.startswith("gs://"):
+        logger.warning(f"BigQuery cannot load {gs_pq_path}; skipping the load")
+    elif (
+        days is None
+        and stats is not None
+        and stats == manifest.loaded(year, table, "stats")
+        # the table may have been dropped or truncated since
+        and table_rows(table) == stats["rows"]
+    ):
+        # loading it again would only append the same rows a second time
+        logger.info(f"{gs_pq_path} was last loaded into {table}; skipping the load")
+    else:
+        waits = scheduler is None
+        if waits:
+            scheduler = LoadScheduler()
+
+        def report(job):
+            job_report = job_stats(job)
+            logger.info(
+                f"{job_report['input_bytes']} bytes written with the {profile!r} "
+                f"profile loaded in {job_report['duration']}s"
+            )
+
+        if days is not None:
+            # a refresh replaces only the days that changed
+            loaded = manifest.loaded(year, table)
+
+            def replaced(job):
+                if job is not None:
+                    report(job)
+                # the watermark only moves once its rows are in the table; the
+                # stats of a delta are not those of the table's whole file
+                manifest.record_load(
+                    year,
+                    table,
+                    {**(loaded or {}), **days} if partial else days,
+                    watermark=artifact.get("watermark"),
+                    stats=None if partial else stats,
+                )
+                manifest.save()
+
+            load_job = load(
+                src_uris,
+                dataset_name,
+                year,
+                scheduler=scheduler,
+                days=days,
+                loaded=loaded,
+                partial=partial,
+                when_replaced=replaced,
+            )
+        else:
+            load_job = load(src_uris, dataset_name, year, scheduler=scheduler)
+
+            def done(job):
+                report(job)
+                # only a load that went through makes a rerun of the file a
+                # repeat
+                if stats is not None:
+                    manifest.record_load(year, table, stats=stats)
+                    manifest.save()
+
+            scheduler.when_done(load_job, done)
+        if waits:
+            scheduler.wait()
+    if METRICS:
+        logger.info(f"request metrics: {dict(METRICS)}")
+    return load_job
+
+
+def extract_load_years(years: list, **kwargs) -> list:
+    """
+    Extracts and loads several years, loading them all concurrently
+
+    Each year's load job is submitted as soon as its parquet is written, and
+    extraction moves on to the next year while it runs; the loads are then
+    waited on together, and each is recorded in the manifest as it succeeds.
+
+    Parameters
+    ----------
+    years: list
+        years to extract and load
+    kwargs:
+        arguments of extract_load_service_calls other than year
+
+    Returns
+    -------
+    stats: list
+        loads.job_stats of each load job
+    """
+    scheduler = LoadScheduler()
+    for year in years:
+        extract_load_service_calls(year=year, scheduler=scheduler, **kwargs)
+    return scheduler.wait()
 
 
 if __name__ == "__main__":
@@ -399,7 +1980,8 @@ if __name__ == "__main__":
         "--bucket_name",
         type=str,
         default=BUCKET,
-        help="GCS bucket to store the CSV and parquet files",
+        help="GCS bucket to store the CSV and parquet files; or file:///<dir> "
+        "for a local directory, emulator://<bucket> for a GCS emulator",
     )
     opt(
         "-d",
@@ -408,7 +1990,14 @@ if __name__ == "__main__":
         default=DATASET,
         help="bigquery dataset name in which to load table",
     )
-    opt("-y", "--year", default="2020", type=str)
+    opt(
+        "-y",
+        "--year",
+        nargs="+",
+        default=["2020"],
+        type=str,
+        help="Years to extract; their loads run concurrently",
+    )
     opt(
         "-o",
         "--overwrite",
@@ -429,12 +2018,101 @@ if __name__ == "__main__":
         type=str.upper,
         help="Log level, from DEBUG to CRITICAL",
     )
-    args = parser.parse_args()
-    extract_load_service_calls(
-        bucket_name=args.bucket_name,
-        dataset_name=args.dataset_name,
-        year=args.year,
-        overwrite=args.overwrite,
-        test=args.test,
-        loglevel=args.loglevel,
+    opt(
+        "--batch_size",
+        default=None,
+        type=int,
+        help="If specified, streams the csv conversion in batches of this many rows",
+    )
+    opt(
+        "-s",
+        "--stream",
+        action="store_true",
+        default=False,
+        help="If specified, converts from the download stream without temp files",
     )
+    opt(
+        "--engine",
+        default="pandas",
+        choices=["pandas", "arrow"],
+        help="Engine used to convert the csv to parquet",
+    )
+    opt(
+        "-w",
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of processes converting the csv to parquet",
+    )
+    opt(
+        "--layout",
+        default="file",
+        choices=LAYOUTS,
+        help="One parquet per year, or hive-style year/month partitions",
+    )
+    opt(
+        "--ward_partitions",
+        action="store_true",
+        default=False,
+        help="If specified with --layout hive, also partitions by ward_id",
+    )
+    opt(
+        "--profile",
+        default=DEFAULT_PROFILE,
+        choices=list(PROFILES),
+        help="Parquet write profile: codec, row groups, statistics and row order",
+    )
+    opt(
+        "--intermediate",
+        default="parquet",
+        choices=INTERMEDIATES,
+        help="Format the csv is converted to before the parquet is written",
+    )
+    opt(
+        "--load_uris",
+        nargs="+",
+        default=None,
+        help="If specified, only loads these URIs or globs, one job per year",
+    )
+    opt(
+        "-i",
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="If specified, appends only records created since the last load",
+    )
+    opt(
+        "--severity",
+        default="warn",
+        choices=SEVERITIES,
+        help="Whether problems found in the column statistics stop the load",
+    )
+    opt(
+        "--lookback_days",
+        default=LOOKBACK_DAYS,
+        type=float,
+        help="Days before the last load an incremental extraction goes back to",
+    )
+    args = parser.parse_args()
+    if args.load_uris:
+        load(args.load_uris, args.dataset_name)
+    else:
+        extract_load_years(
+            years=args.year,
+            bucket_name=args.bucket_name,
+            dataset_name=args.dataset_name,
+            overwrite=args.overwrite,
+            test=args.test,
+            loglevel=args.loglevel,
+            batch_size=args.batch_size,
+            stream=args.stream,
+            engine=args.engine,
+            workers=args.workers,
+            layout=args.layout,
+            ward_partitions=args.ward_partitions,
+            profile=args.profile,
+            intermediate=args.intermediate,
+            incremental=args.incremental,
+            lookback_days=args.lookback_days,
+            severity=args.severity,
+        )
@@ -0,0 +1,360 @@
+"""
+Layout of the parquet lake under raw/pq/
+
+Besides one file per year, the facts can be written Hive-style as
+raw/pq/year=YYYY/month=MM/ (optionally /ward_id=N/ below that), so readers
+of a month only touch that month's files and reloads can be scoped to the
+months affected. Every file keeps all columns of FACTS_SCHEMA: the path
+keys only duplicate values that are already in the data, so BigQuery loads
+produce the same table whichever layout the files come from.
+"""
+
+import logging
+import re
+import uuid
+from fnmatch import fnmatchcase
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterable
+
+import fsspec
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow.fs import FSSpecHandler, PyFileSystem
+
+from profiles import DEFAULT_PROFILE, write_table
+from staging import IPC_SUFFIX, read_ipc
+
+logger = logging.getLogger(__name__)
+
+PQ_ROOT = "raw/pq"
+STATS_ROOT = "raw/stats"
+LAYOUTS = ("file", "hive")
+# the fallback name pyarrow, Hive and BigQuery all use for a null key
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# keys parsed from the path; ward_id is read from the files themselves
+PARTITION_SCHEMA = pa.schema(
+    [pa.field("year", pa.int16()), pa.field("month", pa.int8())]
+)
+# the year of a file, from its partition key or else its name, e.g. SR2020.parquet
+_YEAR_PATTERN = re.compile(r"year=(\d{4})|(\d{4})[^/]*\.parquet$")
+
+
+def artifact_kind(layout: str, by_ward: bool = False) -> str:
+    """Kind of the manifest artifact of a year's parquet in layout"""
+    if layout == "hive":
+        return "pq_hive_ward" if by_ward else "pq_hive"
+    return "pq"
+
+
+def delta_path(year: str, since: str, root: str = PQ_ROOT) -> str:
+    """
+    Parquet of the rows of year created since the day since, YYYYMMDD
+
+    Deltas live outside the year=YYYY partitions, so loads of the whole
+    year never pick them up.
+    """
+    return f"{root}/delta/year={year}/since={since}.parquet"
+
+
+def is_delta(uri: str, root: str = PQ_ROOT) -> bool:
+    """Is uri a delta of an incremental extraction, see delta_path?"""
+    return f"{root}/delta/" in uri
+
+
+def stats_path(pq_path: str, root: str = PQ_ROOT) -> str:
+    """
+    JSON sidecar of the column statistics of the parquet, or the partitions,
+    at pq_path; kept out of the lake so that no load picks it up
+    """
+    return f"{STATS_ROOT}/{pq_path.removeprefix(root + '/')}.json"
+
+
+def year_prefix(year: str, root: str = PQ_ROOT) -> str:
+    """Directory holding every partition of year"""
+    return f"{root}/year={year}"
+
+
+def _key(value: int | None, width: int = 1) -> str:
+    return NULL_PARTITION if value is None else f"{int(value):0{width}d}"
+
+
+def partition_prefix(
+    year: str,
+    month: int | None,
+    ward_id: int | None = None,
+    by_ward: bool = False,
+    root: str = PQ_ROOT,
+) -> str:
+    """Directory of one month, or one ward of a month if by_ward, of year"""
+    prefix = f"{year_prefix(year, root)}/month={_key(month, width=2)}"
+    if by_ward:
+        prefix += f"/ward_id={_key(ward_id)}"
+    return prefix
+
+
+def load_uris(root_uri: str, year: str, months: list | None = None) -> list:
+    """
+    Wildcard URIs covering a year, or only some of its months, for BigQuery
+
+    Parameters
+    ----------
+    root_uri: str
+        URI of the lake root, e.g. gs://<bucket>/raw/pq
+    year: str
+        year to load
+    months: list | None
+        months to load; all of the year if None
+    """
+    if months is None:
+        return [f"{year_prefix(year, root_uri)}/*"]
+    return [f"{partition_prefix(year, month, root=root_uri)}/*" for month in months]
+
+
+def expand_uri(uri: str) -> str:
+    """Turns a partition directory, e.g. .../year=2020, into a wildcard"""
+    if uri.endswith("/") or "=" in uri.rsplit("/", 1)[-1]:
+        return uri.rstrip("/") + "/*"
+    return uri
+
+
+def resolve_uris(uris: list) -> list:
+    """
+    URIs as a BigQuery load job takes them, without duplicates
+
+    Partition directories become wildcards. BigQuery takes one * per URI
+    and no other glob characters, so other globs, e.g. .../year=*/month=*/*,
+    are listed, in one request each, into the files they match. As in
+    BigQuery, * matches across /.
+    """
+    resolved = []
+    for uri in uris:
+        uri = expand_uri(uri)
+        if uri.count("*") <= 1 and not any(char in uri for char in "?["):
+            resolved.append(uri)
+            continue
+        fs, path = fsspec.core.url_to_fs(uri)
+        protocol = uri.split("://")[0] + "://" if "://" in uri else ""
+        matches = [
+            protocol + name
+            for name, info in fs.glob(path, detail=True).items()
+            if info["type"] == "file"
+        ]
+        logger.info(f"{uri} matches {len(matches)} files")
+        resolved += matches
+    # a file a wildcard already covers would be loaded twice
+    wildcards = [uri for uri in resolved if "*" in uri]
+    return [
+        uri
+        for uri in dict.fromkeys(resolved)
+        if "*" in uri or not any(fnmatchcase(uri, pattern) for pattern in wildcards)
+    ]
+
+
+def list_matches(uri: str) -> list:
+    """
+    Files a URI with one wildcard matches, * matching across / as in BigQuery
+
+    Only the objects under the directory the wildcard is in are listed.
+    """
+    fs, path = fsspec.core.url_to_fs(uri)
+    protocol = uri.split("://")[0] + "://" if "://" in uri else ""
+    base = path.split("*", 1)[0].rsplit("/", 1)[0]
+    matches = [
+        protocol + name for name in fs.find(base) if fnmatchcase(protocol + name, uri)
+    ]
+    logger.info(f"{uri} matches {len(matches)} files")
+    return matches
+
+
+def year_of(uri: str) -> str | None:
+    """Year of the facts at uri, going by its path; None if it names none"""
+    match = _YEAR_PATTERN.search(uri)
+    return None if match is None else match.group(1) or match.group(2)
+
+
+def write_partitioned(
+    tables: Iterable[pa.Table],
+    root_uri: str,
+    year: str,
+    by_ward: bool = False,
+    profile: str = DEFAULT_PROFILE,
+) -> list:
+    """
+    Writes a year of facts as Hive-style month (and ward) partitions
+
+    Each table is split by partition as it comes, into a local IPC spool per
+    partition, so the year is never held in memory at once; each spool is
+    then memory-mapped and written as one file of its partition.
+
+    The files are written under fresh names, next to any already in the
+    partitions, which are left as they are: the caller records the new
+    files in the manifest, the commit point, and only then removes the
+    rest with remove_stale_partitions. If a write fails, the files written
+    so far are removed.
+
+    Parameters
+    ----------
+    tables: Iterable[pa.Table]
+        facts of FACTS_SCHEMA for one year, e.g. batches of a staged file
+    root_uri: str
+        local path or fsspec URI of the lake root
+    year: str
+        year of the facts
+    by_ward: bool
+        if true, partition each month by ward_id as well
+    profile: str
+        name of the parquet write profile of the partition files
+
+    Returns
+    -------
+    paths: list
+        URIs of the files written
+    """
+    fs, root = fsspec.core.url_to_fs(root_uri)
+    protocol = root_uri.split("://")[0] + "://" if "://" in root_uri else ""
+    # unique per run, so a crashed run's leftovers never collide with these
+    token = uuid.uuid4().hex[:8]
+    nrows = 0
+    paths = []
+    with TemporaryDirectory() as spool_dir:
+        spools = {}
+        try:
+            for table in tables:
+                for key, part in _split_partitions(table, by_ward):
+                    if key not in spools:
+                        sink = open(
+                            Path(spool_dir) / f"{len(spools)}{IPC_SUFFIX}", "wb"
+                        )
+                        spools[key] = (sink, pa.ipc.new_stream(sink, part.schema))
+                    spools[key][1].write_table(part)
+                nrows += table.num_rows
+        finally:
+            for sink, writer in spools.values():
+                writer.close()
+                sink.close()
+        try:
+            for key, (sink, _) in sorted(spools.items(), key=_sort_key):
+                month, ward_id = key
+                part_dir = partition_prefix(
+                    year, month, ward_id, by_ward=by_ward, root=root
+                )
+                fs.makedirs(part_dir, exist_ok=True)
+                path = f"{part_dir}/part-{token}.parquet"
+                paths.append(path)
+                write_table(read_ipc(sink.name), path, profile=profile, filesystem=fs)
+        except BaseException:
+            fs.rm([path for path in paths if fs.exists(path)])
+            raise
+    logger.info(f"{nrows} rows written to {len(paths)} partitions of {year}")
+    return [protocol + path for path in paths]
+
+
+def _split_partitions(table: pa.Table, by_ward: bool) -> Iterable[tuple]:
+    """
+    ((month, ward_id), rows) of each partition table has rows in; ward_id
+    is None unless by_ward, as are the keys of rows without a value
+    """
+    keys = pd.DataFrame({"month": pc.month(table["creation_datetime"]).to_pandas()})
+    if by_ward:
+        keys["ward_id"] = table["ward_id"].to_pandas()
+    groups = keys.groupby(list(keys.columns), dropna=False).indices
+    for key, indices in groups.items():
+        month, ward_id = key if by_ward else (key, None)
+        key = (
+            None if pd.isna(month) else int(month),
+            None if pd.isna(ward_id) else int(ward_id),
+        )
+        # indices are ascending, so rows keep their order unless the profile sorts
+        yield key, table.take(indices)
+
+
+def _sort_key(item: tuple) -> tuple:
+    # null keys, whose partitions are named NULL_PARTITION, go last
+    return tuple((value is None, value or 0) for value in item[0])
+
+
+def remove_stale_partitions(root_uri: str, year: str, keep: list) -> list:
+    """
+    Deletes every file under the partitions of year but those in keep
+
+    Called once the files of a rewrite of the year are recorded, it removes
+    the files they replace, as well as months or wards no longer in the
+    data and leftovers of runs that failed.
+
+    Parameters
+    ----------
+    root_uri: str
+        local path or fsspec URI of the lake root
+    year: str
+        year whose partitions are cleaned up
+    keep: list
+        URIs of the files to keep, as write_partitioned returns them
+
+    Returns
+    -------
+    paths: list
+        URIs of the files deleted
+    """
+    fs, root = fsspec.core.url_to_fs(root_uri)
+    protocol = root_uri.split("://")[0] + "://" if "://" in root_uri else ""
+    year_dir = year_prefix(year, root)
+    keep = {uri.removeprefix(protocol) for uri in keep}
+    stale = [path for path in fs.find(year_dir) if path not in keep]
+    if stale:
+        logger.info(f"Removing {len(stale)} files replaced under {year_dir}")
+        fs.rm(stale)
+    return [protocol + path for path in stale]
+
+
+def read_facts(
+    root_uri: str,
+    year: str | None = None,
+    months: list | None = None,
+    ward_ids: list | None = None,
+    columns: list | None = None,
+) -> pa.Table:
+    """
+    Reads facts from a Hive-style lake, pruning partitions by path
+
+    Parameters
+    ----------
+    root_uri: str
+        local path or fsspec URI of the lake root
+    year: str | None
+        year to read; all years if None
+    months: list | None
+        months to read; all if None
+    ward_ids: list | None
+        wards to read; all if None. Files of other wards are skipped by
+        their statistics when the lake is partitioned by ward
+    columns: list | None
+        columns to read; all if None
+
+    Returns
+    -------
+    pa.Table
+        matching facts; the partition keys are not added as columns
+    """
+    fs, root = fsspec.core.url_to_fs(root_uri)
+    if year is not None:
+        root = year_prefix(year, root)
+    dataset = ds.dataset(
+        root,
+        format="parquet",
+        filesystem=PyFileSystem(FSSpecHandler(fs)),
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+    )
+    expression = None
+    if months is not None:
+        expression = ds.field("month").isin(months)
+    if ward_ids is not None:
+        ward_filter = ds.field("ward_id").isin(ward_ids)
+        expression = ward_filter if expression is None else expression & ward_filter
+    if columns is None:
+        columns = [
+            name for name in dataset.schema.names if name not in PARTITION_SCHEMA.names
+        ]
+    return dataset.to_table(columns=columns, filter=expression)
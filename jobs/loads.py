@@ -0,0 +1,184 @@
+"""
+Non-blocking scheduling of BigQuery load jobs
+
+Load jobs run server-side, so there is no need to wait on one before
+submitting the next. Jobs are handed to a LoadScheduler as soon as they are
+submitted, and all of them are polled together until they finish; a
+backfill of several years then takes about as long as its slowest load,
+not the sum of them.
+"""
+
+import logging
+import os
+import time
+from typing import Callable
+
+from google.cloud import bigquery
+
+from schema import CLUSTERING_FIELDS, PARTITION_FIELD
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv("BQ_POLL_INTERVAL", 5.0))
+# how long wait() gives all jobs to finish; the jobs go on regardless
+LOAD_TIMEOUT = float(os.getenv("BQ_LOAD_TIMEOUT", 3600.0))
+# most source URIs BigQuery takes in one load job
+MAX_SOURCE_URIS = 10_000
+
+
+def facts_job_config(**kwargs) -> bigquery.LoadJobConfig:
+    """
+    Configuration of loads of parquet facts into day-partitioned tables
+
+    Parameters
+    ----------
+    kwargs:
+        further LoadJobConfig properties, e.g. write_disposition
+    """
+    return bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        time_partitioning=bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY, field=PARTITION_FIELD
+        ),
+        clustering_fields=CLUSTERING_FIELDS,
+        **kwargs,
+    )
+
+
+def job_stats(job: bigquery.LoadJob) -> dict:
+    """
+    Statistics of a load job, as far as they are known
+
+    Returns
+    -------
+    stats: dict
+        job_id, destination, state, error, input_files, input_bytes,
+        output_rows, output_bytes, and duration in seconds; None where the
+        job has not reported them (yet)
+    """
+    duration = None
+    if job.started is not None and job.ended is not None:
+        duration = (job.ended - job.started).total_seconds()
+    return {
+        "job_id": job.job_id,
+        "destination": str(job.destination),
+        "state": job.state,
+        "error": (job.error_result or {}).get("message"),
+        # copy jobs, which are waited on the same way, report none of these
+        "input_files": getattr(job, "input_files", None),
+        "input_bytes": getattr(job, "input_file_bytes", None),
+        "output_rows": getattr(job, "output_rows", None),
+        "output_bytes": getattr(job, "output_bytes", None),
+        "duration": duration,
+    }
+
+
+class LoadScheduler:
+    """
+    Load jobs submitted but not waited on, polled together by wait()
+
+    Parameters
+    ----------
+    poll_interval: float
+        seconds between polls of the jobs still running
+    timeout: float
+        seconds wait() gives the jobs, from when it is called
+    """
+
+    def __init__(
+        self, poll_interval: float = POLL_INTERVAL, timeout: float = LOAD_TIMEOUT
+    ):
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.jobs = []
+        self.callbacks = {}
+
+    def add(self, job: bigquery.LoadJob) -> bigquery.LoadJob:
+        """Tracks a submitted job"""
+        logger.info(f"Submitted load job {job.job_id} into {job.destination}")
+        self.jobs.append(job)
+        return job
+
+    def when_done(
+        self, job: bigquery.LoadJob, callback: Callable[[bigquery.LoadJob], None]
+    ) -> None:
+        """
+        Has wait() call callback(job) as soon as job has finished without
+        error; an error in callback does not stop wait() from seeing the
+        other jobs through, and is raised once they are done. Jobs the
+        callback adds, e.g. the next step of a chain, are waited on too.
+        """
+        self.callbacks.setdefault(job.job_id, []).append(callback)
+
+    def wait(self) -> list:
+        """
+        Polls every job until all are done, logging progress
+
+        Returns
+        -------
+        stats: list
+            job_stats of each job, in the order they were added
+
+        Raises
+        ------
+        TimeoutError
+            if jobs are still running after timeout seconds
+        GoogleAPICallError
+            the error of the first job that failed, once all are done
+        Exception
+            the error of the first callback that failed, once all are done
+        """
+        started = time.monotonic()
+        pending = list(self.jobs)
+        known = len(self.jobs)
+        callback_errors = []
+        while pending:
+            # done() reloads the job's state, one request per running job
+            finished = [job for job in pending if job.done()]
+            for job in finished:
+                stats = job_stats(job)
+                logger.info(
+                    f"Load job {job.job_id} into {stats['destination']} "
+                    f"{'failed' if stats['error'] else 'done'}: "
+                    f"{stats['output_rows']} rows from {stats['input_files']} files, "
+                    f"{stats['input_bytes']} bytes in {stats['duration']}s"
+                )
+                pending.remove(job)
+                if not stats["error"]:
+                    for callback in self.callbacks.get(job.job_id, []):
+                        try:
+                            callback(job)
+                        except Exception as e:
+                            logger.exception(
+                                f"Callback of load job {job.job_id} failed: {e}"
+                            )
+                            callback_errors.append(e)
+            # jobs added by callbacks
+            pending += self.jobs[known:]
+            known = len(self.jobs)
+            elapsed = time.monotonic() - started
+            if not pending:
+                break
+            if elapsed > self.timeout:
+                raise TimeoutError(
+                    f"{len(pending)} load jobs still running after {elapsed:.0f}s: "
+                    f"{[job.job_id for job in pending]}"
+                )
+            if finished:
+                logger.info(
+                    f"{len(self.jobs) - len(pending)} of {len(self.jobs)} load jobs "
+                    f"done after {elapsed:.0f}s"
+                )
+            time.sleep(self.poll_interval)
+        logger.info(
+            f"{len(self.jobs)} load jobs done in {time.monotonic() - started:.1f}s"
+        )
+        stats = [job_stats(job) for job in self.jobs]
+        failed = [job for job in self.jobs if job.error_result]
+        if failed:
+            logger.error(f"{len(failed)} of {len(self.jobs)} load jobs failed")
+            # raises the job's error
+            failed[0].result()
+        if callback_errors:
+            raise callback_errors[0]
+        return stats
@@ -0,0 +1,316 @@
+"""
+Manifest of the raw layer of the bucket
+
+A single JSON object under raw/ records, per year, the source archive
+(URL, ETag, size and MD5 where the server gives one) and every artifact
+derived from it. Artifacts are keyed to the content of the source they were
+built from, so a rerun can tell from one read which artifacts are missing
+or stale without a request per blob. Writes are conditional on the
+generation read, and are merged and retried if another run got there first;
+a merge keeps the most recently checked source of a year, and only the
+artifacts built from it.
+"""
+
+import datetime
+import json
+import logging
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from backends import Store
+from ckan import get_session
+from download import probe
+from retry import CKAN_POLICY, call_with_retries
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = "raw/manifest.json"
+MANIFEST_VERSION = 1
+
+
+def describe_source(url: str) -> dict:
+    """
+    Fingerprints the archive at url from its headers, without downloading it
+
+    Returns
+    -------
+    source: dict
+        url, etag, size and md5 (None where the server does not say), and
+        when it was checked, as ISO 8601
+    """
+    info = call_with_retries(
+        lambda timeout: probe(url, session=get_session(), timeout=timeout),
+        policy=CKAN_POLICY,
+        name="manifest",
+    )
+    return {
+        "url": url,
+        "etag": info["etag"],
+        "size": info["size"],
+        "md5": info["md5"],
+        "checked": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def content_key(source: dict) -> str:
+    """Identifies the content of a source; changes whenever the archive does"""
+    if source.get("md5"):
+        return f"md5:{source['md5']}"
+    if source.get("etag"):
+        return f"etag:{source['etag']}"
+    # no validator at all; the best that can be done is url and size
+    return f"size:{source['url']}:{source.get('size')}"
+
+
+def _is_newer(source: dict, than: dict) -> bool:
+    """Was source checked after than? Sources recorded without a time lose"""
+    if not than.get("checked"):
+        return True
+    return source.get("checked", "") > than["checked"]
+
+
+class Manifest:
+    """
+    Sources and derived artifacts of each year, as stored in the bucket
+
+    Attributes
+    ----------
+    years: dict
+        year as str to {"source": dict, "artifacts": {kind: artifact}}, and
+        "tables": {table: {"days", "stats"}} for the tables it was loaded into,
+        and the "watermark" of incremental extraction
+    generation: int
+        generation of the manifest object read, 0 if there was none
+    """
+
+    def __init__(self, store: Store, years: dict | None = None, generation: int = 0):
+        self.store = store
+        self.years = years or {}
+        self.generation = generation
+        self._changes = {}
+
+    @classmethod
+    def load(cls, store: Store, path: str = MANIFEST_PATH) -> "Manifest":
+        """Reads the manifest in one request; empty if there is none yet"""
+        try:
+            data, generation = store.read_bytes(path)
+        except NotFound:
+            logger.info(f"No manifest at {store.uri(path)} yet")
+            return cls(store)
+        return cls(
+            store, years=json.loads(data).get("years", {}), generation=generation
+        )
+
+    def __contains__(self, year: str) -> bool:
+        return str(year) in self.years
+
+    def artifact(self, year: str, kind: str) -> dict | None:
+        return self.years.get(str(year), {}).get("artifacts", {}).get(kind)
+
+    def is_current(
+        self, year: str, kind: str, source: dict | None = None, test: bool = False
+    ) -> bool:
+        """
+        Is there an artifact of this kind for the year that needs no rebuild?
+
+        Parameters
+        ----------
+        year: str
+            year of the artifact
+        kind: str
+            artifact kind, e.g. "csv" or "pq"
+        source: dict | None
+            current fingerprint of the source; if None, any recorded artifact
+            counts as current
+        test: bool
+            whether a test subset is enough; a full artifact always is
+        """
+        artifact = self.artifact(year, kind)
+        if artifact is None or (artifact.get("test") and not test):
+            return False
+        return source is None or artifact["source"] == content_key(source)
+
+    def record(
+        self,
+        year: str,
+        kind: str,
+        path: str,
+        source: dict,
+        test: bool = False,
+        **details,
+    ) -> dict:
+        """
+        Records the object at path as the artifact of this kind
+
+        details are further fields of the artifact: e.g. days, the
+        partitions.day_fingerprints of its rows, watermark, the latest
+        creation_datetime of the year it was cut from, and the column stats
+        and problems found in them
+        """
+        artifact = {
+            **self.store.stat(path),
+            "source": content_key(source),
+            "test": test,
+            **details,
+        }
+        return self._store(year, kind, artifact, source)
+
+    def record_files(
+        self,
+        year: str,
+        kind: str,
+        prefix: str,
+        source: dict,
+        test: bool = False,
+        paths: list | None = None,
+        **details,
+    ) -> dict:
+        """
+        Records the objects at paths, or every object under prefix if None,
+        as one artifact of this kind
+        """
+        prefix = prefix.rstrip("/")
+        if paths is None:
+            files = self.store.list(prefix + "/")
+        else:
+            files = [self.store.stat(path) for path in paths]
+        artifact = {
+            "path": prefix,
+            "size": sum(file["size"] for file in files),
+            "files": files,
+            "source": content_key(source),
+            "test": test,
+            **details,
+        }
+        return self._store(year, kind, artifact, source)
+
+    def loaded(self, year: str, table: str, field: str = "days") -> dict | None:
+        """
+        Day fingerprints, or with field="stats" the column stats, of what was
+        last loaded into table, if recorded
+        """
+        return self.years.get(str(year), {}).get("tables", {}).get(table, {}).get(field)
+
+    def watermark(self, year: str) -> str | None:
+        """Latest creation_datetime loaded of year, as ISO 8601, if recorded"""
+        return self.years.get(str(year), {}).get("watermark")
+
+    def record_load(
+        self,
+        year: str,
+        table: str,
+        days: dict | None = None,
+        watermark: str | None = None,
+        stats: dict | None = None,
+    ) -> None:
+        """
+        Records the day fingerprints of the data now in table, and the column
+        stats of the file loaded into it; either is kept as it was if None
+
+        Tables and the watermark are kept when the source changes, unlike
+        artifacts: they describe what is in BigQuery, whatever it was built
+        from.
+        """
+        # the entry takes no source: what was loaded says nothing of the
+        # archive, and a source read before a concurrent run updated it
+        # would otherwise overwrite that run's
+        entry = self._changes.setdefault(str(year), {"artifacts": {}})
+        loaded = entry.setdefault("tables", {}).setdefault(table, {})
+        if days is not None:
+            loaded["days"] = days
+        if stats is not None:
+            loaded["stats"] = stats
+        if watermark is not None:
+            entry["watermark"] = watermark
+        self._apply(self.years, str(year), entry)
+        logger.info(f"Recorded load of {year} into {table}, up to {watermark}")
+
+    def replace_files(
+        self, year: str, kind: str, removed: list, added: list
+    ) -> dict | None:
+        """
+        Swaps files of a multi-file artifact, keeping the source it is built from
+
+        Parameters
+        ----------
+        removed: list
+            object names dropped from the artifact
+        added: list
+            object names added to the artifact
+
+        Returns
+        -------
+        artifact: dict | None
+            the updated artifact; None if there is no such artifact
+        """
+        artifact = self.artifact(year, kind)
+        if artifact is None or "files" not in artifact:
+            return None
+        removed = set(removed)
+        files = [file for file in artifact["files"] if file["path"] not in removed]
+        files += [self.store.stat(path) for path in added]
+        artifact = {
+            **artifact,
+            "size": sum(file["size"] for file in files),
+            "files": files,
+        }
+        return self._store(year, kind, artifact, self.years[str(year)]["source"])
+
+    def _store(self, year: str, kind: str, artifact: dict, source: dict) -> dict:
+        entry = self._changes.setdefault(str(year), {"artifacts": {}})
+        entry["source"] = source
+        entry["artifacts"][kind] = artifact
+        self._apply(self.years, str(year), entry)
+        logger.info(f"Recorded {kind} artifact of {year}: {artifact['path']}")
+        return artifact
+
+    @staticmethod
+    def _apply(years: dict, year: str, entry: dict) -> None:
+        current = years.setdefault(year, {"artifacts": {}})
+        source, old_source = entry.get("source"), current.get("source")
+        if source is None:
+            # only loads were recorded
+            pass
+        elif old_source is None or content_key(old_source) == content_key(source):
+            if old_source is None or _is_newer(source, old_source):
+                current["source"] = source
+            current["artifacts"].update(entry["artifacts"])
+        elif _is_newer(source, old_source):
+            # artifacts built from the older source are stale, drop them
+            current["source"] = source
+            current["artifacts"] = dict(entry["artifacts"])
+        else:
+            logger.info(
+                f"Not recording artifacts of {year} built from {content_key(source)}, "
+                f"since replaced by {content_key(old_source)}"
+            )
+        for table, loaded in entry.get("tables", {}).items():
+            current.setdefault("tables", {}).setdefault(table, {}).update(loaded)
+        if "watermark" in entry:
+            current["watermark"] = max(current.get("watermark", ""), entry["watermark"])
+
+    def save(self, path: str = MANIFEST_PATH, attempts: int = 5) -> None:
+        """Writes recorded changes, merging with writes made since load()"""
+        if not self._changes:
+            return
+        for _ in range(attempts):
+            body = {"version": MANIFEST_VERSION, "years": self.years}
+            try:
+                generation = self.store.write_bytes(
+                    path,
+                    json.dumps(body, indent=2, sort_keys=True).encode(),
+                    if_generation_match=self.generation,
+                    content_type="application/json",
+                )
+            except PreconditionFailed:
+                logger.info("Manifest changed since it was read, merging")
+                latest = Manifest.load(self.store, path)
+                for year, entry in self._changes.items():
+                    self._apply(latest.years, year, entry)
+                self.years, self.generation = latest.years, latest.generation
+                continue
+            self.generation = generation
+            self._changes = {}
+            logger.info(f"Saved manifest to {self.store.uri(path)}")
+            return
+        raise RuntimeError(f"Could not save manifest after {attempts} attempts")
@@ -0,0 +1,306 @@
+"""
+Replacement of only the day partitions of a facts table that changed
+
+A monthly refresh re-extracts the whole current year, but only its last
+weeks differ from what is already loaded. Each parquet artifact records,
+per day partition of PARTITION_FIELD, its row count and an order-independent
+hash of its rows; the manifest records the same for what was last loaded
+into each table. On reload, the days whose hash or BigQuery row count
+differ are loaded into a staging table and copied over the matching
+partitions of the table with partition decorators (table$YYYYMMDD); days no
+longer in the data are deleted. Every other partition is left untouched.
+A delta of the latest days is appended the same way, so that days it
+shares with the table are replaced rather than duplicated.
+"""
+
+import datetime
+import logging
+import os
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from loads import LoadScheduler, facts_job_config
+from schema import PARTITION_FIELD
+
+logger = logging.getLogger(__name__)
+
+# partition id BigQuery gives rows whose partitioning column is null
+NULL_PARTITION_ID = "__NULL__"
+STAGING_SUFFIX = "_staging"
+# staging tables expire on their own, in case a run dies before cleaning up
+STAGING_EXPIRATION = datetime.timedelta(
+    hours=float(os.getenv("BQ_STAGING_EXPIRATION_HOURS", 24))
+)
+# nullable pandas types of arrow integers, so that a row hashes the same
+# whether or not the batch it comes in has nulls
+_NULLABLE_INTEGERS = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def day_fingerprints(table: pa.Table, field: str = PARTITION_FIELD) -> dict:
+    """
+    Row count and hash of the rows of each day partition of table
+
+    The hash of a day is the sum, modulo 2**64, of the hashes of its rows,
+    so it does not depend on the order the rows were written in, nor on
+    how they were split into batches.
+
+    Returns
+    -------
+    days: dict
+        partition id (YYYYMMDD, or NULL_PARTITION_ID) to {"rows", "hash"}
+    """
+    if table.num_rows == 0:
+        return {}
+    frame = table.to_pandas(types_mapper=_NULLABLE_INTEGERS.get)
+    codes, days = pd.factorize(frame[field].dt.normalize(), sort=True)
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    # uint64 addition wraps around, which is the modulo wanted
+    sums = np.add.reduceat(hashes[order], starts)
+    rows = np.diff(np.r_[starts, len(codes)])
+    return {
+        NULL_PARTITION_ID
+        if code < 0
+        else days[code].strftime("%Y%m%d"): {
+            "rows": int(nrows),
+            "hash": f"{total:016x}",
+        }
+        for code, nrows, total in zip(codes[starts], rows, sums)
+    }
+
+
+class DayFingerprints:
+    """
+    day_fingerprints accumulated over the tables of one file
+
+    Row counts and hashes of a day both add up across tables, so the file's
+    fingerprints are gathered batch by batch as it is written, without
+    reading it back. Large tables are hashed in slices of batch_size rows,
+    so that only a slice at a time is converted to pandas.
+    """
+
+    def __init__(self, field: str = PARTITION_FIELD, batch_size: int = 1 << 17):
+        self.field = field
+        self.batch_size = batch_size
+        self.days = {}
+
+    def update(self, table: pa.Table) -> pa.Table:
+        """Adds the rows of table, returning it"""
+        for batch in table.to_batches(max_chunksize=self.batch_size):
+            fingerprints = day_fingerprints(pa.Table.from_batches([batch]), self.field)
+            for day, fingerprint in fingerprints.items():
+                rows, total = self.days.get(day, (0, 0))
+                self.days[day] = (
+                    rows + fingerprint["rows"],
+                    (total + int(fingerprint["hash"], 16)) % 2**64,
+                )
+        return table
+
+    def collect(self, tables: Iterable[pa.Table]) -> Iterator[pa.Table]:
+        """Passes tables through, adding each as it goes by"""
+        for table in tables:
+            yield self.update(table)
+
+    def to_dict(self) -> dict:
+        """The fingerprints, as returned by day_fingerprints"""
+        return {
+            day: {"rows": rows, "hash": f"{total:016x}"}
+            for day, (rows, total) in sorted(self.days.items())
+        }
+
+
+def partition_rows(client: bigquery.Client, table: bigquery.Table) -> dict:
+    """Row count of each partition of table, from its metadata, scanning nothing"""
+    query = (
+        "SELECT partition_id, total_rows "
+        f"FROM `{table.project}.{table.dataset_id}.INFORMATION_SCHEMA.PARTITIONS` "
+        "WHERE table_name = @table_name"
+    )
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("table_name", "STRING", table.table_id)
+        ]
+    )
+    rows = client.query(query, job_config=job_config).result()
+    return {row.partition_id: row.total_rows for row in rows if row.total_rows}
+
+
+def changed_partitions(
+    days: dict, loaded: dict | None, table_rows: dict, partial: bool = False
+) -> tuple[list, list]:
+    """
+    Partitions to replace, and to delete, to bring the table in line with days
+
+    Parameters
+    ----------
+    days: dict
+        day_fingerprints of the new data
+    loaded: dict | None
+        day_fingerprints of the data last loaded into the table; if None,
+        every day of the new data is replaced
+    table_rows: dict
+        row count of each partition of the table as it is
+    partial: bool
+        if true, days only covers some of the table, as a delta does, and
+        no partition is deleted
+
+    Returns
+    -------
+    replaced: list
+        partition ids whose rows changed, or are missing from the table
+    deleted: list
+        partition ids of the table no longer in the new data
+    """
+    replaced = [
+        day
+        for day, fingerprint in sorted(days.items())
+        if loaded is None or loaded.get(day, {}).get("hash") != fingerprint["hash"]
+        # catches edits to the table made outside of these loads
+        or table_rows.get(day) != fingerprint["rows"]
+    ]
+    deleted = [] if partial else sorted(day for day in table_rows if day not in days)
+    return replaced, deleted
+
+
+def replace_partitions(
+    client: bigquery.Client,
+    src_uris: list,
+    dest_table: str,
+    days: dict,
+    loaded: dict | None = None,
+    project: str | None = None,
+    partial: bool = False,
+    scheduler: LoadScheduler | None = None,
+    when_replaced: Callable[[bigquery.LoadJob | None], None] | None = None,
+) -> bigquery.LoadJob | None:
+    """
+    Loads src_uris into dest_table, replacing only the partitions that changed
+
+    The load into a staging table, and the copies of its partitions over
+    the table's, run as jobs of the scheduler, each step submitted by a
+    callback of the last; copies and deletions of partitions are metadata
+    operations, billed and timed as such.
+
+    Parameters
+    ----------
+    client: bigquery.Client
+        client of the table's project and location
+    src_uris: list
+        URIs of the parquet of the data
+    dest_table: str
+        table id, [project.]dataset.table
+    days: dict
+        day_fingerprints of the data at src_uris
+    loaded: dict | None
+        day_fingerprints of what was last loaded into dest_table, if known
+    project: str | None
+        project the jobs run in
+    partial: bool
+        if true, src_uris hold only some days, e.g. a delta of the latest
+        ones; partitions of other days are kept rather than deleted
+    scheduler: LoadScheduler | None
+        if given, the jobs are only submitted to it, and the caller waits on
+        the scheduler; otherwise this waits for them
+    when_replaced: Callable | None
+        called with the returned job once every partition is replaced, and
+        not at all if a job fails
+
+    Returns
+    -------
+    LoadJob | None
+        the load into the staging table, or into dest_table if there was no
+        table yet; None if no partition changed
+    """
+    waits = scheduler is None
+    if waits:
+        scheduler = LoadScheduler()
+    replaced_all = when_replaced or (lambda job: None)
+    try:
+        table = client.get_table(dest_table)
+    except NotFound:
+        logger.info(f"No table {dest_table} yet; loading every partition")
+        load_job = scheduler.add(
+            client.load_table_from_uri(
+                src_uris, dest_table, job_config=facts_job_config(), project=project
+            )
+        )
+        scheduler.when_done(load_job, replaced_all)
+        if waits:
+            scheduler.wait()
+        return load_job
+    replaced, deleted = changed_partitions(
+        days, loaded, partition_rows(client, table), partial=partial
+    )
+    logger.info(
+        f"{dest_table}: {len(replaced)} of {len(days)} partitions changed, "
+        f"{len(deleted)} to delete"
+    )
+
+    def delete_partitions() -> None:
+        for day in deleted:
+            client.delete_table(f"{dest_table}${day}", not_found_ok=True)
+        logger.info(
+            f"Replaced partitions {replaced} and deleted partitions {deleted} "
+            f"of {dest_table}"
+        )
+
+    if not replaced:
+        delete_partitions()
+        replaced_all(None)
+        return None
+
+    staging_table = f"{dest_table}{STAGING_SUFFIX}"
+    load_job = scheduler.add(
+        client.load_table_from_uri(
+            src_uris,
+            staging_table,
+            job_config=facts_job_config(
+                write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+            ),
+            project=project,
+        )
+    )
+    copied = []
+
+    def copy_partitions(_) -> None:
+        staging = client.get_table(staging_table)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        staging.expires = now + STAGING_EXPIRATION
+        client.update_table(staging, ["expires"])
+        copy_config = bigquery.CopyJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+        )
+        for day in replaced:
+            copy_job = scheduler.add(
+                client.copy_table(
+                    f"{staging_table}${day}",
+                    f"{dest_table}${day}",
+                    job_config=copy_config,
+                    project=project,
+                )
+            )
+            scheduler.when_done(copy_job, partition_copied)
+
+    def partition_copied(copy_job: bigquery.CopyJob) -> None:
+        copied.append(copy_job)
+        if len(copied) == len(replaced):
+            client.delete_table(staging_table, not_found_ok=True)
+            delete_partitions()
+            replaced_all(load_job)
+
+    scheduler.when_done(load_job, copy_partitions)
+    if waits:
+        scheduler.wait()
+    return load_job
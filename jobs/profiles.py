@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""
+Named parquet write profiles
+
+A profile bundles the parquet writer options (codec and level, row-group
+and page sizes, dictionary encoding, statistics) with the order rows are
+written in. "small-and-prunable" sorts rows by day of PARTITION_FIELD and
+then by CLUSTERING_FIELDS, the layout load_bigquery gives the table, so
+each row group covers few days and few request types: files compress
+better and readers can skip row groups by their statistics. "fast-write"
+spends as little CPU as it can on the write. "default" is pyarrow's
+defaults, as files were written before profiles.
+"""
+
+import argparse
+import inspect
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from schema import CLUSTERING_FIELDS, PARTITION_FIELD
+from stats import table_stats, with_stats
+
+logger = logging.getLogger(__name__)
+
+# page indexes can only be written by pyarrow 13 and later
+_WRITES_PAGE_INDEX = (
+    "write_page_index" in inspect.signature(pq.ParquetWriter).parameters
+)
+
+
+@dataclass(frozen=True)
+class WriteProfile:
+    """
+    How parquet files are written
+
+    Attributes
+    ----------
+    compression: str
+        codec of the column chunks
+    compression_level: int | None
+        codec level; the codec's default if None
+    row_group_size: int | None
+        most rows per row group; one row group per table written if None
+    use_dictionary: bool | tuple
+        dictionary encode every column, none, or only those named
+    write_statistics: bool | tuple
+        write min/max statistics of every column, none, or only those named
+    data_page_size: int | None
+        target bytes per data page; smaller pages make page statistics finer
+    write_page_index: bool
+        write column and offset indexes, where the installed pyarrow can
+    cluster_sort: bool
+        sort rows by day of PARTITION_FIELD, then by CLUSTERING_FIELDS
+    """
+
+    compression: str = "snappy"
+    compression_level: int | None = None
+    row_group_size: int | None = None
+    use_dictionary: bool | tuple = True
+    write_statistics: bool | tuple = True
+    data_page_size: int | None = None
+    write_page_index: bool = False
+    cluster_sort: bool = False
+
+    def writer_options(self) -> dict:
+        """Keyword arguments of pq.ParquetWriter for this profile"""
+        options = dict(
+            compression=self.compression,
+            compression_level=self.compression_level,
+            use_dictionary=_option(self.use_dictionary),
+            write_statistics=_option(self.write_statistics),
+        )
+        if self.data_page_size is not None:
+            options["data_page_size"] = self.data_page_size
+        if self.write_page_index and _WRITES_PAGE_INDEX:
+            options["write_page_index"] = True
+        return options
+
+    def prepare(self, table: pa.Table) -> pa.Table:
+        """Puts the rows of table in the order this profile writes them"""
+        return sort_for_clustering(table) if self.cluster_sort else table
+
+
+def _option(value: bool | tuple) -> bool | list:
+    return list(value) if isinstance(value, tuple) else value
+
+
+# columns of FACTS_SCHEMA that are dictionary encoded in memory already
+_CATEGORY_COLUMNS = (
+    "status",
+    "fsa_code",
+    "service_request_type",
+    "division",
+    "section",
+    "ward_name",
+)
+
+PROFILES = {
+    "default": WriteProfile(),
+    "fast-write": WriteProfile(
+        compression="snappy",
+        row_group_size=1 << 20,
+        # free-text columns are hashed for little gain
+        use_dictionary=_CATEGORY_COLUMNS,
+        write_statistics=(PARTITION_FIELD, *CLUSTERING_FIELDS),
+    ),
+    "small-and-prunable": WriteProfile(
+        compression="zstd",
+        compression_level=9,
+        row_group_size=128 << 10,
+        data_page_size=256 << 10,
+        write_page_index=True,
+        cluster_sort=True,
+    ),
+}
+DEFAULT_PROFILE = os.getenv("PARQUET_PROFILE", "default")
+
+
+def get_profile(name: str) -> WriteProfile:
+    """Looks up a profile by name"""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Invalid write profile: {name}") from None
+
+
+def sort_for_clustering(table: pa.Table) -> pa.Table:
+    """
+    Sorts facts by day of PARTITION_FIELD, CLUSTERING_FIELDS, then time
+
+    Arrow cannot sort dictionary columns, so keys are sorted decoded.
+    """
+    keys = {"day": pc.floor_temporal(table[PARTITION_FIELD], unit="day")}
+    for name in CLUSTERING_FIELDS:
+        column = table[name]
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        keys[name] = column
+    keys[PARTITION_FIELD] = table[PARTITION_FIELD]
+    indices = pc.sort_indices(
+        pa.table(keys),
+        sort_keys=[(name, "ascending") for name in keys],
+        null_placement="at_end",
+    )
+    return table.take(indices)
+
+
+def write_table(
+    table: pa.Table, where, profile: str = DEFAULT_PROFILE, filesystem=None
+) -> None:
+    """
+    Writes table as a parquet file with the options of profile, and its
+    column statistics in the file's key-value metadata
+    """
+    options = get_profile(profile)
+    # replaces statistics the table carries over from the file it was read from
+    table = with_stats(table, table_stats(table))
+    pq.write_table(
+        options.prepare(table),
+        where,
+        filesystem=filesystem,
+        row_group_size=options.row_group_size,
+        **options.writer_options(),
+    )
+
+
+def compare_profiles(pq_path: Path, names: list | None = None) -> list:
+    """
+    Rewrites a parquet file with each profile, timing writes and reads
+
+    Parameters
+    ----------
+    pq_path: Path
+        local parquet of facts
+    names: list | None
+        profiles to compare; all if None
+
+    Returns
+    -------
+    results: list
+        profile, bytes, write and read seconds of each profile
+    """
+    table = pq.read_table(pq_path)
+    results = []
+    with TemporaryDirectory() as tmp_dir:
+        for name in names or PROFILES:
+            out_path = Path(tmp_dir) / f"{name}.parquet"
+            started = time.perf_counter()
+            write_table(table, out_path, profile=name)
+            written = time.perf_counter()
+            pq.read_table(out_path)
+            read = time.perf_counter()
+            results.append(
+                {
+                    "profile": name,
+                    "bytes": out_path.stat().st_size,
+                    "write_s": round(written - started, 3),
+                    "read_s": round(read - written, 3),
+                }
+            )
+            logger.info(
+                f"{name}: {results[-1]['bytes']} bytes, written in "
+                f"{results[-1]['write_s']}s, read in {results[-1]['read_s']}s"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="toronto-311-profiles",
+        description="Compares parquet write profiles on a file of facts",
+    )
+    parser.add_argument("pq_path", type=Path)
+    parser.add_argument("-p", "--profile", nargs="+", choices=list(PROFILES))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    compare_profiles(args.pq_path, args.profile)
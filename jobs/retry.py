@@ -0,0 +1,166 @@
+"""
+Shared retry policy for HTTP calls to the open data portal
+
+Failed attempts are retried with jittered exponential backoff, each under
+its own timeout and all under an overall deadline. Idempotent calls can
+also be hedged: a duplicate request is sent if the first is slow, and
+whichever answers first wins. Retries and hedges are counted in METRICS.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# statuses worth retrying; anything else is raised straight away
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+METRICS = Counter()
+_metrics_lock = threading.Lock()
+
+
+def record(name: str, count: int = 1) -> None:
+    """Adds count to the named metric"""
+    with _metrics_lock:
+        METRICS[name] += count
+
+
+@dataclass(frozen=True)
+class RequestPolicy:
+    """
+    How an HTTP call is retried
+
+    Attributes
+    ----------
+    attempts: int
+        maximum number of attempts, including the first
+    base_delay: float
+        backoff before the first retry, doubled for each one after
+    max_delay: float
+        upper bound of any one backoff
+    timeout: float
+        per-attempt deadline, in seconds
+    deadline: float | None
+        overall deadline across attempts and backoffs, in seconds
+    hedge_after: float | None
+        if set, send a duplicate request when the first has not answered
+        after this many seconds
+    """
+
+    attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    timeout: float = 5.0
+    deadline: float | None = 60.0
+    hedge_after: float | None = None
+
+    def backoff(self, retry: int) -> float:
+        """Full-jitter delay before the given retry, counted from 0"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+CKAN_POLICY = RequestPolicy(timeout=5.0, hedge_after=1.5)
+DOWNLOAD_POLICY = RequestPolicy(attempts=5, timeout=30.0, deadline=None)
+
+
+def is_retryable(error: Exception, retry_on: tuple = ()) -> bool:
+    """Connection problems, timeouts and transient statuses are retryable"""
+    if isinstance(error, retry_on):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRYABLE_STATUSES
+    return isinstance(
+        error,
+        (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ),
+    )
+
+
+def call_with_retries(
+    fn: Callable[[float], T],
+    policy: RequestPolicy,
+    name: str = "request",
+    retry_on: tuple = (),
+) -> T:
+    """
+    Calls fn(timeout) until it succeeds or the policy is exhausted
+
+    Parameters
+    ----------
+    fn: Callable[[float], T]
+        the call; receives the timeout in seconds for this attempt
+    policy: RequestPolicy
+        attempts, backoff and deadlines to apply
+    name: str
+        prefix of the metrics recorded for this call
+    retry_on: tuple
+        exception types to retry besides those is_retryable accepts
+
+    Returns
+    -------
+    T
+        the first successful result of fn
+    """
+    started = time.monotonic()
+    for attempt in range(policy.attempts):
+        timeout = policy.timeout
+        if policy.deadline is not None:
+            remaining = policy.deadline - (time.monotonic() - started)
+            timeout = max(min(timeout, remaining), 0.1)
+        try:
+            if policy.hedge_after is not None:
+                return _hedged(fn, timeout, policy.hedge_after, name)
+            return fn(timeout)
+        except Exception as e:
+            if not is_retryable(e, retry_on) or attempt == policy.attempts - 1:
+                record(f"{name}.failures")
+                raise
+            delay = policy.backoff(attempt)
+            elapsed = time.monotonic() - started
+            if policy.deadline is not None and elapsed + delay >= policy.deadline:
+                record(f"{name}.failures")
+                raise
+            record(f"{name}.retries")
+            logger.warning(
+                f"{name} failed ({e}); retrying in {delay:.1f}s, "
+                f"attempt {attempt + 2} of {policy.attempts}"
+            )
+            time.sleep(delay)
+
+
+def _hedged(fn: Callable[[float], T], timeout: float, hedge_after: float, name: str):
+    """Races fn against a duplicate sent after hedge_after seconds"""
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        futures = [executor.submit(fn, timeout)]
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            record(f"{name}.hedges")
+            futures.append(executor.submit(fn, max(timeout - hedge_after, 0.1)))
+        error = None
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        record(f"{name}.hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        # do not wait on the losing request
+        executor.shutdown(wait=False)
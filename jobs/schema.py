@@ -0,0 +1,80 @@
+"""
+Declared schema of the 311 service request facts table
+
+Low-cardinality text fields are dictionary-encoded, both as pandas categoricals
+in memory and as arrow dictionaries in the parquet output.
+"""
+
+import pandas as pd
+import pyarrow as pa
+
+# day partitioning and clustering of the BigQuery facts tables
+PARTITION_FIELD = "creation_datetime"
+CLUSTERING_FIELDS = ["service_request_type", "ward_id"]
+
+# raw csv columns dropped after being parsed into facts columns
+DERIVED_COLUMNS = ["Creation Date", "Ward"]
+# raw csv column to facts column, where snake_case alone is not enough
+RENAMED_COLUMNS = {"First 3 Chars of Postal Code": "fsa_code"}
+
+# dtypes applied while parsing the raw csv
+RAW_DTYPES = {
+    "Status": "category",
+    "First 3 Chars of Postal Code": "category",
+    "Intersection Street 1": "string",
+    "Intersection Street 2": "string",
+    "Ward": "category",
+    "Service Request Type": "category",
+    "Division": "category",
+    "Section": "category",
+}
+
+_category = pa.dictionary(pa.int32(), pa.string())
+FACTS_SCHEMA = pa.schema(
+    [
+        pa.field("status", _category),
+        pa.field("fsa_code", _category),
+        pa.field("intersection_street_1", pa.string()),
+        pa.field("intersection_street_2", pa.string()),
+        pa.field("service_request_type", _category),
+        pa.field("division", _category),
+        pa.field("section", _category),
+        pa.field("ward_name", _category),
+        pa.field("ward_id", pa.int8()),
+        pa.field("creation_datetime", pa.timestamp("ns")),
+    ]
+)
+
+# pandas equivalent of FACTS_SCHEMA
+FACTS_DTYPES = {
+    "status": "category",
+    "fsa_code": "category",
+    "intersection_street_1": "string",
+    "intersection_street_2": "string",
+    "service_request_type": "category",
+    "division": "category",
+    "section": "category",
+    "ward_name": "category",
+    "ward_id": "Int8",
+    "creation_datetime": "datetime64[ns]",
+}
+
+# arrow types equivalent to RAW_DTYPES, for reading the csv without pandas
+RAW_ARROW_TYPES = {
+    "Creation Date": pa.string(),
+    **{
+        column: _category if dtype == "category" else pa.string()
+        for column, dtype in RAW_DTYPES.items()
+    },
+}
+
+# FACTS_SCHEMA with the pandas metadata DataFrame.to_parquet attaches, so that
+# files written straight from arrow read back into pandas with FACTS_DTYPES
+FACTS_PANDAS_SCHEMA = FACTS_SCHEMA.with_metadata(
+    pa.Schema.from_pandas(
+        pd.DataFrame(
+            {name: pd.Series(dtype=dtype) for name, dtype in FACTS_DTYPES.items()}
+        ),
+        preserve_index=False,
+    ).metadata
+)
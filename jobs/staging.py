@@ -0,0 +1,121 @@
+"""
+Arrow IPC intermediates handed between pipeline stages
+
+The csv can be converted to a local Arrow IPC file instead of parquet.
+Later stages (parquet or partition writing, statistics, validation) then
+memory-map it: the table is read without decoding or decompressing, its
+buffers point into the page cache rather than the heap, and every consumer
+in the process shares the same pages.
+
+Tables are written in the IPC stream format, which, unlike the Feather
+file format, lets each batch carry its own dictionaries, as batches of
+categoricals converted separately do. Both formats can be read back.
+"""
+
+import itertools
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+INTERMEDIATES = ("parquet", "arrow")
+IPC_SUFFIX = ".arrows"
+IPC_SUFFIXES = (IPC_SUFFIX, ".arrow", ".feather")
+# leading bytes of the IPC file (Feather v2) format
+_FILE_MAGIC = b"ARROW1"
+# rows decoded at a time when a parquet intermediate is read in batches
+STAGED_BATCH_SIZE = 1 << 18
+
+
+def is_ipc(path) -> bool:
+    """Is path an Arrow IPC file, going by its suffix?"""
+    return not hasattr(path, "read") and Path(str(path)).suffix in IPC_SUFFIXES
+
+
+def write_ipc_tables(tables: Iterable[pa.Table], path: Path) -> int:
+    """
+    Writes tables, all of one schema, as an uncompressed IPC stream
+
+    Returns
+    -------
+    nrows: int
+        rows written
+    """
+    nrows = 0
+    writer = None
+    with open(path, "wb") as sink:
+        try:
+            for table in tables:
+                if writer is None:
+                    writer = pa.ipc.new_stream(sink, table.schema)
+                writer.write_table(table)
+                nrows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+    logger.info(f"{nrows} rows staged to {path}: {Path(path).stat().st_size} bytes")
+    return nrows
+
+
+def read_ipc(path: Path) -> pa.Table:
+    """Memory-maps an IPC stream or file as a table, without copying it"""
+    source = pa.memory_map(str(path))
+    # the mapping stays alive for as long as the table's buffers do
+    if source.read(len(_FILE_MAGIC)) == _FILE_MAGIC:
+        return pa.ipc.open_file(source).read_all()
+    source.seek(0)
+    return pa.ipc.open_stream(source).read_all()
+
+
+def read_staged(path: Path) -> pa.Table:
+    """Reads an intermediate of either format"""
+    return read_ipc(path) if is_ipc(path) else pq.read_table(path)
+
+
+def iter_staged(path: Path, batch_size: int = STAGED_BATCH_SIZE) -> Iterator[pa.Table]:
+    """
+    Reads an intermediate of either format a batch at a time
+
+    Batches of an IPC intermediate are zero-copy slices of the mapped file,
+    as they were written; a parquet intermediate is decoded batch_size rows
+    at a time.
+    """
+    if is_ipc(path):
+        batches = read_ipc(path).to_batches()
+    else:
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+    for batch in batches:
+        yield pa.Table.from_batches([batch])
+
+
+def spool_tables(tables: Iterable[pa.Table], directory: Path) -> list:
+    """
+    Writes tables to an IPC stream in directory and maps them back
+
+    Lets a stream of tables be consumed, e.g. for statistics, before it is
+    written elsewhere, holding none of them in memory. The file must be
+    kept until the tables returned are no longer used.
+
+    Returns
+    -------
+    tables: list
+        the tables, as zero-copy slices of the mapped file
+    """
+    sizes = []
+
+    def counted(tables: Iterable[pa.Table]) -> Iterator[pa.Table]:
+        for table in tables:
+            sizes.append(table.num_rows)
+            yield table
+
+    path = Path(directory) / f"spool{IPC_SUFFIX}"
+    write_ipc_tables(counted(tables), path)
+    if not sizes:
+        return []
+    spooled = read_ipc(path)
+    offsets = itertools.accumulate(sizes, initial=0)
+    return [spooled.slice(offset, size) for offset, size in zip(offsets, sizes)]
@@ -0,0 +1,194 @@
+"""
+Column statistics of converted facts
+
+While the csv is converted every row passes through the pipeline once, so
+the statistics the dbt tests and staging filters would otherwise rescan
+BigQuery for are gathered on the way: the row count and, per column, the
+null count, min and max, and the distinct values of low-cardinality
+columns. They are written to a JSON sidecar under raw/stats/ and recorded
+in the manifest, and into the parquet's own key-value metadata.
+
+check() flags data the dbt tests would warn about before it is loaded, and
+a load can be skipped when the statistics of its file match those of the
+file last loaded into the table.
+"""
+
+import json
+import logging
+import os
+from typing import Iterable, Iterator
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from backends import Store
+
+logger = logging.getLogger(__name__)
+
+# columns with at most this many distinct values have them listed
+MAX_DISTINCT = int(os.getenv("STATS_MAX_DISTINCT", 64))
+# key of the statistics in the parquet key-value metadata
+METADATA_KEY = b"service_calls.stats"
+# not null in the dbt tests, and filtered on by stg_service_calls
+REQUIRED_COLUMNS = ["ward_id", "ward_name", "service_request_type", "creation_datetime"]
+# accepted_values of the dbt tests
+ACCEPTED_VALUES = {"status": ["Initiated", "In Progress", "Canceled", "Closed"]}
+
+
+def _json_value(value):
+    # timestamps as ISO 8601, so the statistics round-trip through JSON
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+class ColumnStats:
+    """
+    Statistics accumulated over the tables of one file
+
+    Attributes
+    ----------
+    rows: int
+        rows seen
+    columns: dict
+        column name to {"nulls", "min", "max", "values"}; values is the set
+        of distinct values, or None once there are more than max_distinct
+    """
+
+    def __init__(self, max_distinct: int = MAX_DISTINCT):
+        self.max_distinct = max_distinct
+        self.rows = 0
+        self.columns = {}
+
+    def update(self, table: pa.Table) -> pa.Table:
+        """Adds the rows of table, returning it"""
+        self.rows += table.num_rows
+        for name, column in zip(table.column_names, table.columns):
+            entry = self.columns.setdefault(
+                name, {"nulls": 0, "min": None, "max": None, "values": set()}
+            )
+            entry["nulls"] += column.null_count
+            if pa.types.is_dictionary(column.type):
+                # only the values the indices use, which are few
+                uniques = [
+                    chunk.dictionary.take(pc.unique(chunk.indices).drop_null())
+                    for chunk in column.chunks
+                ]
+                column = pa.chunked_array(uniques, column.type.value_type)
+            low, high = pc.min_max(column).values()
+            self._merge(entry, low.as_py(), high.as_py())
+            listable = pa.types.is_string(column.type) or pa.types.is_integer(
+                column.type
+            )
+            if not listable:
+                entry["values"] = None
+            elif entry["values"] is not None:
+                entry["values"].update(pc.unique(column).drop_null().to_pylist())
+                if len(entry["values"]) > self.max_distinct:
+                    entry["values"] = None
+        return table
+
+    def _merge(self, entry: dict, low, high) -> None:
+        if low is not None and (entry["min"] is None or low < entry["min"]):
+            entry["min"] = low
+        if high is not None and (entry["max"] is None or high > entry["max"]):
+            entry["max"] = high
+
+    def collect(self, tables: Iterable[pa.Table]) -> Iterator[pa.Table]:
+        """Passes tables through, adding each as it goes by"""
+        for table in tables:
+            yield self.update(table)
+
+    def to_dict(self) -> dict:
+        """
+        The statistics as JSON-serialisable values
+
+        Returns
+        -------
+        stats: dict
+            "rows", and "columns": name to nulls, min, max, distinct (count,
+            None if more than max_distinct) and values (sorted, or None)
+        """
+        columns = {}
+        for name, entry in self.columns.items():
+            values = entry["values"]
+            if values is not None:
+                values = sorted(values)
+            columns[name] = {
+                "nulls": entry["nulls"],
+                "min": _json_value(entry["min"]),
+                "max": _json_value(entry["max"]),
+                "distinct": None if values is None else len(values),
+                "values": values,
+            }
+        return {"rows": self.rows, "columns": columns}
+
+
+def table_stats(table: pa.Table, max_distinct: int = MAX_DISTINCT) -> dict:
+    """Statistics of a single table"""
+    stats = ColumnStats(max_distinct)
+    stats.update(table)
+    return stats.to_dict()
+
+
+def with_stats(table: pa.Table, stats: dict) -> pa.Table:
+    """table with stats in its schema metadata, to be written into the file"""
+    return table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), METADATA_KEY: json.dumps(stats).encode()}
+    )
+
+
+def read_stats(metadata: dict | None) -> dict | None:
+    """Statistics from parquet or schema key-value metadata, if there are any"""
+    data = (metadata or {}).get(METADATA_KEY)
+    return None if data is None else json.loads(data)
+
+
+def check(stats: dict, year: str | None = None) -> list:
+    """
+    Problems the dbt tests would warn about, found from the statistics alone
+
+    Parameters
+    ----------
+    stats: dict
+        as from ColumnStats.to_dict
+    year: str | None
+        year the creation_datetime of every row should fall in
+
+    Returns
+    -------
+    problems: list
+        descriptions of each problem; empty if there are none
+    """
+    problems = []
+    if stats["rows"] == 0:
+        return ["no rows"]
+    columns = stats["columns"]
+    for name in REQUIRED_COLUMNS:
+        nulls = columns.get(name, {}).get("nulls", 0)
+        if nulls:
+            problems.append(f"{nulls} of {stats['rows']} rows with null {name}")
+    for name, accepted in ACCEPTED_VALUES.items():
+        values = columns.get(name, {}).get("values")
+        if values is None:
+            continue
+        unexpected = sorted(set(values) - set(accepted))
+        if unexpected:
+            problems.append(f"{name} values not accepted: {unexpected}")
+    created = columns.get("creation_datetime", {})
+    if year is not None and created.get("min") is not None:
+        if created["min"][:4] != str(year) or created["max"][:4] != str(year):
+            problems.append(
+                f"creation_datetime from {created['min']} to {created['max']}, "
+                f"outside {year}"
+            )
+    return problems
+
+
+def write_sidecar(store: Store, path: str, stats: dict, problems: list) -> None:
+    """Writes the statistics, and the problems found in them, to path as JSON"""
+    body = {"stats": stats, "problems": problems}
+    store.write_bytes(
+        path,
+        json.dumps(body, indent=2, sort_keys=True).encode(),
+        content_type="application/json",
+    )
+    logger.info(f"Statistics of {stats['rows']} rows written to {store.uri(path)}")
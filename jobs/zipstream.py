@@ -0,0 +1,254 @@
+"""
+Decompresses a zip archive as its bytes arrive, e.g. from an HTTP download
+
+Members are read from their local file headers, so the central directory at
+the end of the archive is never needed. Archives whose local headers do not
+carry enough information to stream (encryption, unsupported compression,
+stored members of unknown size) are spilled to a temporary file and read
+with zipfile instead.
+"""
+
+import io
+import logging
+import struct
+import zlib
+from tempfile import TemporaryFile
+from typing import Iterable, Iterator
+from zipfile import BadZipFile, ZipFile
+
+logger = logging.getLogger(__name__)
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+LOCAL_HEADER_SIG = 0x04034B50
+DATA_DESCRIPTOR_SIG = 0x08074B50
+ZIP64_EXTRA_ID = 0x0001
+# general purpose flag bits
+FLAG_ENCRYPTED = 0x1
+FLAG_DATA_DESCRIPTOR = 0x8
+FLAG_UTF8 = 0x800
+# compression methods
+STORED = 0
+DEFLATED = 8
+
+
+class UnstreamableZip(Exception):
+    """Raised when a member cannot be decompressed from its local header alone"""
+
+
+class _ByteStream:
+    """
+    Buffers an iterable of byte chunks for exact-size reads
+
+    Raw bytes are kept until commit() so that the archive can be replayed
+    from the start if it has to be spilled to disk.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self._history = []
+        self._recording = True
+
+    def _next_chunk(self) -> bytes:
+        chunk = next(self._chunks, b"")
+        if self._recording:
+            self._history.append(chunk)
+        return chunk
+
+    def read(self, size: int) -> bytes:
+        """Reads exactly size bytes, or fewer at the end of the stream"""
+        while len(self._buffer) < size:
+            chunk = self._next_chunk()
+            if not chunk:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def read_some(self) -> bytes:
+        """Reads whatever is buffered, or the next chunk"""
+        data, self._buffer = self._buffer or self._next_chunk(), b""
+        return data
+
+    def unread(self, data: bytes) -> None:
+        self._buffer = data + self._buffer
+
+    def commit(self) -> None:
+        """Stops keeping raw bytes for replay"""
+        self._recording = False
+        self._history = []
+
+    def replay(self) -> Iterator[bytes]:
+        """Yields every raw byte seen so far, then the rest of the stream"""
+        yield from self._history
+        self._recording = False
+        yield from self._chunks
+
+
+def _zip64_sizes(extra: bytes) -> tuple[int, int] | None:
+    """Returns (uncompressed, compressed) sizes from a zip64 extra field"""
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, pos)
+        if header_id == ZIP64_EXTRA_ID and size >= 16:
+            return struct.unpack_from("<QQ", extra, pos + 4)
+        pos += 4 + size
+    return None
+
+
+def _inflate(stream: _ByteStream) -> Iterator[bytes]:
+    """Decompresses one deflate stream, leaving stream positioned after it"""
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    while not decompressor.eof:
+        chunk = stream.read_some()
+        if not chunk:
+            raise BadZipFile("Truncated deflate stream")
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    stream.unread(decompressor.unused_data)
+
+
+def _read_stored(stream: _ByteStream, size: int, chunk_size: int) -> Iterator[bytes]:
+    while size > 0:
+        data = stream.read(min(size, chunk_size))
+        if not data:
+            raise BadZipFile("Truncated stored member")
+        size -= len(data)
+        yield data
+
+
+def _read_data_descriptor(stream: _ByteStream, zip64: bool) -> int:
+    """Consumes the data descriptor following a member; returns its CRC"""
+    crc = stream.read(4)
+    if struct.unpack("<I", crc)[0] == DATA_DESCRIPTOR_SIG:
+        crc = stream.read(4)
+    stream.read(16 if zip64 else 8)
+    return struct.unpack("<I", crc)[0]
+
+
+def _iter_local_csv(stream: _ByteStream, chunk_size: int) -> Iterator[bytes]:
+    while True:
+        header = stream.read(LOCAL_HEADER.size)
+        if len(header) < LOCAL_HEADER.size:
+            raise BadZipFile("Archive ended before a csv member was found")
+        (
+            sig,
+            _,
+            flags,
+            method,
+            _,
+            _,
+            crc,
+            csize,
+            usize,
+            name_len,
+            extra_len,
+        ) = LOCAL_HEADER.unpack(header)
+        if sig != LOCAL_HEADER_SIG:
+            # reached the central directory
+            raise FileNotFoundError("No csv member found in archive")
+        name = stream.read(name_len).decode("utf-8" if flags & FLAG_UTF8 else "cp437")
+        extra = stream.read(extra_len)
+        zip64 = _zip64_sizes(extra)
+
+        if flags & FLAG_ENCRYPTED:
+            raise UnstreamableZip(f"{name} is encrypted")
+        if method == DEFLATED:
+            member = _inflate(stream)
+        elif method == STORED and flags & FLAG_DATA_DESCRIPTOR:
+            raise UnstreamableZip(f"{name} is stored without a size")
+        elif method == STORED:
+            if csize == 0xFFFFFFFF:
+                if zip64 is None:
+                    raise UnstreamableZip(f"{name} has no zip64 size")
+                _, csize = zip64
+            member = _read_stored(stream, csize, chunk_size)
+        else:
+            raise UnstreamableZip(f"{name} uses compression method {method}")
+
+        is_csv = name.lower().endswith(".csv")
+        if is_csv:
+            logger.info(f"Streaming {name} from archive")
+            stream.commit()
+        actual_crc = 0
+        for data in member:
+            actual_crc = zlib.crc32(data, actual_crc)
+            if is_csv:
+                yield data
+        if flags & FLAG_DATA_DESCRIPTOR:
+            crc = _read_data_descriptor(stream, zip64=zip64 is not None)
+        if actual_crc != crc:
+            raise BadZipFile(f"CRC mismatch for {name}")
+        if is_csv:
+            return
+
+
+def _iter_spilled_csv(chunks: Iterable[bytes], chunk_size: int) -> Iterator[bytes]:
+    with TemporaryFile() as tmpzip:
+        for chunk in chunks:
+            tmpzip.write(chunk)
+        tmpzip.seek(0)
+        with ZipFile(tmpzip) as archive:
+            names = [
+                name for name in archive.namelist() if name.lower().endswith(".csv")
+            ]
+            if not names:
+                raise FileNotFoundError("No csv member found in archive")
+            with archive.open(names[0]) as member:
+                while data := member.read(chunk_size):
+                    yield data
+
+
+def iter_zip_csv(chunks: Iterable[bytes], chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """
+    Yields the decompressed bytes of the first csv member of a zip archive
+
+    Parameters
+    ----------
+    chunks: Iterable[bytes]
+        raw archive bytes in order, e.g. requests' iter_content()
+    chunk_size: int
+        read size for stored members and spilled archives
+
+    Returns
+    -------
+    Iterator[bytes]
+        decompressed csv bytes
+    """
+    stream = _ByteStream(chunks)
+    try:
+        # nothing is yielded before UnstreamableZip can be raised
+        yield from _iter_local_csv(stream, chunk_size)
+    except UnstreamableZip as e:
+        logger.warning(f"{e}; spilling archive to disk")
+        yield from _iter_spilled_csv(stream.replay(), chunk_size)
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterable of byte chunks"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            self._pending = next(self._chunks, None)
+            if self._pending is None:
+                self._pending = b""
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def tee_chunks(chunks: Iterable[bytes], sink) -> Iterator[bytes]:
+    """Writes each chunk to sink as it is passed through"""
+    for chunk in chunks:
+        sink.write(chunk)
+        yield chunk
@@ -0,0 +1 @@
+../../jobs/clients.py
\ No newline at end of file
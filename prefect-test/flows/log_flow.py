@@ -1,8 +1,7 @@
 import sys
 import prefect
 from prefect import flow, task, get_run_logger
-from google.cloud import storage, bigquery
-from utilities import AN_IMPORTED_MESSAGE
+from utilities import AN_IMPORTED_MESSAGE, get_bigquery_client, get_storage_client
 
 import os
 
@@ -29,7 +28,7 @@ def list_my_blobs(
     delimiter=None,
 ):
     logger = get_run_logger()
-    client = storage.Client(project=project_id)
+    client = get_storage_client(project=project_id)
     blobs = client.list_blobs(
         bucket_or_name=bucket_name, prefix=prefix, delimiter=delimiter
     )
@@ -43,12 +42,12 @@ def list_my_datasets(
     dataset_id: str = DATASET,
 ):
     """
-    Creates a bq client and list tables within that dataset
+    Gets the shared bq client and list tables within that dataset
     Tests permissions
     """
     logger = get_run_logger()
     logger.info(f"dataset: {dataset_id}")
-    client = bigquery.Client(project=project_id)
+    client = get_bigquery_client(project=project_id)
     for table in client.list_tables(dataset=dataset_id):
         logger.info(f"table name: {table.table_id}")
 
@@ -1 +1,7 @@
+# clients.py is a link to jobs/clients.py, so the flows share the pipeline's
+# pooled clients, and the deployment uploads the module along with them
+from clients import POOL_SIZE, get_bigquery_client, get_storage_client
+
+__all__ = ["POOL_SIZE", "get_bigquery_client", "get_storage_client"]
+
 AN_IMPORTED_MESSAGE = "Hello from another file"
@@ -0,0 +1,93 @@
+"""Fixtures shared by the tests of the pipeline jobs"""
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FileServer(ThreadingHTTPServer):
+    """
+    Serves one file at every path, recording the Range header of each GET
+
+    Attributes
+    ----------
+    data: bytes
+        the file served
+    ranges: bool
+        whether Range requests are honoured, and advertised
+    etag: str | None
+        ETag sent, the MD5 of data unless etag=False
+    requested: list
+        Range header of each GET, None where there was none
+    """
+
+    daemon_threads = True
+
+    def __init__(self, data: bytes, ranges: bool = True, etag: bool = True):
+        super().__init__(("127.0.0.1", 0), _FileHandler)
+        self.data = data
+        self.ranges = ranges
+        self.etag = f'"{hashlib.md5(data).hexdigest()}"' if etag else None
+        self.requested = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/archive.zip"
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def _headers(self, status: int, length: int, content_range: str | None = None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        if self.server.etag:
+            self.send_header("ETag", self.server.etag)
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+
+    def do_HEAD(self) -> None:
+        self._headers(200, len(self.server.data))
+
+    def do_GET(self) -> None:
+        data = self.server.data
+        header = self.headers.get("Range")
+        with self.server._lock:
+            self.server.requested.append(header)
+        if header is None or not self.server.ranges:
+            self._headers(200, len(data))
+            self.wfile.write(data)
+            return
+        start, _, end = header.removeprefix("bytes=").partition("-")
+        start, end = int(start), int(end) if end else len(data) - 1
+        if start >= len(data):
+            self._headers(416, 0, f"bytes */{len(data)}")
+            return
+        body = data[start : end + 1]
+        self._headers(206, len(body), f"bytes {start}-{end}/{len(data)}")
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def serve():
+    """Starts a FileServer of the given bytes, stopped after the test"""
+    servers = []
+
+    def start(data: bytes, ranges: bool = True, etag: bool = True) -> FileServer:
+        server = FileServer(data, ranges=ranges, etag=etag)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,54 @@
+import pyarrow.compute as pc
+
+from backends import LocalStore
+from compact import compact_year, list_partitions
+from lake import read_facts, write_partitioned, year_prefix
+from manifest import Manifest
+from test_lake import facts
+
+SOURCE = {"url": "u", "etag": '"1"', "size": 10, "md5": None, "checked": "2023-01-01"}
+
+
+def _ward_lake(tmp_path) -> LocalStore:
+    store = LocalStore(tmp_path)
+    written = write_partitioned(
+        [facts(1000)], store.uri("raw/pq"), "2023", by_ward=True
+    )
+    manifest = Manifest(store)
+    manifest.record_files(
+        "2023",
+        "pq_hive_ward",
+        year_prefix("2023"),
+        SOURCE,
+        paths=[uri.removeprefix(store.uri()) for uri in written],
+    )
+    manifest.save()
+    return store
+
+
+def test_ward_partitions_are_merged_within_each_month(tmp_path):
+    store = _ward_lake(tmp_path)
+    before = read_facts(store.uri("raw/pq"), year="2023")
+    assert len(list_partitions(store, "2023")) == 3 * 5
+
+    plans = compact_year(str(tmp_path), "2023", across_wards=True)
+
+    assert [plan["files_after"] for plan in plans] == [1, 1, 1]
+    partitions = list_partitions(store, "2023")
+    assert sorted(partitions) == [f"raw/pq/year=2023/month=0{m}" for m in (1, 2, 3)]
+    after = read_facts(store.uri("raw/pq"), year="2023")
+    assert after.num_rows == before.num_rows
+    for table in (before, after):
+        assert pc.sum(pc.is_null(table["ward_id"])).as_py() == 200
+    # loads take the merged files from the manifest
+    files = Manifest.load(store).artifact("2023", "pq_hive_ward")["files"]
+    assert sorted(file["path"] for file in files) == sorted(
+        path for paths in partitions.values() for path, _ in paths
+    )
+
+
+def test_ward_partitions_are_kept_without_across_wards(tmp_path):
+    store = _ward_lake(tmp_path)
+    plans = compact_year(str(tmp_path), "2023")
+    assert not any(plan["merge"] for plan in plans)
+    assert len(list_partitions(store, "2023")) == 3 * 5
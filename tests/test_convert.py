@@ -0,0 +1,142 @@
+import csv
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+os.environ.setdefault("TF_VAR_project_id", "test-project")
+
+from extract_load import (  # noqa: E402
+    convert_to_parquet,
+    read_csv_arrow,
+    split_csv_ranges,
+    transform_arrow_batches,
+    transform_batches,
+)
+from schema import RAW_DTYPES  # noqa: E402
+
+HEADER = [
+    "Creation Date",
+    "Status",
+    "First 3 Chars of Postal Code",
+    "Intersection Street 1",
+    "Intersection Street 2",
+    "Ward",
+    "Service Request Type",
+    "Division",
+    "Section",
+]
+
+
+@pytest.fixture
+def multiline_csv(tmp_path):
+    path = tmp_path / "requests.csv"
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(HEADER)
+        for idx in range(5000):
+            street = f'Yonge St\nat "Bloor"\n{idx}' if idx % 7 == 0 else "Yonge St"
+            writer.writerow(
+                [
+                    f"2023-01-{idx % 28 + 1:02d} 00:00:00.0000000",
+                    "Closed",
+                    "M5V",
+                    street,
+                    "",
+                    "Etobicoke North (01)",
+                    "Noise",
+                    "Transportation Services",
+                    "Road Ops",
+                ]
+            )
+    return path
+
+
+def test_ranges_start_outside_quoted_values(multiline_csv):
+    header, ranges = split_csv_ranges(multiline_csv, 32, chunk_size=4096)
+    data = multiline_csv.read_bytes()
+    assert len(ranges) > 1
+    for start, end in ranges:
+        assert data[start:].startswith(b"2023-01-")
+        assert data[:start].count(b'"') % 2 == 0
+
+
+@pytest.mark.parametrize("engine", ["pandas", "arrow"])
+def test_parallel_matches_serial(multiline_csv, tmp_path, engine):
+    serial, parallel = tmp_path / "serial.parquet", tmp_path / "parallel.parquet"
+    serial_stats, _ = convert_to_parquet(multiline_csv, serial, engine=engine)
+    parallel_stats, _ = convert_to_parquet(
+        multiline_csv, parallel, engine=engine, workers=8
+    )
+    assert serial_stats["rows"] == 5000
+    assert parallel_stats == serial_stats
+    assert pq.read_table(parallel).to_pylist() == pq.read_table(serial).to_pylist()
+
+
+@pytest.fixture
+def ragged_csv(tmp_path):
+    path = tmp_path / "ragged.csv"
+    rows = [",".join(f'"{name}"' for name in HEADER)]
+    for idx in range(300):
+        day = f"2023-02-{idx % 28 + 1:02d} 00:00:00.0000000"
+        if idx % 11 == 0:
+            # short row, padded with nulls by both engines
+            rows.append(f"{day},Closed,M5V,Yonge St")
+        elif idx % 17 == 0:
+            # long row, skipped by both engines
+            rows.append(
+                f"{day},Closed,M5V,Yonge St,,Humber River-Black Creek (07),Noise,TS,Road Ops,extra"
+            )
+        elif idx % 5 == 0:
+            rows.append(
+                f'{day},Closed,M5V,"Yonge St\n{idx}",,Unknown,Noise,TS,Road Ops'
+            )
+        else:
+            rows.append(
+                f"{day},Closed,M4C,Bloor St,,Don Valley East (16),Litter,TS,Road Ops"
+            )
+    path.write_text("\n".join(rows) + "\n")
+    return path
+
+
+@pytest.mark.parametrize("block_size", [256, 1 << 20])
+def test_arrow_engine_matches_pandas(ragged_csv, block_size):
+    df = pd.read_csv(ragged_csv, dtype=RAW_DTYPES, on_bad_lines="skip")
+    expected = pa.concat_tables(transform_batches([df], year="2023"))
+    batches = read_csv_arrow(ragged_csv, block_size=block_size)
+    tables = list(transform_arrow_batches(batches, year="2023"))
+    assert len(tables) > 1 or block_size > 256
+    actual = pa.concat_tables(tables)
+    assert actual.num_rows == len(df) == 300 - 16
+    assert decoded(actual).equals(decoded(expected))
+
+
+def decoded(table: pa.Table) -> pa.Table:
+    # dictionaries are in order of appearance in arrow, sorted in pandas
+    return pa.table(
+        {
+            name: column.cast(column.type.value_type)
+            if pa.types.is_dictionary(column.type)
+            else column
+            for name, column in zip(table.column_names, table.columns)
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "convert",
+    [
+        lambda path, pq_path: convert_to_parquet(path, pq_path, batch_size=50),
+        lambda path, pq_path: convert_to_parquet(path, pq_path, workers=4),
+        lambda path, pq_path: list(
+            transform_arrow_batches(read_csv_arrow(path, block_size=256))
+        ),
+    ],
+    ids=["batches", "parallel", "arrow"],
+)
+def test_unexpected_wards_are_logged_once(ragged_csv, tmp_path, caplog, convert):
+    convert(ragged_csv, tmp_path / "ragged.parquet")
+    warnings = [r.message for r in caplog.records if "'Unknown'" in r.message]
+    assert warnings == ["Ward field 'Unknown' has no ID; 51 rows set to null"]
@@ -0,0 +1,144 @@
+import json
+import os
+
+import pytest
+
+from download import PROGRESS_SUFFIX, DownloadError, download
+from retry import RequestPolicy
+
+DATA = os.urandom(1000)
+POLICY = RequestPolicy(attempts=2, base_delay=0, timeout=5, deadline=None)
+
+
+def test_ranged_download_fetches_every_part(serve, tmp_path):
+    server = serve(DATA)
+    dst = download(
+        server.url,
+        tmp_path / "archive.zip",
+        connections=3,
+        part_size=256,
+        policy=POLICY,
+    )
+    assert dst.read_bytes() == DATA
+    assert sorted(server.requested) == [
+        "bytes=0-255",
+        "bytes=256-511",
+        "bytes=512-767",
+        "bytes=768-999",
+    ]
+    assert not (tmp_path / f"archive.zip{PROGRESS_SUFFIX}").exists()
+
+
+def test_ranged_download_resumes_from_progress(serve, tmp_path):
+    server = serve(DATA)
+    dst = tmp_path / "archive.zip"
+    # an earlier run wrote all of part 0 and the start of part 1
+    with open(dst, "wb") as partial:
+        partial.truncate(len(DATA))
+        partial.write(DATA[:300])
+    progress = {
+        "url": server.url,
+        "size": len(DATA),
+        "etag": server.etag,
+        "parts": [[0, 255], [256, 511], [512, 767], [768, 999]],
+        "done": [256, 44, 0, 0],
+    }
+    (tmp_path / f"archive.zip{PROGRESS_SUFFIX}").write_text(json.dumps(progress))
+
+    download(server.url, dst, connections=2, part_size=256, policy=POLICY)
+
+    assert dst.read_bytes() == DATA
+    assert sorted(server.requested) == [
+        "bytes=300-511",
+        "bytes=512-767",
+        "bytes=768-999",
+    ]
+
+
+def test_progress_of_another_source_is_ignored(serve, tmp_path):
+    server = serve(DATA)
+    dst = tmp_path / "archive.zip"
+    dst.write_bytes(bytes(len(DATA)))
+    progress = {
+        "url": server.url,
+        "size": len(DATA),
+        "etag": '"stale"',
+        "parts": [[0, 255], [256, 511], [512, 767], [768, 999]],
+        "done": [256, 256, 256, 232],
+    }
+    (tmp_path / f"archive.zip{PROGRESS_SUFFIX}").write_text(json.dumps(progress))
+
+    download(server.url, dst, connections=2, part_size=256, policy=POLICY)
+
+    assert dst.read_bytes() == DATA
+    assert len(server.requested) == 4
+
+
+def test_single_stream_without_ranges(serve, tmp_path):
+    server = serve(DATA, ranges=False)
+    dst = download(server.url, tmp_path / "archive.zip", connections=4, policy=POLICY)
+    assert dst.read_bytes() == DATA
+    assert server.requested == [None]
+
+
+def test_md5_mismatch_is_an_error(serve, tmp_path):
+    server = serve(DATA)
+    with pytest.raises(DownloadError, match="MD5"):
+        download(
+            server.url,
+            tmp_path / "archive.zip",
+            part_size=256,
+            md5="0" * 32,
+            policy=POLICY,
+        )
+
+
+def test_progress_without_its_file_starts_over(serve, tmp_path):
+    # no MD5 to catch zero-filled parts with
+    server = serve(DATA, etag=False)
+    progress = {
+        "url": server.url,
+        "size": len(DATA),
+        "etag": None,
+        "parts": [[0, 255], [256, 511], [512, 767], [768, 999]],
+        "done": [256, 256, 0, 0],
+    }
+    (tmp_path / f"archive.zip{PROGRESS_SUFFIX}").write_text(json.dumps(progress))
+
+    dst = download(
+        server.url,
+        tmp_path / "archive.zip",
+        connections=2,
+        part_size=256,
+        policy=POLICY,
+    )
+
+    assert dst.read_bytes() == DATA
+    assert len(server.requested) == 4
+
+
+def test_single_stream_resumes_a_file_of_the_same_source(serve, tmp_path):
+    server = serve(DATA)
+    dst = tmp_path / "archive.zip"
+    dst.write_bytes(DATA[:300])
+    progress = {"url": server.url, "size": len(DATA), "etag": server.etag}
+    (tmp_path / f"archive.zip{PROGRESS_SUFFIX}").write_text(json.dumps(progress))
+
+    download(server.url, dst, connections=1, policy=POLICY)
+
+    assert dst.read_bytes() == DATA
+    assert server.requested == ["bytes=300-"]
+    assert not (tmp_path / f"archive.zip{PROGRESS_SUFFIX}").exists()
+
+
+def test_single_stream_restarts_a_file_of_another_source(serve, tmp_path):
+    server = serve(DATA)
+    dst = tmp_path / "archive.zip"
+    dst.write_bytes(bytes(300))
+    progress = {"url": server.url, "size": len(DATA), "etag": '"stale"'}
+    (tmp_path / f"archive.zip{PROGRESS_SUFFIX}").write_text(json.dumps(progress))
+
+    download(server.url, dst, connections=1, policy=POLICY)
+
+    assert dst.read_bytes() == DATA
+    assert server.requested == [None]
@@ -0,0 +1,59 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from lake import read_facts, remove_stale_partitions, write_partitioned
+from schema import FACTS_SCHEMA
+
+
+def facts(num_rows: int) -> pa.Table:
+    days = pa.array([f"2023-{1 + i % 3:02d}-{1 + i % 28:02d}" for i in range(num_rows)])
+    wards = [None if i % 5 == 0 else i % 4 + 1 for i in range(num_rows)]
+    columns = {
+        name: pa.nulls(num_rows, field.type)
+        for name, field in zip(FACTS_SCHEMA.names, FACTS_SCHEMA)
+    }
+    columns["ward_id"] = pa.array(wards, pa.int8())
+    columns["creation_datetime"] = days.cast(pa.timestamp("ns"))
+    return pa.table(columns, schema=FACTS_SCHEMA)
+
+
+@pytest.mark.parametrize("by_ward", [False, True])
+def test_batches_write_the_partitions_of_the_whole_table(tmp_path, by_ward):
+    table = facts(1000)
+    batches = [table.slice(offset, 64) for offset in range(0, 1000, 64)]
+    written = write_partitioned(batches, str(tmp_path), "2023", by_ward=by_ward)
+    assert len(written) == (3 * 5 if by_ward else 3)
+    for month in (1, 2, 3):
+        expected = table.filter(pc.equal(pc.month(table["creation_datetime"]), month))
+        read = read_facts(str(tmp_path), year="2023", months=[month])
+        assert sorted(read["ward_id"].to_pylist(), key=str) == sorted(
+            expected["ward_id"].to_pylist(), key=str
+        )
+
+
+def test_replaced_files_stay_until_removed(tmp_path):
+    old = write_partitioned([facts(100)], str(tmp_path), "2023")
+    new = write_partitioned([facts(100)], str(tmp_path), "2023")
+    assert not set(old) & set(new)
+    assert read_facts(str(tmp_path), year="2023").num_rows == 200
+    assert sorted(remove_stale_partitions(str(tmp_path), "2023", new)) == sorted(old)
+    assert read_facts(str(tmp_path), year="2023").num_rows == 100
+
+
+def test_failed_write_leaves_the_partitions_as_they_were(tmp_path, monkeypatch):
+    old = write_partitioned([facts(100)], str(tmp_path), "2023")
+    calls = []
+
+    def failing(table, where, **kwargs):
+        calls.append(where)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        pq.write_table(table, where, filesystem=kwargs["filesystem"])
+
+    monkeypatch.setattr("lake.write_table", failing)
+    with pytest.raises(OSError):
+        write_partitioned([facts(100)], str(tmp_path), "2023")
+    files = sorted(str(path) for path in tmp_path.rglob("*.parquet"))
+    assert files == sorted(old)
@@ -0,0 +1,55 @@
+from backends import LocalStore
+from manifest import Manifest, content_key
+
+OLD = {"url": "u", "etag": '"1"', "size": 10, "md5": None, "checked": "2023-01-01"}
+NEW = {"url": "u", "etag": '"2"', "size": 12, "md5": None, "checked": "2023-02-01"}
+
+
+def _store(tmp_path) -> LocalStore:
+    store = LocalStore(tmp_path)
+    store.write_bytes("raw/pq/SR2023.parquet", b"old")
+    store.write_bytes("raw/pq/SR2023.new.parquet", b"new")
+    manifest = Manifest(store)
+    manifest.record("2023", "pq", "raw/pq/SR2023.parquet", OLD)
+    manifest.save()
+    return store
+
+
+def test_load_recorded_with_a_stale_source_keeps_newer_artifacts(tmp_path):
+    store = _store(tmp_path)
+    loader, extractor = Manifest.load(store), Manifest.load(store)
+    extractor.record("2023", "pq", "raw/pq/SR2023.new.parquet", NEW)
+    extractor.save()
+    # the loader read the manifest before the extractor saved
+    loader.record_load("2023", "ds.facts_2023", days={"20230101": {}})
+    loader.save()
+
+    year = Manifest.load(store).years["2023"]
+    assert content_key(year["source"]) == content_key(NEW)
+    assert year["artifacts"]["pq"]["path"] == "raw/pq/SR2023.new.parquet"
+    assert year["tables"]["ds.facts_2023"]["days"] == {"20230101": {}}
+
+
+def test_artifacts_of_an_older_source_are_not_merged(tmp_path):
+    store = _store(tmp_path)
+    slow, fast = Manifest.load(store), Manifest.load(store)
+    fast.record("2023", "pq", "raw/pq/SR2023.new.parquet", NEW)
+    fast.save()
+    # built from the source as it was before fast checked it again
+    slow.record("2023", "csv", "raw/pq/SR2023.parquet", OLD)
+    slow.save()
+
+    year = Manifest.load(store).years["2023"]
+    assert content_key(year["source"]) == content_key(NEW)
+    assert set(year["artifacts"]) == {"pq"}
+
+
+def test_artifacts_of_a_newer_source_replace_stale_ones(tmp_path):
+    store = _store(tmp_path)
+    manifest = Manifest.load(store)
+    manifest.record("2023", "csv", "raw/pq/SR2023.new.parquet", NEW)
+    manifest.save()
+
+    year = Manifest.load(store).years["2023"]
+    assert content_key(year["source"]) == content_key(NEW)
+    assert set(year["artifacts"]) == {"csv"}
@@ -0,0 +1,88 @@
+import pandas as pd
+import pyarrow as pa
+
+from partitions import (
+    NULL_PARTITION_ID,
+    DayFingerprints,
+    changed_partitions,
+    day_fingerprints,
+)
+
+DAYS = {
+    "20230101": {"rows": 2, "hash": "00000000000000aa"},
+    "20230102": {"rows": 3, "hash": "00000000000000bb"},
+}
+TABLE_ROWS = {"20230101": 2, "20230102": 3}
+
+
+def test_everything_is_replaced_without_a_recorded_load():
+    assert changed_partitions(DAYS, None, TABLE_ROWS) == (
+        ["20230101", "20230102"],
+        [],
+    )
+
+
+def test_nothing_changed():
+    assert changed_partitions(DAYS, DAYS, TABLE_ROWS) == ([], [])
+
+
+def test_changed_hash_is_replaced():
+    loaded = {**DAYS, "20230102": {"rows": 3, "hash": "00000000000000cc"}}
+    assert changed_partitions(DAYS, loaded, TABLE_ROWS) == (["20230102"], [])
+
+
+def test_row_count_of_the_table_is_checked():
+    # the table was edited outside of the loads
+    assert changed_partitions(DAYS, DAYS, {**TABLE_ROWS, "20230101": 1}) == (
+        ["20230101"],
+        [],
+    )
+    assert changed_partitions(DAYS, DAYS, {"20230102": 3}) == (["20230101"], [])
+
+
+def test_days_no_longer_in_the_data_are_deleted():
+    table_rows = {**TABLE_ROWS, "20221231": 4, NULL_PARTITION_ID: 1}
+    assert changed_partitions(DAYS, DAYS, table_rows) == (
+        [],
+        ["20221231", NULL_PARTITION_ID],
+    )
+
+
+def test_partial_data_deletes_nothing():
+    delta = {"20230102": {"rows": 4, "hash": "00000000000000dd"}}
+    assert changed_partitions(delta, DAYS, TABLE_ROWS, partial=True) == (
+        ["20230102"],
+        [],
+    )
+
+
+def _table() -> pa.Table:
+    times = pd.Series(
+        pd.to_datetime(["2023-01-01 10:00", "2023-01-02 11:00", None] * 100)
+    )
+    return pa.table(
+        {
+            "ward_id": pa.array([1, None, 3] * 100, pa.int8()),
+            "creation_datetime": pa.array(times, pa.timestamp("ns")),
+        }
+    )
+
+
+def test_fingerprints_do_not_depend_on_order():
+    table = _table()
+    days = day_fingerprints(table)
+    assert {day: fingerprint["rows"] for day, fingerprint in days.items()} == {
+        "20230101": 100,
+        "20230102": 100,
+        NULL_PARTITION_ID: 100,
+    }
+    reversed_table = table.take(pa.array(range(table.num_rows - 1, -1, -1)))
+    assert day_fingerprints(reversed_table) == days
+
+
+def test_batched_fingerprints_match_the_whole_table():
+    table = _table()
+    fingerprints = DayFingerprints(batch_size=7)
+    # slices without nulls hash their rows as those with nulls do
+    list(fingerprints.collect([table.slice(0, 1), table.slice(1, 150), table[151:]]))
+    assert fingerprints.to_dict() == day_fingerprints(table)
@@ -0,0 +1,101 @@
+import os
+import threading
+
+import pytest
+
+import upload
+from upload import upload_file
+
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+
+    def upload_from_file(self, file_obj, size, if_generation_match=None, **kwargs):
+        if self.bucket.fail_on in self.name:
+            raise ConnectionError(f"upload of {self.name} failed")
+        if if_generation_match == 0 and self.name in self.bucket.objects:
+            raise FileExistsError(self.name)
+        self.bucket.store(self.name, file_obj.read(size))
+
+    def upload_from_filename(self, filename, **kwargs):
+        with open(filename, "rb") as file_obj:
+            self.bucket.store(self.name, file_obj.read())
+
+    def compose(self, sources, **kwargs):
+        assert len(sources) <= upload.COMPOSE_LIMIT
+        self.bucket.composed.append((self.name, [blob.name for blob in sources]))
+        data = b"".join(self.bucket.objects[blob.name] for blob in sources)
+        self.bucket.store(self.name, data)
+
+
+class FakeBucket:
+    """The calls upload_file makes of a storage.Bucket, over a dict"""
+
+    name = "bucket"
+
+    def __init__(self, fail_on: str = "\0"):
+        self.objects = {}
+        self.composed = []
+        self.fail_on = fail_on
+        self._lock = threading.Lock()
+
+    def store(self, name: str, data: bytes) -> None:
+        with self._lock:
+            self.objects[name] = data
+
+    def blob(self, name: str, chunk_size: int | None = None) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix: str) -> list:
+        return [
+            FakeBlob(self, name) for name in self.objects if name.startswith(prefix)
+        ]
+
+    def delete_blobs(self, blobs: list, on_error=None) -> None:
+        for blob in blobs:
+            del self.objects[blob.name]
+
+
+@pytest.fixture
+def src_file(tmp_path):
+    path = tmp_path / "raw.csv"
+    path.write_bytes(os.urandom(10_000))
+    return path
+
+
+def test_small_file_is_uploaded_whole(src_file):
+    bucket = FakeBucket()
+    upload_file(bucket, src_file, "raw/csv/raw.csv", threshold=1 << 20)
+    assert bucket.objects == {"raw/csv/raw.csv": src_file.read_bytes()}
+    assert bucket.composed == []
+
+
+@pytest.mark.parametrize("compose_limit", [32, 4])
+def test_parts_are_composed_and_removed(src_file, monkeypatch, compose_limit):
+    monkeypatch.setattr(upload, "COMPOSE_LIMIT", compose_limit)
+    bucket = FakeBucket()
+    upload_file(
+        bucket, src_file, "raw/csv/raw.csv", part_size=1000, threshold=0, workers=4
+    )
+    # only the destination is left, holding the parts in order
+    assert bucket.objects == {"raw/csv/raw.csv": src_file.read_bytes()}
+    dst, sources = bucket.composed[-1]
+    assert dst == "raw/csv/raw.csv"
+    if compose_limit == 32:
+        assert [source.rsplit("/", 1)[-1] for source in sources] == [
+            f"part-{idx:05d}" for idx in range(10)
+        ]
+    else:
+        # 10 parts take a round of intermediate objects
+        assert len(bucket.composed) == 4
+
+
+def test_failed_part_leaves_no_objects(src_file):
+    bucket = FakeBucket(fail_on="part-00003")
+    with pytest.raises(ConnectionError):
+        upload_file(
+            bucket, src_file, "raw/csv/raw.csv", part_size=1000, threshold=0, workers=4
+        )
+    assert bucket.objects == {}
@@ -0,0 +1,57 @@
+import io
+import zipfile
+
+import pytest
+
+from zipstream import iter_zip_csv
+
+CSV = b"".join(b"%d,Service Request,2023-01-01\n" % i for i in range(5000))
+
+
+def make_zip(*members, compression=zipfile.ZIP_DEFLATED) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=compression) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def chunked(data: bytes, size: int) -> list:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED],
+    ids=["deflated", "stored"],
+)
+@pytest.mark.parametrize("chunk_size", [7, 4096, 1 << 20])
+def test_streams_csv_member(compression, chunk_size):
+    archive = make_zip(("requests.csv", CSV), compression=compression)
+    streamed = b"".join(iter_zip_csv(chunked(archive, chunk_size), chunk_size=100))
+    assert streamed == CSV
+
+
+def test_skips_members_before_the_csv():
+    archive = make_zip(("readme.txt", b"not this" * 100), ("requests.csv", CSV))
+    assert b"".join(iter_zip_csv(chunked(archive, 1000))) == CSV
+
+
+def test_unstreamable_archive_is_spilled():
+    # bzip2 cannot be inflated from the local headers
+    archive = make_zip(("requests.csv", CSV), compression=zipfile.ZIP_BZIP2)
+    assert b"".join(iter_zip_csv(chunked(archive, 1000))) == CSV
+
+
+def test_no_csv_member():
+    archive = make_zip(("readme.txt", b"nothing to see"))
+    with pytest.raises(FileNotFoundError):
+        b"".join(iter_zip_csv(chunked(archive, 1000)))
+
+
+def test_corrupt_member():
+    archive = bytearray(make_zip(("requests.csv", CSV), compression=zipfile.ZIP_STORED))
+    offset = archive.index(CSV[:20])
+    archive[offset] ^= 0xFF
+    with pytest.raises(zipfile.BadZipFile, match="CRC"):
+        b"".join(iter_zip_csv(chunked(bytes(archive), 1000)))